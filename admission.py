@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Ограничение одновременной обработки обновлений на webhook.
+
+Во время всплеска (пересменка, Telegram досылает накопившееся после простоя)
+одновременно обрабатывается не больше ADMISSION_MAX_CONCURRENT обновлений,
+остальные ждут в ограниченной очереди. Текст и нажатия кнопок проходят раньше
+фото: фото (инференс) занимают не больше ADMISSION_HEAVY_LIMIT слотов.
+Если очередь заполнена или ожидание затянулось, webhook отвечает 503
+с Retry-After, и Telegram повторяет доставку позже.
+"""
+
+import asyncio
+import logging
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_FAST = 0   # текст, кнопки, команды
+PRIORITY_HEAVY = 1  # фото и документы (распознавание топлива)
+
+
+class AdmissionRejected(Exception):
+    """Обновление не принято: система перегружена"""
+
+
+def update_priority(update: Any) -> int:
+    """Фото и документы - тяжёлые обновления, всё остальное - быстрые."""
+    message = getattr(update, "message", None)
+    if message is not None and (getattr(message, "photo", None) or getattr(message, "document", None)):
+        return PRIORITY_HEAVY
+    return PRIORITY_FAST
+
+
+class AdmissionController:
+    """Лимит параллельности с ограниченной очередью ожидания и двумя приоритетами"""
+
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        max_waiting: Optional[int] = None,
+        heavy_limit: Optional[int] = None,
+        wait_timeout: Optional[float] = None,
+    ):
+        if max_concurrent is None:
+            max_concurrent = int(os.getenv("ADMISSION_MAX_CONCURRENT", "16"))
+        self.max_concurrent = max(max_concurrent, 1)
+        if max_waiting is None:
+            max_waiting = int(os.getenv("ADMISSION_MAX_WAITING", "64"))
+        self.max_waiting = max(max_waiting, 0)
+        if heavy_limit is None:
+            heavy_limit = int(os.getenv("ADMISSION_HEAVY_LIMIT", str(max(self.max_concurrent // 2, 1))))
+        # Хотя бы один слот всегда остаётся для быстрых обновлений
+        self.heavy_limit = min(max(heavy_limit, 1), max(self.max_concurrent - 1, 1))
+        if wait_timeout is None:
+            wait_timeout = float(os.getenv("ADMISSION_WAIT_TIMEOUT", "10"))
+        self.wait_timeout = wait_timeout
+
+        self.active = 0
+        self.active_heavy = 0
+        self._waiters: Dict[int, Deque[asyncio.Future]] = {PRIORITY_FAST: deque(), PRIORITY_HEAVY: deque()}
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def waiting(self) -> int:
+        return sum(len(queue) for queue in self._waiters.values())
+
+    def _can_run(self, priority: int) -> bool:
+        if self.active >= self.max_concurrent:
+            return False
+        return priority == PRIORITY_FAST or self.active_heavy < self.heavy_limit
+
+    def _take(self, priority: int) -> None:
+        self.active += 1
+        if priority == PRIORITY_HEAVY:
+            self.active_heavy += 1
+        self.admitted += 1
+
+    def _wake_waiters(self) -> None:
+        # Сначала быстрые, затем тяжёлые - в пределах своих лимитов
+        for priority in (PRIORITY_FAST, PRIORITY_HEAVY):
+            queue = self._waiters[priority]
+            while queue and self._can_run(priority):
+                waiter = queue.popleft()
+                if waiter.done():
+                    continue
+                self._take(priority)
+                waiter.set_result(None)
+
+    async def acquire(self, priority: int = PRIORITY_FAST) -> None:
+        """Занимает слот или ждёт его. Бросает AdmissionRejected при перегрузке."""
+        if self._can_run(priority) and not self._waiters[priority]:
+            self._take(priority)
+            return
+        if self.waiting() >= self.max_waiting:
+            self.rejected += 1
+            raise AdmissionRejected("очередь ожидания заполнена")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.wait_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Слот выдали одновременно с таймаутом - возвращаем его
+                self.release(priority)
+            else:
+                waiter.cancel()
+                try:
+                    self._waiters[priority].remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.timed_out += 1
+            raise AdmissionRejected("превышено время ожидания слота")
+
+    def release(self, priority: int = PRIORITY_FAST) -> None:
+        self.active -= 1
+        if priority == PRIORITY_HEAVY:
+            self.active_heavy -= 1
+        self._wake_waiters()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_FAST) -> AsyncIterator[None]:
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "heavy_limit": self.heavy_limit,
+            "active": self.active,
+            "active_heavy": self.active_heavy,
+            "waiting_fast": len(self._waiters[PRIORITY_FAST]),
+            "waiting_heavy": len(self._waiters[PRIORITY_HEAVY]),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк кодека строк листа поездок.
+
+Сравнивает на синтетическом листе:
+- прежний разбор dict(zip(headers, row)) с ручным приведением чисел
+- TripRowCodec.decode_sheet (компактные TripRecord)
+- полную проверку моделью TripEntry (pydantic v2)
+- кодирование обратно: TripEntry.to_sheets_row против TripRowCodec.encode_rows
+
+Пример:
+    python bench_codec.py --rows 100000 --malformed 0.01
+"""
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from models import TripEntry
+from trip_codec import TripRowCodec, TripRowError
+
+
+def make_sheet(rows: int, malformed: float, seed: int = 0) -> List[List[str]]:
+    """Лист как его отдаёт values.get: заголовки + строки, пустые хвосты обрезаны."""
+    rng = random.Random(seed)
+    values: List[List[str]] = [TripEntry.get_headers()]
+    for i in range(rows):
+        odometer_start = rng.randrange(10000, 300000)
+        odometer_end = odometer_start + rng.randrange(1, 400)
+        row = [
+            f"{rng.randrange(1, 29):02d}.{rng.randrange(1, 13):02d}.2024", "08:15", "12:40",
+            str(odometer_start), str(odometer_end), str(odometer_end - odometer_start),
+            str(round(rng.uniform(5, 60), 2)) if rng.random() < 0.5 else "",
+            "Иван Петров", f"Проект {i % 50}", f"ул. Ленина, {i % 300}", "" if i % 3 else "комментарий",
+            "2024-10-01T08:00:00+00:00Z", str(100000 + i % 40), f"uid-{i}",
+        ]
+        if rng.random() < malformed:
+            row[3] = "н/д"
+        values.append(row)
+    return values
+
+
+def legacy_decode(values: List[List[str]]) -> List[Dict[str, Any]]:
+    headers = TripEntry.get_headers()
+    result = []
+    for row in values[1:]:
+        if len(row) >= len(headers):
+            row_dict = dict(zip(headers, row))
+            try:
+                row_dict['odometer_start'] = int(row_dict['odometer_start'])
+                row_dict['odometer_end'] = int(row_dict['odometer_end'])
+                row_dict['distance_km'] = int(row_dict['distance_km'])
+                row_dict['author_tg_id'] = int(row_dict['author_tg_id'])
+            except ValueError:
+                continue
+            result.append(row_dict)
+    return result
+
+
+def pydantic_decode(values: List[List[str]]) -> List[TripEntry]:
+    headers = TripEntry.get_headers()
+    result = []
+    for row in values[1:]:
+        row = row + [""] * (len(headers) - len(row))
+        data = dict(zip(headers, row))
+        data["fuel_liters"] = data["fuel_liters"] or None
+        try:
+            result.append(TripEntry.model_validate(data))
+        except ValueError:
+            continue
+    return result
+
+
+def measure(func: Callable[[], Any]) -> Tuple[float, float, Any]:
+    """(секунды, пиковая память МБ, результат). Время и память меряются отдельными прогонами."""
+    started = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - started
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak / (1024 * 1024), result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк кодека строк листа поездок")
+    parser.add_argument("--rows", type=int, default=100000, help="Число строк")
+    parser.add_argument("--malformed", type=float, default=0.01, help="Доля испорченных строк")
+    args = parser.parse_args()
+
+    values = make_sheet(args.rows, args.malformed)
+    codec = TripRowCodec()
+    errors: List[TripRowError] = []
+
+    def codec_decode() -> List[Any]:
+        errors.clear()
+        return codec.decode_sheet(values, errors)
+
+    cases = [
+        ("dict(zip) + int()", lambda: legacy_decode(values)),
+        ("TripRowCodec", codec_decode),
+        ("TripEntry (pydantic v2)", lambda: pydantic_decode(values)),
+    ]
+    print(f"Строк: {args.rows}, испорченных: {args.malformed:.1%}")
+    records = None
+    for name, func in cases:
+        seconds, peak_mb, result = measure(func)
+        if name == "TripRowCodec":
+            records = result
+        print(f"{name:<26} {seconds * 1000:9.1f} мс  {seconds / args.rows * 1e6:6.2f} мкс/строка  "
+              f"пик {peak_mb:7.1f} МБ  записей {len(result)}")
+    print(f"Пропущено кодеком: {len(errors)}")
+
+    entries = [record.to_entry() for record in records[:10000]]
+    subset = records[:10000]
+    seconds_model, _, _ = measure(lambda: [entry.to_sheets_row() for entry in entries])
+    seconds_codec, _, _ = measure(lambda: codec.encode_rows(subset))
+    print(f"Кодирование 10000 строк: to_sheets_row {seconds_model * 1000:.1f} мс, "
+          f"encode_rows {seconds_codec * 1000:.1f} мс")
+    print(f"Размер записи: dict {sys.getsizeof(legacy_decode(values[:2])[0])} Б, "
+          f"TripRecord {sys.getsizeof(records[0])} Б")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк и проверка точности детектора топлива на размеченных фото.
+
+Папка с фото должна содержать labels.csv со строками "имя_файла,палочки"
+(без заголовка или с заголовком filename,bars). Если файла нет, число палочек
+берётся из начала имени файла: "5_dashboard.jpg" -> 5.
+
+Каждая комбинация бэкенда, размера пачки и числа потоков запускается в
+отдельном процессе, чтобы пиковая память (RSS) мерилась честно.
+
+Проверка точности: при --min-accuracy (общий порог или BACKEND=порог) и/или
+--baseline (прошлый отчёт) скрипт завершается с кодом 2, если доля точных
+ответов какой-либо конфигурации ниже порога или упала относительно отчёта
+больше чем на --max-drop. Так регрессию после экспорта в ONNX, квантизации
+или правки предобработки ловит CI, а не водители.
+
+Пример:
+    python bench_fuel.py --images samples/ --backends ultralytics,onnx \\
+        --batch-sizes 1,4,8 --threads 1,2 --output bench_fuel.json
+    python bench_fuel.py --images samples/ --backends onnx --model onnx=best.int8.onnx \\
+        --min-accuracy 0.95 --min-accuracy onnx=0.93 --baseline bench_fuel.json
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def load_dataset(directory: str) -> List[Tuple[str, Optional[int]]]:
+    """Возвращает список (путь к фото, ожидаемое число палочек)."""
+    labels: Dict[str, int] = {}
+    labels_path = os.path.join(directory, "labels.csv")
+    if os.path.exists(labels_path):
+        with open(labels_path, newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                if len(row) >= 2 and row[1].strip().isdigit():
+                    labels[row[0].strip()] = int(row[1])
+
+    dataset = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        expected = labels.get(name)
+        if expected is None:
+            match = re.match(r"^(\d+)[_\-.]", name)
+            expected = int(match.group(1)) if match else None
+        dataset.append((os.path.join(directory, name), expected))
+    return dataset
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль с линейной интерполяцией."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def peak_rss_mb() -> float:
+    """Пиковый RSS текущего процесса в мегабайтах (ru_maxrss в КБ на Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_configuration(images_dir: str, backend: str, batch_size: int, threads: int,
+                      model_path: Optional[str], repeat: int, warmup: int) -> Dict:
+    """Прогоняет набор фото через детектор с одной конфигурацией (в текущем процессе)."""
+    if threads > 0:
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+        os.environ["FUEL_NUM_THREADS"] = str(threads)
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+
+    from fuel_detector import FuelDetector
+
+    detector = FuelDetector(model_path, backend=backend)
+    dataset = load_dataset(images_dir)
+    images = []
+    for path, _ in dataset:
+        with open(path, "rb") as f:
+            images.append(f.read())
+    batches = [list(range(i, min(i + batch_size, len(images)))) for i in range(0, len(images), batch_size)]
+
+    load_started = time.perf_counter()
+    if not detector._load_model():
+        return {"error": f"модель {detector.model_path} не загружена"}
+    load_seconds = time.perf_counter() - load_started
+    rss_after_load = peak_rss_mb()
+
+    for batch in batches[:warmup]:
+        detector.detect_fuel_levels([images[i] for i in batch])
+
+    latencies: List[float] = []
+    predicted: Dict[int, Optional[int]] = {}
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for batch in batches:
+            batch_started = time.perf_counter()
+            results = detector.detect_fuel_levels([images[i] for i in batch])
+            elapsed = time.perf_counter() - batch_started
+            # Каждое фото пачки ждёт завершения всей пачки
+            latencies.extend([elapsed] * len(batch))
+            for i, (bars_count, _, _) in zip(batch, results):
+                predicted[i] = bars_count
+    total_seconds = time.perf_counter() - started
+
+    labeled = [(predicted.get(i), expected) for i, (_, expected) in enumerate(dataset) if expected is not None]
+    correct = sum(1 for actual, expected in labeled if actual == expected)
+    errors = [abs((actual or 0) - expected) for actual, expected in labeled]
+
+    return {
+        "backend": backend,
+        "batch_size": batch_size,
+        "threads": threads,
+        "model_path": detector.model_path,
+        "images": len(images),
+        "repeat": repeat,
+        "model_load_s": round(load_seconds, 3),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+            "mean": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        },
+        "images_per_s": round(len(latencies) / total_seconds, 2) if total_seconds > 0 else 0.0,
+        "rss_after_load_mb": round(rss_after_load, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "accuracy": {
+            "labeled": len(labeled),
+            "exact": round(correct / len(labeled), 4) if labeled else None,
+            "mae_bars": round(statistics.fmean(errors), 3) if errors else None,
+        },
+    }
+
+
+def _config_key(run: Dict) -> Tuple[str, int, int]:
+    return run.get("backend"), run.get("batch_size"), run.get("threads")
+
+
+def check_accuracy(runs: List[Dict], min_accuracy: Dict[str, float],
+                   baseline_runs: Optional[List[Dict]] = None, max_drop: float = 0.0) -> List[str]:
+    """
+    Регрессии точности: конфигурации ниже порога (min_accuracy: бэкенд или "*" ->
+    минимальная доля точных ответов) или хуже отчёта baseline больше чем на max_drop.
+    """
+    baseline = {_config_key(run): run for run in baseline_runs or [] if "error" not in run}
+    failures = []
+    for run in runs:
+        if "error" in run:
+            continue
+        name = "backend={}, batch={}, threads={}".format(*_config_key(run))
+        exact = run["accuracy"]["exact"]
+        threshold = min_accuracy.get(run["backend"], min_accuracy.get("*"))
+        if exact is None:
+            if threshold is not None or _config_key(run) in baseline:
+                failures.append(f"{name}: нет размеченных фото для проверки точности")
+            continue
+        if threshold is not None and exact < threshold:
+            failures.append(f"{name}: точность {exact} ниже порога {threshold}")
+        previous = baseline.get(_config_key(run))
+        if previous is not None and previous["accuracy"]["exact"] is not None:
+            if exact < previous["accuracy"]["exact"] - max_drop:
+                failures.append(
+                    f"{name}: точность {exact} упала относительно отчёта ({previous['accuracy']['exact']})"
+                )
+    return failures
+
+
+def parse_thresholds(values: List[str]) -> Dict[str, float]:
+    """["0.95", "onnx=0.93"] -> {"*": 0.95, "onnx": 0.93}"""
+    thresholds: Dict[str, float] = {}
+    for value in values:
+        backend, _, threshold = value.rpartition("=")
+        thresholds[backend.strip() or "*"] = float(threshold)
+    return thresholds
+
+
+def parse_int_list(value: str) -> List[int]:
+    return [int(x) for x in value.split(",") if x.strip()]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк и точность детектора топлива")
+    parser.add_argument("--images", required=True, help="папка с размеченными фото")
+    parser.add_argument("--backends", default="ultralytics,onnx", help="бэкенды через запятую")
+    parser.add_argument("--batch-sizes", default="1,4,8", help="размеры пачек через запятую")
+    parser.add_argument("--threads", default="0", help="числа потоков через запятую (0 - по умолчанию)")
+    parser.add_argument("--model", action="append", default=[], metavar="BACKEND=PATH",
+                        help="путь к модели для бэкенда, например onnx=best.int8.onnx")
+    parser.add_argument("--repeat", type=int, default=3, help="число проходов по набору")
+    parser.add_argument("--warmup", type=int, default=1, help="число прогревочных пачек")
+    parser.add_argument("--output", default="bench_fuel.json", help="файл с результатами (JSON)")
+    parser.add_argument("--min-accuracy", action="append", default=[], metavar="[BACKEND=]ДОЛЯ",
+                        help="минимальная доля точных ответов: общая или для бэкенда (можно несколько раз)")
+    parser.add_argument("--baseline", help="прошлый отчёт: точность конфигураций не должна упасть")
+    parser.add_argument("--max-drop", type=float, default=0.0,
+                        help="допустимое падение точности относительно --baseline (доля)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--batch-size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--thread-count", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--model-path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_configuration(args.images, args.backend, args.batch_size, args.thread_count,
+                                   args.model_path, args.repeat, args.warmup)
+        print(json.dumps(result, ensure_ascii=False))
+        return 0
+
+    model_paths = dict(item.split("=", 1) for item in args.model)
+    min_accuracy = parse_thresholds(args.min_accuracy)
+    baseline_runs = None
+    if args.baseline:
+        # Читаем до прогона: --output может указывать на тот же файл
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline_runs = json.load(f).get("runs", [])
+    runs = []
+    for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        for threads in parse_int_list(args.threads):
+            for batch_size in parse_int_list(args.batch_sizes):
+                command = [
+                    sys.executable, os.path.abspath(__file__), "--worker",
+                    "--images", args.images, "--backend", backend,
+                    "--batch-size", str(batch_size), "--thread-count", str(threads),
+                    "--repeat", str(args.repeat), "--warmup", str(args.warmup),
+                ]
+                if backend in model_paths:
+                    command += ["--model-path", model_paths[backend]]
+                logger.info(f"Запуск: backend={backend}, batch={batch_size}, threads={threads}")
+                completed = subprocess.run(command, capture_output=True, text=True)
+                try:
+                    result = json.loads(completed.stdout.strip().splitlines()[-1])
+                except (IndexError, ValueError):
+                    result = {"error": completed.stderr.strip()[-2000:]}
+                result.setdefault("backend", backend)
+                result.setdefault("batch_size", batch_size)
+                result.setdefault("threads", threads)
+                runs.append(result)
+                if "error" in result:
+                    logger.error(f"Ошибка конфигурации: {result['error']}")
+                else:
+                    logger.info(
+                        f"p50={result['latency_ms']['p50']} мс, p95={result['latency_ms']['p95']} мс, "
+                        f"{result['images_per_s']} фото/с, RSS={result['peak_rss_mb']} МБ, "
+                        f"точность={result['accuracy']['exact']}"
+                    )
+
+    failures = check_accuracy(runs, min_accuracy, baseline_runs, args.max_drop)
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "images_dir": os.path.abspath(args.images),
+        "python": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+        "runs": runs,
+        "accuracy_failures": failures,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logger.info(f"Результаты сохранены: {args.output}")
+    if any("error" in run for run in runs):
+        return 1
+    for failure in failures:
+        logger.error(f"Регрессия точности: {failure}")
+    return 2 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк JSON на пути webhook и при чтении ответов Google Sheets.
+
+Сравнивает:
+- разбор обновления: json.loads + Update.model_validate против Update.model_validate_json
+- ответ webhook: JSONResponse против FastJSONResponse (orjson, если установлен)
+- разбор ответа values.get: стандартный JsonModel против быстрой модели
+
+Пример:
+    python bench_json.py --iterations 20000 --rows 2000
+"""
+
+import argparse
+import json
+import time
+from typing import Any, Callable, Dict
+
+from aiogram.types import Update
+from fastapi.responses import JSONResponse
+from googleapiclient.model import JsonModel
+
+from fast_json import FastJSONResponse, make_sheets_json_model, orjson
+
+SAMPLE_UPDATE: Dict[str, Any] = {
+    "update_id": 123456789,
+    "message": {
+        "message_id": 4321,
+        "from": {"id": 987654321, "is_bot": False, "first_name": "Иван", "last_name": "Петров",
+                 "username": "driver", "language_code": "ru"},
+        "chat": {"id": 987654321, "type": "private", "first_name": "Иван", "last_name": "Петров",
+                 "username": "driver"},
+        "date": 1729339200,
+        "text": "Объект: ЖК Северный, корпус 3",
+    },
+}
+
+
+def measure(func: Callable[[], Any], iterations: int) -> float:
+    """Среднее время одного вызова в микросекундах."""
+    func()  # прогрев
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def sheets_payload(rows: int) -> bytes:
+    values = [
+        ["01.10.2024", "08:00", "12:30", f"ЖК Северный {i}", "ул. Ленина, 1", "ул. Мира, 5",
+         "120000", "120150", "150", "40", "Иван Петров", "987654321", "", f"uid-{i}"]
+        for i in range(rows)
+    ]
+    return json.dumps({"range": "Лист1!A1:N", "majorDimension": "ROWS", "values": values}).encode("utf-8")
+
+
+def report(name: str, baseline_us: float, fast_us: float) -> None:
+    print(f"{name:<28} {baseline_us:>10.1f} мкс {fast_us:>10.1f} мкс   ×{baseline_us / fast_us:.2f}"
+          f"   экономия {baseline_us - fast_us:.1f} мкс")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Микробенчмарк JSON на горячих путях")
+    parser.add_argument("--iterations", type=int, default=20000, help="Повторов для обновления и ответа")
+    parser.add_argument("--rows", type=int, default=2000, help="Строк в ответе Google Sheets")
+    parser.add_argument("--sheets-iterations", type=int, default=50, help="Повторов для ответа Sheets")
+    args = parser.parse_args()
+
+    body = json.dumps(SAMPLE_UPDATE, ensure_ascii=False).encode("utf-8")
+    payload = sheets_payload(args.rows)
+    standard_model = JsonModel()
+    fast_model = make_sheets_json_model()
+
+    print(f"orjson: {'да' if orjson is not None else 'нет (используется json)'}")
+    print(f"{'':<28} {'было':>14} {'стало':>14}")
+    report(
+        "Разбор обновления",
+        measure(lambda: Update.model_validate(json.loads(body)), args.iterations),
+        measure(lambda: Update.model_validate_json(body), args.iterations),
+    )
+    report(
+        "Ответ webhook",
+        measure(lambda: JSONResponse(content={"ok": True}), args.iterations),
+        measure(lambda: FastJSONResponse(content={"ok": True}), args.iterations),
+    )
+    report(
+        f"Ответ Sheets ({args.rows} строк)",
+        measure(lambda: standard_model.deserialize(payload), args.sheets_iterations),
+        measure(lambda: fast_model.deserialize(payload), args.sheets_iterations),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пакетного разбора колонок даты/времени из Google Sheets.
+
+Сравнивает построчный цикл через TimeUtils.parse_sheets_datetime с
+TimeUtils.parse_sheets_columns и проверяет, что результаты совпадают.
+
+Пример:
+    python bench_time.py --rows 100000 --timezone Europe/Berlin
+"""
+
+import argparse
+import math
+import random
+import time
+from array import array
+from datetime import date, timedelta
+from typing import List, Tuple
+
+from utils_time import SheetsTimeColumns, TimeUtils
+
+
+def make_columns(rows: int, days: int, seed: int = 0) -> Tuple[List[str], List[str], List[str]]:
+    """Колонки как в таблице: поездки за последние days дней."""
+    rng = random.Random(seed)
+    first_day = date(2024, 1, 1)
+    dates, starts, ends = [], [], []
+    for _ in range(rows):
+        day = first_day + timedelta(days=rng.randrange(days))
+        start = rng.randrange(6 * 60, 18 * 60)
+        end = start + rng.randrange(10, 300)
+        dates.append(day.strftime("%d.%m.%Y"))
+        starts.append(f"{start // 60:02d}:{start % 60:02d}")
+        ends.append(f"{end // 60:02d}:{end % 60:02d}")
+    return dates, starts, ends
+
+
+def per_row(time_utils: TimeUtils, dates: List[str], starts: List[str], ends: List[str]) -> SheetsTimeColumns:
+    start_ts, end_ts, durations = array('d'), array('d'), array('d')
+    for date_str, start_str, end_str in zip(dates, starts, ends):
+        start_dt = time_utils.parse_sheets_datetime(date_str, start_str)
+        end_dt = time_utils.parse_sheets_datetime(date_str, end_str)
+        start = start_dt.timestamp() if start_dt else math.nan
+        end = end_dt.timestamp() if end_dt else math.nan
+        start_ts.append(start)
+        end_ts.append(end)
+        durations.append(end - start)
+    return SheetsTimeColumns(start_ts, end_ts, durations)
+
+
+def same(a: array, b: array) -> bool:
+    return all(x == y or (math.isnan(x) and math.isnan(y)) for x, y in zip(a, b)) and len(a) == len(b)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк пакетного разбора даты/времени")
+    parser.add_argument("--rows", type=int, default=100000, help="Число строк")
+    parser.add_argument("--days", type=int, default=365, help="Число различных дат")
+    parser.add_argument("--timezone", default="Europe/Moscow", help="Часовой пояс")
+    args = parser.parse_args()
+
+    time_utils = TimeUtils(args.timezone)
+    dates, starts, ends = make_columns(args.rows, args.days)
+
+    started = time.perf_counter()
+    expected = per_row(time_utils, dates, starts, ends)
+    loop_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = time_utils.parse_sheets_columns(dates, starts, ends)
+    bulk_seconds = time.perf_counter() - started
+
+    matches = all(same(a, b) for a, b in zip(expected, result))
+    print(f"Строк: {args.rows}, различных дат: {len(set(dates))}, часовой пояс: {args.timezone}")
+    print(f"Построчно:  {loop_seconds * 1000:8.1f} мс ({loop_seconds / args.rows * 1e6:.2f} мкс/строка)")
+    print(f"Пакетно:    {bulk_seconds * 1000:8.1f} мс ({bulk_seconds / args.rows * 1e6:.2f} мкс/строка)")
+    print(f"Ускорение:  ×{loop_seconds / bulk_seconds:.1f}")
+    print(f"Результаты совпадают: {'да' if matches else 'НЕТ'}")
+    if not matches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Ленивая инициализация общих зависимостей бота.
+
+Клиенты Google Sheets, репозиторий пользователей и детектор топлива
+создаются при первом обращении, а не при импорте модулей с обработчиками.
+Поэтому холодный старт webhook не платит за googleapiclient, PIL и сетевые
+запросы, пока они реально не понадобятся.
+"""
+
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Union
+
+if TYPE_CHECKING:
+    from fuel_cache import FuelResultCache
+    from fuel_client import FuelWorkerClient
+    from fuel_queue import FuelInferenceQueue
+    from last_trips import LastTripCache
+    from sheets_client import GoogleSheetsClient
+    from suggestions import TripSuggestions
+    from tenants import TenantContext, TenantRegistry
+    from trip_index import TripIndex
+    from users_repo import UsersRepository
+    from utils_time import TimeUtils
+
+
+class UnknownTenantError(LookupError):
+    """
+    Водитель не привязан к компании, а компании по умолчанию нет (tenants.py).
+    Объявлена здесь, чтобы обработчики ловили её без импорта googleapiclient.
+    """
+
+
+_instances: Dict[str, Any] = {}
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _get_or_create(name: str, factory: Callable[[], Any]) -> Any:
+    """Создаёт объект один раз (потокобезопасно) и возвращает его при следующих вызовах."""
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+    with _locks_guard:
+        lock = _locks.setdefault(name, threading.Lock())
+    with lock:
+        instance = _instances.get(name)
+        if instance is None:
+            instance = factory()
+            _instances[name] = instance
+    return instance
+
+
+def is_initialized(name: str) -> bool:
+    """Проверяет, создана ли уже зависимость с данным именем."""
+    return name in _instances
+
+
+def get_admin_ids() -> List[int]:
+    def factory() -> List[int]:
+        return [int(x.strip()) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()]
+    return _get_or_create("admin_ids", factory)
+
+
+def get_time_utils() -> "TimeUtils":
+    def factory() -> "TimeUtils":
+        from utils_time import TimeUtils
+        return TimeUtils(os.getenv("TIMEZONE", "Europe/Moscow"))
+    return _get_or_create("time_utils", factory)
+
+
+def _sheets_service() -> Optional[Any]:
+    """Фейковый Sheets API при SHEETS_BACKEND=fake, иначе None (общий настоящий сервис)."""
+    if os.getenv("SHEETS_BACKEND", "google").strip().lower() == "fake":
+        from fake_sheets import get_fake_sheets_service
+        return get_fake_sheets_service()
+    return None
+
+
+def get_tenant_registry() -> "TenantRegistry":
+    """Реестр компаний: водитель -> своя таблица (см. tenants.py)."""
+    def factory() -> "TenantRegistry":
+        from sheet_watch import SHEET_WATCH_INTERVAL
+        from tenants import (
+            TenantRegistry, build_drive_version_service, build_shared_sheets_service, tenant_config_from_env,
+        )
+        service_account_path = os.getenv("GOOGLE_SA_JSON_PATH", "./service_account.json")
+
+        def service_factory() -> Any:
+            service = _sheets_service()
+            return service if service is not None else build_shared_sheets_service(service_account_path)
+
+        def version_service_factory() -> Any:
+            # Фейковый сервис сам отвечает на files().get(fields="version")
+            service = _sheets_service()
+            return service if service is not None else build_drive_version_service(service_account_path)
+
+        return TenantRegistry(
+            tenant_config_from_env(),
+            service_factory,
+            service_account_path=service_account_path,
+            version_service_factory=version_service_factory if SHEET_WATCH_INTERVAL > 0 else None,
+        )
+    return _get_or_create("tenant_registry", factory)
+
+
+def get_tenant(user_id: Optional[int] = None) -> "TenantContext":
+    """Контекст компании водителя (без user_id - компания по умолчанию)."""
+    return get_tenant_registry().for_user(user_id)
+
+
+def get_users_repo(user_id: Optional[int] = None) -> "UsersRepository":
+    return get_tenant(user_id).users_repo
+
+
+def get_sheets_client(user_id: Optional[int] = None) -> "GoogleSheetsClient":
+    return get_tenant(user_id).sheets_client
+
+
+def get_last_trips(user_id: Optional[int] = None) -> "LastTripCache":
+    """Кэш последних поездок компании. Лист читается в load() (вне обработчиков)."""
+    return get_tenant(user_id).last_trips
+
+
+def get_suggestions(user_id: Optional[int] = None) -> "TripSuggestions":
+    """Подсказки проектов и адресов компании. Лист читается в load() (вне обработчиков)."""
+    return get_tenant(user_id).suggestions
+
+
+def get_trip_index(user_id: Optional[int] = None) -> "TripIndex":
+    """Индекс поездок компании для /stats. Строится в load() при первом запросе."""
+    return get_tenant(user_id).trip_index
+
+
+def get_fuel_service() -> Union["FuelInferenceQueue", "FuelWorkerClient"]:
+    """Детекция топлива: через отдельный воркер, если он настроен, иначе в этом процессе."""
+    def factory() -> Union["FuelInferenceQueue", "FuelWorkerClient"]:
+        if os.getenv("FUEL_WORKER_URL", "").strip() or os.getenv("FUEL_WORKER_SOCKET", "").strip():
+            from fuel_client import FuelWorkerClient
+            return FuelWorkerClient()
+        from fuel_queue import fuel_queue
+        return fuel_queue
+    return _get_or_create("fuel_service", factory)
+
+
+async def close_fuel_service() -> None:
+    """При остановке: закрывает сессию клиента воркера (если сервис создавался)."""
+    if not is_initialized("fuel_service"):
+        return
+    close = getattr(get_fuel_service(), "close", None)
+    if close is not None:
+        await close()
+
+
+def get_fuel_cache() -> "FuelResultCache":
+    def factory() -> "FuelResultCache":
+        from fuel_cache import fuel_cache
+        return fuel_cache
+    return _get_or_create("fuel_cache", factory)
+
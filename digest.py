@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Ежедневный дайджест для администраторов и напоминания о незавершённых поездках.
+
+Дайджест: поездки, километры и топливо за день по каждому инженеру, считаются
+за один проход по листу. Каждый администратор (ADMIN_IDS) получает дайджест
+своей компании (см. tenants.py). Все сообщения идут через очередь с
+ограничением скорости (outbox.py).
+
+Запуск:
+- по расписанию: DIGEST_TIME=20:00 (время в TIMEZONE), бот в режиме polling
+  или долгоживущий server.py;
+- по HTTP: POST /digest с заголовком X-Digest-Token: <DIGEST_TOKEN>
+  (для serverless - вызывать из триггера по расписанию).
+
+Напоминания: DRAFT_REMINDER_HOURS=N - водителю, который начал поездку больше
+N часов назад и не сохранил её, приходит одно напоминание (проверка раз в час,
+только для хранилища FSM в памяти).
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from outbox import Outbox
+from trip_codec import TripRecord
+
+logger = logging.getLogger(__name__)
+
+# Ключи в данных FSM незавершённой поездки (записываются в handlers/trip.py)
+DRAFT_STARTED_AT = "draft_started_at"
+DRAFT_REMINDED = "draft_reminded"
+
+
+class EngineerTotals:
+    """Итоги инженера за день"""
+
+    __slots__ = ("trips", "distance_km", "fuel_liters")
+
+    def __init__(self) -> None:
+        self.trips = 0
+        self.distance_km = 0
+        self.fuel_liters = 0.0
+
+
+class DailyDigest(NamedTuple):
+    date: str
+    engineers: Dict[str, EngineerTotals]
+    trips: int
+    distance_km: int
+    fuel_liters: float
+
+
+def compute_daily_digest(records: Iterable[TripRecord], date_str: str) -> DailyDigest:
+    """Итоги за день (дата в формате листа ДД.ММ.ГГГГ) за один проход по записям."""
+    engineers: Dict[str, EngineerTotals] = {}
+    trips = 0
+    distance_km = 0
+    fuel_liters = 0.0
+    for record in records:
+        if record.date != date_str:
+            continue
+        totals = engineers.get(record.engineer)
+        if totals is None:
+            totals = engineers[record.engineer] = EngineerTotals()
+        totals.trips += 1
+        totals.distance_km += record.distance_km
+        trips += 1
+        distance_km += record.distance_km
+        if record.fuel_liters is not None:
+            totals.fuel_liters += record.fuel_liters
+            fuel_liters += record.fuel_liters
+    return DailyDigest(date_str, engineers, trips, distance_km, fuel_liters)
+
+
+def format_digest(digest: DailyDigest, company: Optional[str] = None) -> str:
+    title = f"📊 <b>Итоги за {digest.date}</b>"
+    if company:
+        title += f" ({company})"
+    if not digest.trips:
+        return f"{title}\n\nПоездок не было."
+
+    lines = [
+        title,
+        "",
+        f"🚗 Поездок: <b>{digest.trips}</b>",
+        f"📏 Пробег: <b>{digest.distance_km:,} км</b>",
+        f"⛽ Топливо: <b>{digest.fuel_liters:.1f} л</b>",
+        "",
+    ]
+    # Сначала инженеры с наибольшим пробегом
+    for engineer, totals in sorted(digest.engineers.items(), key=lambda item: -item[1].distance_km):
+        line = f"👤 {engineer}: {totals.trips} поезд., {totals.distance_km:,} км"
+        if totals.fuel_liters:
+            line += f", {totals.fuel_liters:.1f} л"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+async def send_daily_digest(outbox: Outbox, date_str: Optional[str] = None, wait: bool = False) -> int:
+    """Ставит дайджест в очередь каждому администратору. Возвращает число сообщений."""
+    from deps import get_admin_ids, get_tenant_registry, get_time_utils
+
+    if date_str is None:
+        date_str = get_time_utils().get_current_datetime().strftime("%d.%m.%Y")
+    registry = get_tenant_registry()
+
+    # Администраторы по компаниям: лист каждой компании читается один раз
+    admins_by_tenant: Dict[str, List[int]] = {}
+    for admin_id in get_admin_ids():
+        try:
+            tenant = registry.tenant_for_user(admin_id)
+        except LookupError:
+            logger.warning(f"Администратор {admin_id} не привязан к компании, дайджест не отправлен")
+            continue
+        admins_by_tenant.setdefault(tenant.tenant_id, []).append(admin_id)
+
+    futures = []
+    for tenant_id, admin_ids in admins_by_tenant.items():
+        try:
+            sheets_client = (await asyncio.to_thread(registry.get, tenant_id)).sheets_client
+            records = await asyncio.to_thread(sheets_client.read_records)
+        except Exception as e:
+            logger.error(f"Не удалось прочитать лист компании {tenant_id} для дайджеста: {e}")
+            continue
+        digest = compute_daily_digest(records, date_str)
+        company = tenant_id if len(registry.config.tenants) > 1 else None
+        text = format_digest(digest, company)
+        for admin_id in admin_ids:
+            futures.append(outbox.send(admin_id, text, wait=wait, parse_mode="HTML"))
+
+    if wait and futures:
+        # Для serverless: ответ на HTTP-запрос только после фактической отправки
+        await asyncio.gather(*futures, return_exceptions=True)
+    logger.info(f"Дайджест за {date_str}: {len(futures)} сообщений")
+    return len(futures)
+
+
+async def remind_unfinished_drafts(storage: Any, outbox: Outbox, older_than_hours: float) -> int:
+    """Напоминает водителям о поездках, начатых давно и не сохранённых."""
+    from aiogram.fsm.storage.memory import MemoryStorage
+
+    if not isinstance(storage, MemoryStorage):
+        logger.warning("Напоминания о черновиках работают только с MemoryStorage")
+        return 0
+
+    threshold = time.time() - older_than_hours * 3600
+    reminded = 0
+    for key, record in list(storage.storage.items()):
+        if not record.state or not record.state.startswith("TripStates:"):
+            continue
+        started_at = record.data.get(DRAFT_STARTED_AT)
+        if started_at is None or started_at > threshold or record.data.get(DRAFT_REMINDED):
+            continue
+        await storage.update_data(key, {DRAFT_REMINDED: True})
+        outbox.send(
+            key.chat_id,
+            "⏳ У вас есть незавершённая поездка. Продолжите ввод или отмените её кнопкой «❌ Отмена».",
+        )
+        reminded += 1
+    if reminded:
+        logger.info(f"Отправлено напоминаний о незавершённых поездках: {reminded}")
+    return reminded
+
+
+def seconds_until(time_str: str, now: datetime) -> float:
+    """Секунд до ближайшего ЧЧ:ММ (сегодня или завтра) в часовом поясе now."""
+    hour, minute = (int(part) for part in time_str.split(":"))
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+class DigestScheduler:
+    """Фоновые задачи: дайджест в DIGEST_TIME и почасовые напоминания о черновиках"""
+
+    def __init__(self, outbox: Outbox, digest_time: Optional[str] = None, reminder_hours: Optional[float] = None):
+        self.outbox = outbox
+        self.digest_time = (digest_time if digest_time is not None else os.getenv("DIGEST_TIME", "")).strip()
+        if reminder_hours is None:
+            reminder_hours = float(os.getenv("DRAFT_REMINDER_HOURS", "0"))
+        self.reminder_hours = reminder_hours
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.digest_time) or self.reminder_hours > 0
+
+    def start(self, get_bot: Callable[[], Awaitable[Any]], get_storage: Optional[Callable[[], Any]] = None) -> None:
+        """
+        get_bot - корутина, возвращающая инициализированный бот (инициализация может быть ленивой),
+        get_storage - хранилище FSM диспетчера (нужно для напоминаний).
+        """
+        loop = asyncio.get_running_loop()
+        if self.digest_time:
+            self._tasks.append(loop.create_task(self._digest_loop(get_bot)))
+            logger.info(f"Ежедневный дайджест в {self.digest_time}")
+        if self.reminder_hours > 0 and get_storage is not None:
+            self._tasks.append(loop.create_task(self._reminder_loop(get_bot, get_storage)))
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def _digest_loop(self, get_bot: Callable[[], Awaitable[Any]]) -> None:
+        from deps import get_time_utils
+
+        while True:
+            now = get_time_utils().get_current_datetime()
+            await asyncio.sleep(seconds_until(self.digest_time, now))
+            try:
+                self.outbox.start(await get_bot())
+                await send_daily_digest(self.outbox)
+            except Exception as e:
+                logger.error(f"Ошибка ежедневного дайджеста: {e}")
+            # Не запускаться дважды в ту же минуту
+            await asyncio.sleep(60)
+
+    async def _reminder_loop(self, get_bot: Callable[[], Awaitable[Any]], get_storage: Callable[[], Any]) -> None:
+        while True:
+            await asyncio.sleep(3600)
+            try:
+                self.outbox.start(await get_bot())
+                await remind_unfinished_drafts(get_storage(), self.outbox, self.reminder_hours)
+            except Exception as e:
+                logger.error(f"Ошибка напоминаний о незавершённых поездках: {e}")
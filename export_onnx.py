@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Экспорт модели уровня топлива best.pt в ONNX (при желании с int8-квантованием)
+и проверка совпадения результатов с исходной моделью.
+
+Примеры:
+    python export_onnx.py --weights best.pt --output best.onnx
+    python export_onnx.py --int8 --calib-dir samples/ --validate-dir samples/
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+from typing import Iterator, List, Optional
+
+from PIL import Image
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def list_images(directory: str) -> List[str]:
+    """Возвращает отсортированный список изображений в папке."""
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def export(weights: str, output: str, imgsz: int, dynamic: bool, opset: Optional[int]) -> str:
+    """Экспортирует веса ultralytics в ONNX и кладёт файл по пути output."""
+    from ultralytics import YOLO
+
+    kwargs = {"format": "onnx", "imgsz": imgsz, "dynamic": dynamic, "simplify": True}
+    if opset:
+        kwargs["opset"] = opset
+    exported = YOLO(weights).export(**kwargs)
+    if os.path.abspath(exported) != os.path.abspath(output):
+        shutil.move(exported, output)
+    logger.info(f"ONNX модель сохранена: {output}")
+    return output
+
+
+class _CalibrationReader:
+    """Поставляет изображения калибровки для статического int8-квантования"""
+
+    def __init__(self, paths: List[str], input_name: str, imgsz: int):
+        self._iterator = self._batches(paths, input_name, imgsz)
+
+    @staticmethod
+    def _batches(paths: List[str], input_name: str, imgsz: int) -> Iterator[dict]:
+        from fuel_onnx import letterbox, to_input_tensor
+
+        for path in paths:
+            with Image.open(path) as image:
+                prepared = letterbox(image.convert("RGB"), imgsz)
+            yield {input_name: to_input_tensor(prepared[None])}
+
+    def get_next(self) -> Optional[dict]:
+        return next(self._iterator, None)
+
+
+def quantize(model_path: str, output: str, calib_dir: Optional[str], imgsz: int) -> str:
+    """Квантует ONNX модель в int8: статически по калибровочным фото или динамически."""
+    import onnxruntime as ort
+    from onnxruntime.quantization import QuantType, quantize_dynamic, quantize_static
+
+    if calib_dir:
+        input_name = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+        reader = _CalibrationReader(list_images(calib_dir), input_name, imgsz)
+        quantize_static(model_path, output, reader, activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    else:
+        logger.warning("Папка калибровки не указана – используется динамическое квантование")
+        quantize_dynamic(model_path, output, weight_type=QuantType.QUInt8)
+    logger.info(f"int8 модель сохранена: {output}")
+    return output
+
+
+def validate(weights: str, onnx_path: str, images_dir: str) -> float:
+    """Сравнивает количество палочек у best.pt и ONNX модели. Возвращает долю совпадений."""
+    from fuel_detector import BACKEND_ONNX, BACKEND_ULTRALYTICS, FuelDetector
+
+    reference = FuelDetector(weights, backend=BACKEND_ULTRALYTICS)
+    candidate = FuelDetector(onnx_path, backend=BACKEND_ONNX)
+    paths = list_images(images_dir)
+    if not paths:
+        logger.error(f"В папке {images_dir} нет изображений для проверки")
+        return 0.0
+
+    matches = 0
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        expected = reference.detect_fuel_level(data)[0]
+        actual = candidate.detect_fuel_level(data)[0]
+        if expected == actual:
+            matches += 1
+        else:
+            logger.warning(f"{os.path.basename(path)}: best.pt={expected}, onnx={actual}")
+
+    agreement = matches / len(paths)
+    logger.info(f"Совпадение с best.pt: {matches}/{len(paths)} ({agreement:.1%})")
+    return agreement
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Экспорт и проверка ONNX модели уровня топлива")
+    parser.add_argument("--weights", default="./best.pt", help="исходные веса ultralytics")
+    parser.add_argument("--output", default="./best.onnx", help="путь к ONNX модели")
+    parser.add_argument("--imgsz", type=int, default=640, help="размер входа модели")
+    parser.add_argument("--static-batch", action="store_true", help="экспорт без динамической размерности батча")
+    parser.add_argument("--opset", type=int, default=None, help="версия opset ONNX")
+    parser.add_argument("--skip-export", action="store_true", help="использовать уже экспортированный --output")
+    parser.add_argument("--int8", action="store_true", help="дополнительно квантовать модель в int8")
+    parser.add_argument("--int8-output", default="./best.int8.onnx", help="путь к int8 модели")
+    parser.add_argument("--calib-dir", default=None, help="папка с фото для статической калибровки int8")
+    parser.add_argument("--validate-dir", default=None, help="папка с фото для сравнения с best.pt")
+    parser.add_argument("--min-agreement", type=float, default=0.95, help="минимальная доля совпадений")
+    args = parser.parse_args()
+
+    model_path = args.output
+    if not args.skip_export:
+        model_path = export(args.weights, args.output, args.imgsz, not args.static_batch, args.opset)
+    if args.int8:
+        model_path = quantize(model_path, args.int8_output, args.calib_dir, args.imgsz)
+
+    if args.validate_dir:
+        agreement = validate(args.weights, model_path, args.validate_dir)
+        if agreement < args.min_agreement:
+            logger.error(f"Совпадение {agreement:.1%} ниже порога {args.min_agreement:.1%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
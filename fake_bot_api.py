@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Фейковый Telegram Bot API для нагрузочного теста.
+
+Отвечает на методы, которыми пользуется бот (sendMessage, editMessageText,
+answerCallbackQuery, getFile и т.д.), и отдаёт файлы по /file/bot<token>/<path>.
+Все ответы бота складываются в очередь своего чата, чтобы генератор нагрузки
+мог измерить время до ответа. Бот направляется сюда через TELEGRAM_API_URL.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+
+class BotReply(NamedTuple):
+    """Сообщение, которое бот отправил или отредактировал"""
+    method: str
+    message_id: int
+    text: str
+    buttons: List[str]  # callback_data кнопок
+    received_at: float
+
+
+def _callback_buttons(reply_markup: Optional[str]) -> List[str]:
+    if not reply_markup:
+        return []
+    try:
+        markup = json.loads(reply_markup)
+    except ValueError:
+        return []
+    return [
+        button["callback_data"]
+        for row in markup.get("inline_keyboard", [])
+        for button in row
+        if "callback_data" in button
+    ]
+
+
+class FakeBotApi:
+    """Bot API в памяти: сообщения по чатам и файлы по file_id"""
+
+    def __init__(self, bot_id: int = 1, photo: Optional[bytes] = None):
+        self.bot_user = {"id": bot_id, "is_bot": True, "first_name": "LoadTestBot", "username": "loadtest_bot"}
+        self.photo = photo
+        self.calls: Counter = Counter()
+        self._inboxes: Dict[int, asyncio.Queue] = {}
+        self._message_ids: Dict[int, int] = {}
+
+    def inbox(self, chat_id: int) -> asyncio.Queue:
+        """Очередь ответов бота в чате."""
+        queue = self._inboxes.get(chat_id)
+        if queue is None:
+            queue = self._inboxes[chat_id] = asyncio.Queue()
+        return queue
+
+    def next_message_id(self, chat_id: int) -> int:
+        """Номера сообщений общие для бота и водителя, как в настоящем чате."""
+        self._message_ids[chat_id] = self._message_ids.get(chat_id, 0) + 1
+        return self._message_ids[chat_id]
+
+    def _message(self, chat_id: int, message_id: int, text: str) -> Dict[str, Any]:
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": self.bot_user,
+            "text": text,
+        }
+
+    def _record(self, method: str, chat_id: int, message_id: int, data: Dict[str, str]) -> None:
+        reply = BotReply(method, message_id, data.get("text", ""), _callback_buttons(data.get("reply_markup")),
+                         time.perf_counter())
+        self.inbox(chat_id).put_nowait(reply)
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        data = {key: value for key, value in (await request.post()).items() if isinstance(value, str)}
+
+        if method == "getMe":
+            result: Any = self.bot_user
+        elif method == "sendMessage":
+            chat_id = int(data["chat_id"])
+            message_id = self.next_message_id(chat_id)
+            self._record(method, chat_id, message_id, data)
+            result = self._message(chat_id, message_id, data.get("text", ""))
+        elif method == "editMessageText":
+            chat_id = int(data["chat_id"])
+            message_id = int(data["message_id"])
+            self._record(method, chat_id, message_id, data)
+            result = self._message(chat_id, message_id, data.get("text", ""))
+        elif method == "getFile":
+            file_id = data["file_id"]
+            result = {
+                "file_id": file_id,
+                "file_unique_id": file_id,
+                "file_size": len(self.photo or b""),
+                "file_path": f"photos/{file_id}.jpg",
+            }
+        else:
+            # answerCallbackQuery, sendChatAction, deleteMessage и прочие
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def handle_file(self, request: web.Request) -> web.Response:
+        self.calls["download"] += 1
+        if self.photo is None:
+            return web.Response(status=404)
+        return web.Response(body=self.photo, content_type="image/jpeg")
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle_method)
+        app.router.add_get("/file/bot{token}/{path:.*}", self.handle_file)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Запускает сервер в текущем event loop. Возвращает базовый URL."""
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        actual_port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{actual_port}"
+
+    async def stop(self) -> None:
+        await self._runner.cleanup()
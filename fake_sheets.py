@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Фейковый Google Sheets API в памяти для нагрузочного теста и локального запуска.
+
+Повторяет ту часть интерфейса googleapiclient, которой пользуются
+GoogleSheetsClient и UsersRepository:
+service.spreadsheets().values().get/update/append(...).execute().
+Для отслеживания правок (sheet_watch.py) сервис ведёт счётчик ревизий каждой
+таблицы и отвечает на service.files().get(fileId=..., fields="version"), как
+Drive API. Ручную правку офиса в тесте имитируют прямые вызовы write() и
+delete_rows().
+Включается переменной SHEETS_BACKEND=fake. Задержку настоящего API можно
+имитировать через FAKE_SHEETS_LATENCY_MS: как и настоящий клиент, вызов
+блокирует поток.
+"""
+
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+_RANGE_RE = re.compile(r"^([A-Z]+)?(\d+)?(?::([A-Z]+)?(\d+)?)?$")
+
+
+def _column_index(letters: str) -> int:
+    """A -> 0, N -> 13, AA -> 26."""
+    index = 0
+    for char in letters:
+        index = index * 26 + (ord(char) - ord("A") + 1)
+    return index - 1
+
+
+def parse_range(a1_range: str) -> Tuple[str, int, Optional[int], int, Optional[int]]:
+    """
+    Разбирает "Лист!A1:N5" в (лист, первая колонка, последняя колонка,
+    первая строка, последняя строка). Индексы с нуля, None - без ограничения.
+    """
+    sheet, _, cells = a1_range.rpartition("!")
+    sheet = sheet.strip("'")
+    match = _RANGE_RE.match(cells)
+    if not match:
+        raise ValueError(f"Некорректный диапазон: {a1_range}")
+    start_col, start_row, end_col, end_row = match.groups()
+    first_col = _column_index(start_col) if start_col else 0
+    first_row = int(start_row) - 1 if start_row else 0
+    if ":" in cells:
+        last_col = _column_index(end_col) if end_col else None
+        last_row = int(end_row) - 1 if end_row else None
+    else:
+        last_col, last_row = first_col, first_row
+    return sheet, first_col, last_col, first_row, last_row
+
+
+class _Request:
+    def __init__(self, service: "FakeSheetsService", action: Any):
+        self._service = service
+        self._action = action
+
+    def execute(self) -> Dict[str, Any]:
+        if self._service.latency:
+            time.sleep(self._service.latency)
+        with self._service.lock:
+            self._service.calls += 1
+            return self._action()
+
+
+class _Values:
+    def __init__(self, service: "FakeSheetsService"):
+        self._service = service
+
+    def get(self, spreadsheetId: str, range: str, **kwargs: Any) -> _Request:
+        return _Request(self._service, lambda: self._service.read(range, spreadsheetId))
+
+    def update(self, spreadsheetId: str, range: str, body: Dict[str, Any], **kwargs: Any) -> _Request:
+        return _Request(self._service, lambda: self._service.write(range, body.get("values", []), spreadsheetId))
+
+    def append(self, spreadsheetId: str, range: str, body: Dict[str, Any], **kwargs: Any) -> _Request:
+        return _Request(self._service, lambda: self._service.append(range, body.get("values", []), spreadsheetId))
+
+
+class _Files:
+    def __init__(self, service: "FakeSheetsService"):
+        self._service = service
+
+    def get(self, fileId: str, fields: str = "", **kwargs: Any) -> _Request:
+        return _Request(self._service, lambda: {"id": fileId, "version": str(self._service.revisions.get(fileId, 1))})
+
+
+class FakeSheetsService:
+    """Таблицы в памяти: id таблицы -> лист -> список строк"""
+
+    def __init__(self, latency_ms: Optional[float] = None):
+        if latency_ms is None:
+            latency_ms = float(os.getenv("FAKE_SHEETS_LATENCY_MS", "0"))
+        self.latency = latency_ms / 1000
+        self.spreadsheets_data: Dict[str, Dict[str, List[List[str]]]] = {}
+        # Версия каждой таблицы: растёт при любой записи, как version файла в Drive
+        self.revisions: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def spreadsheets(self) -> "FakeSheetsService":
+        return self
+
+    def values(self) -> _Values:
+        return _Values(self)
+
+    def files(self) -> _Files:
+        return _Files(self)
+
+    def _bump_revision(self, spreadsheet_id: str) -> None:
+        self.revisions[spreadsheet_id] = self.revisions.get(spreadsheet_id, 1) + 1
+
+    def sheet_rows(self, spreadsheet_id: str, sheet: str) -> List[List[str]]:
+        return self.spreadsheets_data.setdefault(spreadsheet_id, {}).setdefault(sheet, [])
+
+    def read(self, a1_range: str, spreadsheet_id: str = "") -> Dict[str, Any]:
+        sheet, first_col, last_col, first_row, last_row = parse_range(a1_range)
+        rows = self.spreadsheets_data.get(spreadsheet_id, {}).get(sheet, [])
+        end_row = len(rows) if last_row is None else min(last_row + 1, len(rows))
+        values = []
+        for row in rows[first_row:end_row]:
+            cells = row[first_col:None if last_col is None else last_col + 1]
+            # Как и настоящий API: пустые ячейки в конце строки не возвращаются
+            while cells and cells[-1] == "":
+                cells = cells[:-1]
+            values.append(cells)
+        # Пустые строки в конце диапазона тоже отбрасываются
+        while values and not values[-1]:
+            values.pop()
+        result: Dict[str, Any] = {"range": a1_range, "majorDimension": "ROWS"}
+        if values:
+            result["values"] = values
+        return result
+
+    def write(self, a1_range: str, values: List[List[Any]], spreadsheet_id: str = "") -> Dict[str, Any]:
+        sheet, first_col, _, first_row, _ = parse_range(a1_range)
+        rows = self.sheet_rows(spreadsheet_id, sheet)
+        for offset, new_row in enumerate(values):
+            row_index = first_row + offset
+            while len(rows) <= row_index:
+                rows.append([])
+            row = rows[row_index]
+            needed = first_col + len(new_row)
+            if len(row) < needed:
+                row.extend([""] * (needed - len(row)))
+            row[first_col:needed] = ["" if cell is None else str(cell) for cell in new_row]
+        self._bump_revision(spreadsheet_id)
+        return {"updatedRange": a1_range, "updatedRows": len(values)}
+
+    def append(self, a1_range: str, values: List[List[Any]], spreadsheet_id: str = "") -> Dict[str, Any]:
+        sheet, first_col, _, _, _ = parse_range(a1_range)
+        rows = self.sheet_rows(spreadsheet_id, sheet)
+        # Новые строки пишутся после последней непустой
+        while rows and not any(rows[-1]):
+            rows.pop()
+        for new_row in values:
+            rows.append([""] * first_col + ["" if cell is None else str(cell) for cell in new_row])
+        self._bump_revision(spreadsheet_id)
+        return {"updates": {"updatedRange": a1_range, "updatedRows": len(values)}}
+
+    def delete_rows(self, spreadsheet_id: str, sheet: str, first_row: int, last_row: Optional[int] = None) -> None:
+        """Удаляет строки first_row..last_row (с единицы, как в листе) - нижние сдвигаются вверх."""
+        with self.lock:
+            rows = self.sheet_rows(spreadsheet_id, sheet)
+            del rows[first_row - 1:(last_row if last_row is not None else first_row)]
+            self._bump_revision(spreadsheet_id)
+
+
+_service: Optional[FakeSheetsService] = None
+_service_lock = threading.Lock()
+
+
+def get_fake_sheets_service() -> FakeSheetsService:
+    """Общий экземпляр: клиенты всех компаний видят одни и те же таблицы."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = FakeSheetsService()
+        return _service
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Быстрый JSON для горячих путей: ответы webhook и ответы Google Sheets API.
+
+Если установлен orjson, используется он, иначе стандартный json.
+Модуль лёгкий: googleapiclient импортируется только при создании модели
+для Sheets, а не при импорте сервера.
+"""
+
+import json
+import re
+from typing import Any, Optional
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # необязательная зависимость
+    orjson = None
+
+if orjson is not None:
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+else:
+    FastJSONResponse = JSONResponse  # type: ignore[misc]
+
+# update_id в обновлении Telegram всегда на верхнем уровне; внутри строк кавычки экранированы
+_UPDATE_ID_RE = re.compile(rb'(?<!\\)"update_id"\s*:\s*(\d+)')
+
+
+def loads(data: Any) -> Any:
+    """Разбирает JSON из bytes или str."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode("utf-8")
+    return json.loads(data)
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Сериализует значение в JSON (UTF-8 байты). Тело запроса должно быть байтами:
+    строку http.client кодирует в latin-1 и падает на кириллице.
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+def extract_update_id(body: bytes) -> Optional[int]:
+    """Достаёт update_id из сырого тела webhook без разбора всего JSON."""
+    match = _UPDATE_ID_RE.search(body)
+    return int(match.group(1)) if match else None
+
+
+def make_sheets_json_model() -> Any:
+    """Модель googleapiclient, разбирающая ответы API через быстрый JSON."""
+    from googleapiclient.model import JsonModel
+
+    class FastJsonModel(JsonModel):
+        def serialize(self, body_value: Any) -> bytes:
+            if isinstance(body_value, dict) and "data" not in body_value and self._data_wrapper:
+                body_value = {"data": body_value}
+            return dumps(body_value)
+
+        def deserialize(self, content: Any) -> Any:
+            try:
+                body = loads(content)
+            except ValueError:
+                # Как и JsonModel: не-JSON ответ отдаём как есть
+                if isinstance(content, bytes):
+                    content = content.decode("utf-8")
+                return content
+            if self._data_wrapper and isinstance(body, dict) and "data" in body:
+                body = body["data"]
+            return body
+
+    return FastJsonModel()
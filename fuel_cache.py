@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+LRU-кэш результатов детекции топлива.
+
+Ключи - file_unique_id фото в Telegram и хэш содержимого файла, поэтому
+повторно присланное или пересланное фото не скачивается и не прогоняется
+через модель ещё раз. При заданном пути кэш сохраняется в JSON-файл:
+изменения копятся и записываются фоновым таймером не чаще раза в
+FUEL_CACHE_SAVE_DELAY секунд (и при завершении процесса), а не на каждый результат.
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+CachedResult = Tuple[int, float, str]
+
+
+class FuelResultCache:
+    """Ограниченный по размеру кэш (bars_count, fuel_liters, status)"""
+
+    def __init__(self, max_size: Optional[int] = None, path: Optional[str] = None):
+        if max_size is None:
+            max_size = int(os.getenv("FUEL_CACHE_SIZE", "512"))
+        self.max_size = max(max_size, 1)
+        self.path = path if path is not None else os.getenv("FUEL_CACHE_PATH", "").strip()
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self.save_delay = float(os.getenv("FUEL_CACHE_SAVE_DELAY", "5"))
+        self._save_timer: Optional[threading.Timer] = None
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        if self.path:
+            self._load()
+            atexit.register(self.flush)
+
+    @staticmethod
+    def content_key(data: Union[bytes, memoryview]) -> str:
+        """Ключ по содержимому файла."""
+        return "sha256:" + hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def file_key(file_unique_id: str) -> str:
+        """Ключ по постоянному идентификатору файла в Telegram."""
+        return "tg:" + file_unique_id
+
+    def get(self, *keys: str) -> Optional[CachedResult]:
+        """Возвращает результат по первому найденному ключу."""
+        with self._lock:
+            for key in keys:
+                result = self._entries.get(key)
+                if result is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+            self.misses += 1
+            return None
+
+    def put(self, result: CachedResult, *keys: str) -> None:
+        """Сохраняет результат под всеми переданными ключами."""
+        with self._lock:
+            for key in keys:
+                self._entries[key] = result
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        if self.path:
+            self._schedule_save()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                items = json.load(f)
+            for key, (bars_count, fuel_liters, status) in items[-self.max_size:]:
+                self._entries[key] = (int(bars_count), float(fuel_liters), status)
+            logger.info(f"Загружено {len(self._entries)} результатов детекции из кэша {self.path}")
+        except (OSError, ValueError, TypeError) as e:
+            logger.error(f"Не удалось прочитать кэш детекции {self.path}: {e}")
+
+    def _schedule_save(self) -> None:
+        """Откладывает запись файла: результаты за save_delay секунд пишутся одним разом в фоне."""
+        with self._lock:
+            self._dirty = True
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self) -> None:
+        """Записывает накопленные изменения в файл (из таймера и при завершении)."""
+        with self._file_lock:
+            with self._lock:
+                if self._save_timer is not None:
+                    self._save_timer.cancel()
+                    self._save_timer = None
+                if not self._dirty:
+                    return
+                self._dirty = False
+                items = [[key, list(value)] for key, value in self._entries.items()]
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(items, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.error(f"Не удалось сохранить кэш детекции {self.path}: {e}")
+
+
+# Глобальный кэш результатов
+fuel_cache = FuelResultCache()
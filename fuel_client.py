@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Клиент отдельного процесса инференса (fuel_worker.py).
+
+Отправляет фото воркеру с таймаутом. Если воркер недоступен, перегружен
+или не ответил вовремя, детекция выполняется в текущем процессе
+(если разрешён фолбэк) либо возвращается ошибка для водителя.
+"""
+
+import asyncio
+import logging
+import os
+from typing import TYPE_CHECKING, Optional, Tuple
+
+import aiohttp
+
+if TYPE_CHECKING:
+    from fuel_preprocess import ImageSource
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INPUT_SIZE = 640
+
+
+class FuelWorkerClient:
+    """Детекция топлива через воркер по Unix-сокету или локальному HTTP"""
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        socket_path: Optional[str] = None,
+        timeout: Optional[float] = None,
+        fallback: Optional[bool] = None,
+    ):
+        self.socket_path = socket_path if socket_path is not None else os.getenv("FUEL_WORKER_SOCKET", "").strip()
+        base_url = url if url is not None else os.getenv("FUEL_WORKER_URL", "").strip()
+        # Для Unix-сокета хост в URL не важен
+        self.base_url = (base_url or "http://fuel-worker").rstrip("/")
+        if timeout is None:
+            timeout = float(os.getenv("FUEL_WORKER_TIMEOUT", "20"))
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        if fallback is None:
+            fallback = os.getenv("FUEL_WORKER_FALLBACK", "1") == "1"
+        self.fallback = fallback
+        self.input_size = int(os.getenv("FUEL_IMGSZ", DEFAULT_INPUT_SIZE))
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.UnixConnector(path=self.socket_path) if self.socket_path else None
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def detect(self, image_data: "ImageSource") -> Tuple[Optional[int], Optional[float], str]:
+        """Возвращает (bars_count, fuel_liters, status) от воркера или из фолбэка."""
+        try:
+            async with self._get_session().post(f"{self.base_url}/detect", data=image_data) as response:
+                if response.status == 200:
+                    payload = await response.json()
+                    return payload["bars_count"], payload["fuel_liters"], payload["status"]
+                logger.warning(f"Воркер инференса ответил {response.status}")
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError) as e:
+            logger.warning(f"Воркер инференса недоступен: {e!r}")
+
+        if not self.fallback:
+            return None, None, "❌ Сервис распознавания временно недоступен"
+
+        logger.info("Детекция в текущем процессе (фолбэк)")
+        if hasattr(image_data, "seek"):
+            image_data.seek(0)
+        from fuel_queue import fuel_queue  # загружаем детектор только при фолбэке
+        return await fuel_queue.detect(image_data)
+
+    async def warm_up(self) -> bool:
+        """Просит воркер загрузить модель заранее. Ошибки не критичны."""
+        try:
+            async with self._get_session().post(
+                f"{self.base_url}/warmup", timeout=aiohttp.ClientTimeout(total=2)
+            ) as response:
+                return response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.debug(f"Не удалось прогреть воркер инференса: {e!r}")
+            return False
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
@@ -6,66 +6,171 @@
 import logging
 import os
 import io
-from typing import Optional, Tuple
+import threading
+import time
+from typing import List, Optional, Tuple
 from PIL import Image
 
+from fuel_preprocess import ImageSource, decode_image
+from tracing import span
+
 logger = logging.getLogger(__name__)
 
 
+# Бэкенды инференса: полный стек ultralytics/torch или экспортированная ONNX модель
+BACKEND_ULTRALYTICS = "ultralytics"
+BACKEND_ONNX = "onnx"
+DEFAULT_MODEL_PATHS = {
+    BACKEND_ULTRALYTICS: "./best.pt",
+    BACKEND_ONNX: "./best.onnx",
+}
+DEFAULT_INPUT_SIZE = 640
+
+
 class FuelDetector:
     """Класс для детекции уровня топлива с помощью YOLOv8"""
 
-    def __init__(self, model_path: str = "./best.pt"):
-        self.model_path = model_path
+    def __init__(self, model_path: Optional[str] = None, backend: Optional[str] = None):
+        self.backend = (backend or os.getenv("FUEL_BACKEND", BACKEND_ULTRALYTICS)).strip().lower()
+        if self.backend not in DEFAULT_MODEL_PATHS:
+            logger.error(f"Неизвестный бэкенд детекции {self.backend!r}, используется {BACKEND_ULTRALYTICS}")
+            self.backend = BACKEND_ULTRALYTICS
+        self.model_path = model_path or os.getenv("FUEL_MODEL_PATH") or DEFAULT_MODEL_PATHS[self.backend]
         self.model = None  # Ленивая загрузка
+        self.last_used = 0.0  # time.monotonic() последнего обращения к модели
+        self._active = 0  # сколько вызовов модели выполняется прямо сейчас
+        self._state_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    @property
+    def input_size(self) -> int:
+        """Размер входа модели: до него уменьшаются фото ещё при декодировании."""
+        model_size = getattr(self.model, "imgsz", None)
+        if isinstance(model_size, int):
+            return model_size
+        return int(os.getenv("FUEL_IMGSZ", DEFAULT_INPUT_SIZE))
 
     def _load_model(self) -> bool:
-        """Загружает модель YOLO по требованию."""
+        """Загружает модель выбранного бэкенда по требованию."""
         if self.model is not None:
             return True
+        with self._load_lock:
+            if self.model is not None:
+                return True
+            return self._load_model_locked()
+
+    def _load_model_locked(self) -> bool:
         try:
             if not os.path.exists(self.model_path):
                 logger.error(f"Модель не найдена: {self.model_path}")
                 return False
-            from ultralytics import YOLO  # импортируем только при необходимости
-            self.model = YOLO(self.model_path)
-            logger.info(f"Модель YOLO загружена: {self.model_path}")
+            if self.backend == BACKEND_ONNX:
+                from fuel_onnx import OnnxFuelModel  # импортируем только при необходимости
+                self.model = OnnxFuelModel(self.model_path)
+            else:
+                from ultralytics import YOLO  # импортируем только при необходимости
+                self.model = YOLO(self.model_path)
+            logger.info(f"Модель YOLO загружена: {self.model_path} (бэкенд: {self.backend})")
             return True
         except ImportError:
-            logger.error("Не удалось импортировать ultralytics. Установите зависимость: pip install ultralytics")
+            package = "onnxruntime" if self.backend == BACKEND_ONNX else "ultralytics"
+            logger.error(f"Не удалось импортировать {package}. Установите зависимость: pip install {package}")
             return False
         except Exception as e:
             logger.error(f"Ошибка при загрузке модели: {e}")
             return False
 
-    def detect_fuel_level(self, image_data: bytes) -> Tuple[Optional[int], Optional[float], str]:
-        """Детекция уровня топлива на изображении."""
-        # Ленивая загрузка модели
-        if self.model is None and not self._load_model():
-            return None, None, "❌ Модель не загружена (проверьте зависимости и файл best.pt)"
+    def _count_bars(self, images: List[Image.Image]) -> List[int]:
+        """Прогоняет пачку изображений через модель и возвращает количество палочек."""
+        if self.backend == BACKEND_ONNX:
+            return self.model.count_bars(images)
+        predictions = self.model(images)
+        return [
+            len(result.boxes) if getattr(result, 'boxes', None) is not None else 0
+            for result in (predictions or [])
+        ]
+
+    def detect_fuel_level(self, image_data: ImageSource) -> Tuple[Optional[int], Optional[float], str]:
+        """Детекция уровня топлива на изображении (байты или файловый объект)."""
+        return self.detect_fuel_levels([image_data])[0]
+
+    def detect_fuel_levels(self, images_data: List[ImageSource]) -> List[Tuple[Optional[int], Optional[float], str]]:
+        """Детекция уровня топлива сразу на нескольких изображениях (один вызов модели)."""
+        with self._state_lock:
+            self._active += 1
+            self.last_used = time.monotonic()
         try:
-            image = Image.open(io.BytesIO(image_data))
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            results = self.model(image)
-            if not results or len(results) == 0:
-                return 0, 0.0, "❌ Не удалось обработать изображение"
-            result = results[0]
-            bars_count = len(result.boxes) if getattr(result, 'boxes', None) is not None else 0
-            fuel_liters = bars_count * 6.25
-            status = (
-                f"✅ Найдено {bars_count} палочек уровня топлива" if bars_count > 0
-                else "❌ Палочки уровня топлива не найдены на фото"
-            )
-            logger.info(f"Детекция завершена: {bars_count} палочек, {fuel_liters} литров")
-            return bars_count, fuel_liters, status
-        except Exception as e:
-            logger.error(f"Ошибка при детекции: {e}")
-            return None, None, f"❌ Ошибка обработки изображения: {str(e)}"
+            return self._detect(images_data)
+        finally:
+            with self._state_lock:
+                self._active -= 1
+                self.last_used = time.monotonic()
+
+    def _detect(self, images_data: List[ImageSource]) -> List[Tuple[Optional[int], Optional[float], str]]:
+        # Ленивая загрузка модели
+        if self.model is None:
+            with span("fuel.load_model", backend=self.backend):
+                loaded = self._load_model()
+        else:
+            loaded = True
+        if not loaded:
+            message = f"❌ Модель не загружена (проверьте зависимости и файл {os.path.basename(self.model_path)})"
+            return [(None, None, message)] * len(images_data)
+
+        results: List[Optional[Tuple[Optional[int], Optional[float], str]]] = [None] * len(images_data)
+        images = []
+        positions = []
+        for i, image_data in enumerate(images_data):
+            try:
+                stream = io.BytesIO(image_data) if isinstance(image_data, bytes) else image_data
+                images.append(decode_image(stream, self.input_size))
+                positions.append(i)
+            except Exception as e:
+                logger.error(f"Ошибка при чтении изображения: {e}")
+                results[i] = (None, None, f"❌ Ошибка обработки изображения: {str(e)}")
+
+        if images:
+            try:
+                with span("fuel.inference", batch_size=len(images), backend=self.backend):
+                    counts = self._count_bars(images)
+            except Exception as e:
+                logger.error(f"Ошибка при детекции: {e}")
+                counts = None
+                for i in positions:
+                    results[i] = (None, None, f"❌ Ошибка обработки изображения: {str(e)}")
+
+            if counts is not None:
+                for j, i in enumerate(positions):
+                    if j >= len(counts):
+                        results[i] = (0, 0.0, "❌ Не удалось обработать изображение")
+                    else:
+                        results[i] = self._make_result(counts[j])
+
+        logger.info(f"Детекция завершена: {len(images_data)} изображений за один вызов модели")
+        return results  # type: ignore[return-value]
+
+    @staticmethod
+    def _make_result(bars_count: int) -> Tuple[int, float, str]:
+        fuel_liters = bars_count * 6.25
+        status = (
+            f"✅ Найдено {bars_count} палочек уровня топлива" if bars_count > 0
+            else "❌ Палочки уровня топлива не найдены на фото"
+        )
+        logger.info(f"Детекция: {bars_count} палочек, {fuel_liters} литров")
+        return bars_count, fuel_liters, status
 
     def is_available(self) -> bool:
         return self.model is not None
 
+    def unload(self) -> bool:
+        """Выгружает модель, если она сейчас не используется. Возвращает True, если выгрузили."""
+        with self._state_lock:
+            if self.model is None or self._active:
+                return False
+            self.model = None
+        logger.info(f"Модель выгружена из памяти: {self.model_path}")
+        return True
+
 
 # Глобальный экземпляр (лёгкий, модель загружается при первом использовании)
 fuel_detector = FuelDetector()
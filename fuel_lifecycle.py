@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Управление жизненным циклом модели топлива.
+
+Большинство обновлений (время, одометры, комментарии) модель не используют,
+поэтому после периода простоя она выгружается из памяти, а кэши аллокаторов
+освобождаются. Перед фото (состояние waiting_fuel_photo) модель заранее
+загружается снова.
+"""
+
+import asyncio
+import ctypes
+import gc
+import logging
+import os
+import resource
+import sys
+import time
+from typing import Any, Dict, Optional
+
+from fuel_detector import FuelDetector
+
+logger = logging.getLogger(__name__)
+
+
+def current_rss_mb() -> float:
+    """Текущий резидентный размер процесса в мегабайтах."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # Нет /proc (не Linux): отдаём пиковое значение
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def release_allocator_memory() -> None:
+    """Возвращает освобождённую память системе: сборка мусора, кэши torch, malloc_trim."""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        try:
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except Exception as e:
+            logger.debug(f"Не удалось очистить кэш torch: {e}")
+    if sys.platform.startswith("linux"):
+        try:
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+
+class FuelModelManager:
+    """Выгружает модель после простоя и загружает её заново по требованию"""
+
+    def __init__(
+        self,
+        detector: FuelDetector,
+        idle_timeout: Optional[float] = None,
+        check_interval: Optional[float] = None,
+    ):
+        self.detector = detector
+        if idle_timeout is None:
+            idle_timeout = float(os.getenv("FUEL_MODEL_IDLE_TIMEOUT", "600"))
+        self.idle_timeout = idle_timeout  # 0 - никогда не выгружать
+        if check_interval is None:
+            check_interval = min(max(self.idle_timeout / 4, 1.0), 60.0)
+        self.check_interval = check_interval
+        self.loads = 0
+        self.unloads = 0
+        self.last_load: Dict[str, float] = {}
+        self.last_unload: Dict[str, float] = {}
+        self._watch_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Запускает фоновую проверку простоя (нужен работающий event loop)."""
+        if self.idle_timeout <= 0:
+            return
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.get_running_loop().create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+
+    async def warm_up(self) -> bool:
+        """Загружает модель заранее, если она ещё не в памяти."""
+        self.start()
+        if self.detector.is_available():
+            return True
+        # Водитель вот-вот пришлёт фото: не даём выгрузить модель сразу после загрузки
+        self.detector.last_used = time.monotonic()
+        rss_before = current_rss_mb()
+        started = time.perf_counter()
+        loaded = await asyncio.to_thread(self.detector._load_model)
+        if loaded:
+            self.loads += 1
+            self.last_load = {
+                "seconds": round(time.perf_counter() - started, 3),
+                "rss_before_mb": round(rss_before, 1),
+                "rss_after_mb": round(current_rss_mb(), 1),
+            }
+            logger.info(
+                f"Модель загружена за {self.last_load['seconds']} с, RSS "
+                f"{self.last_load['rss_before_mb']} → {self.last_load['rss_after_mb']} МБ"
+            )
+        return loaded
+
+    def unload(self) -> bool:
+        """Выгружает модель и освобождает память. Возвращает True, если выгрузили."""
+        rss_before = current_rss_mb()
+        if not self.detector.unload():
+            return False
+        release_allocator_memory()
+        self.unloads += 1
+        self.last_unload = {
+            "rss_before_mb": round(rss_before, 1),
+            "rss_after_mb": round(current_rss_mb(), 1),
+        }
+        logger.info(
+            f"Модель выгружена после простоя, RSS "
+            f"{self.last_unload['rss_before_mb']} → {self.last_unload['rss_after_mb']} МБ"
+        )
+        return True
+
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self.detector.last_used
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            if self.detector.is_available() and self.idle_seconds() >= self.idle_timeout:
+                await asyncio.to_thread(self.unload)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model_loaded": self.detector.is_available(),
+            "idle_timeout_s": self.idle_timeout,
+            "idle_s": round(self.idle_seconds(), 1) if self.detector.last_used else None,
+            "loads": self.loads,
+            "unloads": self.unloads,
+            "last_load": self.last_load,
+            "last_unload": self.last_unload,
+            "rss_mb": round(current_rss_mb(), 1),
+        }
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+ONNX Runtime бэкенд для модели уровня топлива (без torch и ultralytics).
+
+Запускает экспортированную (при желании int8-квантованную) YOLOv8 модель
+с собственной предобработкой (letterbox) и постобработкой (NMS).
+OpenVINO подключается через провайдер onnxruntime-openvino:
+FUEL_ONNX_PROVIDERS=OpenVINOExecutionProvider,CPUExecutionProvider
+"""
+
+import logging
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Значения по умолчанию совпадают с ultralytics predict
+DEFAULT_CONF_THRESHOLD = 0.25
+DEFAULT_IOU_THRESHOLD = 0.7
+LETTERBOX_COLOR = (114, 114, 114)
+# Смещение боксов разных классов, чтобы NMS не подавлял их друг другом
+MAX_WH = 7680
+
+
+def letterbox(image: Image.Image, size: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Вписывает изображение в size x size с сохранением пропорций (HWC, uint8).
+
+    Если передан out, результат пишется в этот буфер без новых аллокаций.
+    """
+    width, height = image.size
+    scale = min(size / width, size / height)
+    new_w, new_h = max(int(round(width * scale)), 1), max(int(round(height * scale)), 1)
+    if (new_w, new_h) != (width, height):
+        image = image.resize((new_w, new_h), Image.BILINEAR)
+    if out is None:
+        out = np.empty((size, size, 3), dtype=np.uint8)
+    out[...] = LETTERBOX_COLOR
+    top = (size - new_h) // 2
+    left = (size - new_w) // 2
+    out[top:top + new_h, left:left + new_w] = np.asarray(image)
+    return out
+
+
+def to_input_tensor(images: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Собирает батч NCHW float32 в диапазоне 0..1 из батча NHWC uint8."""
+    images = np.asarray(images)
+    if out is None:
+        out = np.empty((images.shape[0], 3, images.shape[1], images.shape[2]), dtype=np.float32)
+    np.multiply(images.transpose(0, 3, 1, 2), np.float32(1 / 255), out=out)
+    return out
+
+
+class _FrameBuffers(threading.local):
+    """Переиспользуемые буферы кадров и входного тензора (свои в каждом потоке)"""
+
+    def __init__(self):
+        self.frames = np.empty((0, 0, 0, 3), dtype=np.uint8)
+        self.tensor = np.empty((0, 3, 0, 0), dtype=np.float32)
+
+    def get(self, batch: int, size: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self.frames.shape[0] < batch or self.frames.shape[1] != size:
+            self.frames = np.empty((batch, size, size, 3), dtype=np.uint8)
+            self.tensor = np.empty((batch, 3, size, size), dtype=np.float32)
+        return self.frames[:batch], self.tensor[:batch]
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> List[int]:
+    """Жадный NMS по боксам в формате xyxy. Возвращает индексы оставленных боксов."""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+    keep: List[int] = []
+    while order.size > 0:
+        i = int(order[0])
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(x1[i], x1[rest])
+        yy1 = np.maximum(y1[i], y1[rest])
+        xx2 = np.minimum(x2[i], x2[rest])
+        yy2 = np.minimum(y2[i], y2[rest])
+        inter = (xx2 - xx1).clip(0) * (yy2 - yy1).clip(0)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return keep
+
+
+def count_detections(
+    prediction: np.ndarray,
+    conf_threshold: float = DEFAULT_CONF_THRESHOLD,
+    iou_threshold: float = DEFAULT_IOU_THRESHOLD,
+) -> int:
+    """Считает объекты в выходе YOLOv8 для одного изображения: (4 + nc, N)."""
+    candidates = prediction.T
+    class_scores = candidates[:, 4:]
+    classes = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(candidates)), classes]
+    mask = scores > conf_threshold
+    if not mask.any():
+        return 0
+    xywh = candidates[mask, :4]
+    scores = scores[mask]
+    offsets = (classes[mask] * MAX_WH)[:, None]
+    boxes = np.empty_like(xywh)
+    boxes[:, 0] = xywh[:, 0] - xywh[:, 2] / 2
+    boxes[:, 1] = xywh[:, 1] - xywh[:, 3] / 2
+    boxes[:, 2] = xywh[:, 0] + xywh[:, 2] / 2
+    boxes[:, 3] = xywh[:, 1] + xywh[:, 3] / 2
+    return len(nms(boxes + offsets, scores, iou_threshold))
+
+
+class OnnxFuelModel:
+    """Модель YOLOv8 в ONNX Runtime, возвращает количество найденных палочек"""
+
+    def __init__(
+        self,
+        model_path: str,
+        providers: Optional[List[str]] = None,
+        num_threads: Optional[int] = None,
+    ):
+        import onnxruntime as ort  # импортируем только при необходимости
+
+        if providers is None:
+            providers = [p.strip() for p in os.getenv("FUEL_ONNX_PROVIDERS", "CPUExecutionProvider").split(",") if p.strip()]
+        if num_threads is None:
+            num_threads = int(os.getenv("FUEL_NUM_THREADS", "0"))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        available = set(ort.get_available_providers())
+        providers = [p for p in providers if p in available] or ["CPUExecutionProvider"]
+
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=providers)
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch_dim, _, height, _ = model_input.shape
+        self.imgsz = height if isinstance(height, int) else 640
+        # Модель без динамической размерности батча обрабатывает фото по одному
+        self.max_batch = batch_dim if isinstance(batch_dim, int) else None
+        self.conf_threshold = float(os.getenv("FUEL_CONF_THRESHOLD", DEFAULT_CONF_THRESHOLD))
+        self.iou_threshold = float(os.getenv("FUEL_IOU_THRESHOLD", DEFAULT_IOU_THRESHOLD))
+        self._buffers = _FrameBuffers()
+        logger.info(f"ONNX модель загружена: {model_path} (провайдеры: {', '.join(self.session.get_providers())})")
+
+    def count_bars(self, images: List[Image.Image]) -> List[int]:
+        """Возвращает количество палочек для каждого изображения."""
+        step = self.max_batch or len(images) or 1
+        counts: List[int] = []
+        for start in range(0, len(images), step):
+            chunk = images[start:start + step]
+            frames, tensor = self._buffers.get(len(chunk), self.imgsz)
+            for frame, image in zip(frames, chunk):
+                letterbox(image, self.imgsz, out=frame)
+            to_input_tensor(frames, out=tensor)
+            output = self.session.run(None, {self.input_name: tensor})[0]
+            counts.extend(
+                count_detections(prediction, self.conf_threshold, self.iou_threshold)
+                for prediction in output
+            )
+        return counts
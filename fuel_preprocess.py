@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Предобработка фото приборной панели перед инференсом.
+
+JPEG декодируется сразу в уменьшенном разрешении (draft-режим: масштабирование
+в DCT-области в 2/4/8 раз), поэтому полноразмерное изображение в памяти
+не создаётся. После этого картинка доводится до входного размера модели.
+
+PIL импортируется в decode_image: select_photo_size нужен и процессу бота,
+который при отдельном воркере (FUEL_WORKER_URL) сам фото не декодирует.
+"""
+
+from typing import TYPE_CHECKING, Any, BinaryIO, Sequence, Union
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+ImageSource = Union[bytes, BinaryIO]
+
+
+def select_photo_size(sizes: Sequence[Any], target_size: int) -> Any:
+    """Выбирает наименьший размер фото, длинная сторона которого не меньше target_size.
+
+    Если все размеры меньше, возвращает самый большой.
+    """
+    suitable = [size for size in sizes if max(size.width, size.height) >= target_size]
+    if suitable:
+        return min(suitable, key=lambda size: size.width * size.height)
+    return max(sizes, key=lambda size: size.width * size.height)
+
+
+def decode_image(source: BinaryIO, target_size: int) -> "Image.Image":
+    """Декодирует изображение так, чтобы длинная сторона не превышала target_size."""
+    from PIL import Image
+
+    image = Image.open(source)
+    width, height = image.size
+    scale = min(target_size / max(width, height), 1.0)
+    fitted = (max(int(round(width * scale)), 1), max(int(round(height * scale)), 1))
+
+    if image.format == "JPEG" and scale < 1.0:
+        # draft выбирает наибольшее уменьшение, при котором обе стороны не меньше запрошенных
+        image.draft("RGB", fitted)
+    image.load()
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if image.size != fitted:
+        image = image.resize(fitted, Image.BILINEAR, reducing_gap=2.0)
+    return image
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Очередь инференса топлива с микро-батчингом.
+
+Фото от разных водителей, пришедшие почти одновременно, собираются в течение
+короткого окна (или до максимального размера пачки) и прогоняются через
+модель одним вызовом. Каждый вызывающий получает свой результат.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+from typing import List, Optional, Set, Tuple
+
+from fuel_detector import FuelDetector, fuel_detector
+from fuel_lifecycle import FuelModelManager
+from fuel_preprocess import ImageSource
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+DetectionResult = Tuple[Optional[int], Optional[float], str]
+
+
+class FuelInferenceQueue:
+    """Собирает изображения в пачки и отдаёт их модели в отдельном потоке"""
+
+    def __init__(
+        self,
+        detector: FuelDetector,
+        window_ms: Optional[float] = None,
+        max_batch_size: Optional[int] = None,
+    ):
+        self.detector = detector
+        self.lifecycle = FuelModelManager(detector)
+        if window_ms is None:
+            window_ms = float(os.getenv("FUEL_BATCH_WINDOW_MS", "50"))
+        if max_batch_size is None:
+            max_batch_size = int(os.getenv("FUEL_BATCH_MAX_SIZE", "8"))
+        self.window = max(window_ms, 0.0) / 1000
+        self.max_batch_size = max(max_batch_size, 1)
+
+        self._pending: List[Tuple[ImageSource, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Модель обрабатывает пачки строго по одной: пока идёт инференс,
+        # новые фото копятся в следующую пачку
+        self._model_lock: Optional[asyncio.Lock] = None
+        # Ссылки на запущенные пачки: иначе задачу может собрать сборщик мусора
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def input_size(self) -> int:
+        """Входной размер модели (для выбора размера фото в Telegram)."""
+        return self.detector.input_size
+
+    async def warm_up(self) -> bool:
+        """Загружает модель заранее (перед тем как водитель пришлёт фото)."""
+        return await self.lifecycle.warm_up()
+
+    async def detect(self, image_data: ImageSource) -> DetectionResult:
+        """Ставит изображение в очередь и ждёт результат детекции."""
+        with span("fuel.detect"):
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending.append((image_data, future))
+
+            if len(self._pending) >= self.max_batch_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self._flush)
+
+            return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(functools.partial(self._batch_done, batch))
+
+    def _batch_done(self, batch: List[Tuple[ImageSource, asyncio.Future]], task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        error = None if task.cancelled() else task.exception()
+        if error is not None:
+            logger.error(f"Пачка из {len(batch)} фото завершилась с ошибкой: {error}")
+        # Вызывающие не должны ждать вечно, даже если пачка упала или отменена
+        for _, future in batch:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.cancel()
+
+    async def _run_batch(self, batch: List[Tuple[ImageSource, asyncio.Future]]) -> None:
+        self.lifecycle.start()
+        if self._model_lock is None:
+            self._model_lock = asyncio.Lock()
+        try:
+            # Пачка попадает в трассу того запроса, который её запустил
+            with span("fuel.batch", batch_size=len(batch)):
+                async with self._model_lock:
+                    results = await asyncio.to_thread(
+                        self.detector.detect_fuel_levels, [image for image, _ in batch]
+                    )
+        except Exception as e:
+            logger.error(f"Ошибка пакетной детекции ({len(batch)} фото): {e}")
+            results = [(None, None, f"❌ Ошибка обработки изображения: {str(e)}")] * len(batch)
+
+        logger.info(f"Обработана пачка из {len(batch)} фото")
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+# Глобальная очередь поверх глобального детектора
+fuel_queue = FuelInferenceQueue(fuel_detector)
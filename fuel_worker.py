@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Отдельный процесс инференса топлива.
+
+Владеет FuelDetector (и всем стеком torch/ultralytics или onnxruntime),
+принимает изображения по Unix-сокету или локальному HTTP и возвращает
+результат детекции. Процесс webhook при этом остаётся лёгким.
+
+Запуск:
+    FUEL_WORKER_SOCKET=/tmp/fuel.sock python -m fuel_worker
+    FUEL_WORKER_PORT=8090 python -m fuel_worker
+"""
+
+import asyncio
+import logging
+import os
+from typing import Optional, Set
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+from fuel_queue import FuelInferenceQueue, fuel_queue
+
+# Загружаем переменные окружения
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class FuelWorker:
+    """HTTP-обработчик детекции с ограниченной очередью запросов"""
+
+    def __init__(self, queue: FuelInferenceQueue, max_queue_size: Optional[int] = None):
+        self.queue = queue
+        if max_queue_size is None:
+            max_queue_size = int(os.getenv("FUEL_WORKER_QUEUE_SIZE", "32"))
+        self.max_queue_size = max(max_queue_size, 1)
+        self.in_flight = 0
+        self.processed = 0
+        self.rejected = 0
+        # Ссылки на фоновые задачи: иначе сборщик мусора может убрать их до завершения
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def handle_detect(self, request: web.Request) -> web.Response:
+        if self.in_flight >= self.max_queue_size:
+            self.rejected += 1
+            return web.json_response({"error": "queue is full"}, status=503)
+
+        self.in_flight += 1
+        try:
+            image_data = await request.read()
+            if not image_data:
+                return web.json_response({"error": "empty body"}, status=400)
+            bars_count, fuel_liters, status = await self.queue.detect(image_data)
+            self.processed += 1
+            return web.json_response({
+                "bars_count": bars_count,
+                "fuel_liters": fuel_liters,
+                "status": status,
+            })
+        finally:
+            self.in_flight -= 1
+
+    async def handle_warmup(self, request: web.Request) -> web.Response:
+        # Загрузка идёт в фоне, клиент не ждёт её окончания
+        task = asyncio.get_running_loop().create_task(self.queue.warm_up())
+        self._tasks.add(task)
+        task.add_done_callback(self._warmup_done)
+        return web.json_response({"ok": True})
+
+    def _warmup_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        error = None if task.cancelled() else task.exception()
+        if error is not None:
+            logger.error(f"Ошибка фоновой загрузки модели: {error}")
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "status": "healthy",
+            "model": self.queue.lifecycle.stats(),
+            "in_flight": self.in_flight,
+            "max_queue_size": self.max_queue_size,
+            "processed": self.processed,
+            "rejected": self.rejected,
+        })
+
+    def create_app(self) -> web.Application:
+        # Фото с телефона редко больше 10 МБ
+        app = web.Application(client_max_size=int(os.getenv("FUEL_WORKER_MAX_BODY", str(10 * 1024 * 1024))))
+        app.router.add_post("/detect", self.handle_detect)
+        app.router.add_post("/warmup", self.handle_warmup)
+        app.router.add_get("/health", self.handle_health)
+        return app
+
+
+def main() -> None:
+    worker = FuelWorker(fuel_queue)
+    app = worker.create_app()
+
+    async def on_startup(app: web.Application) -> None:
+        if os.getenv("FUEL_WORKER_PRELOAD", "1") == "1":
+            # Загружаем модель до первого запроса, чтобы не тормозить первого водителя
+            await fuel_queue.warm_up()
+        fuel_queue.lifecycle.start()
+
+    app.on_startup.append(on_startup)
+
+    socket_path = os.getenv("FUEL_WORKER_SOCKET", "").strip()
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        logger.info(f"Воркер инференса слушает Unix-сокет {socket_path}")
+        web.run_app(app, path=socket_path, print=None)
+    else:
+        host = os.getenv("FUEL_WORKER_HOST", "127.0.0.1")
+        port = int(os.getenv("FUEL_WORKER_PORT", "8090"))
+        logger.info(f"Воркер инференса слушает http://{host}:{port}")
+        web.run_app(app, host=host, port=port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Роутеры обработчиков бота.
+
+Порядок подключения важен: общий текстовый обработчик регистрации
+(F.text без состояния) подключается последним, чтобы не перехватывать команды.
+Каждый вызов обработчика оборачивается в спан трассировки (см. tracing.py).
+Пользователю, не привязанному ни к одной компании (tenants.py), отвечает
+общий обработчик ошибок диспетчера.
+"""
+
+from aiogram import Dispatcher
+
+
+def setup_routers(dp: Dispatcher) -> None:
+    """Подключает все роутеры к диспетчеру."""
+    from aiogram.filters import ExceptionTypeFilter
+
+    from deps import UnknownTenantError
+    from handlers import admin, common, edit, fuel, registration, trip
+    from tracing import TracingMiddleware
+
+    routers = (
+        common.router,
+        trip.router,
+        fuel.router,
+        edit.router,
+        admin.router,
+        registration.router,
+    )
+    # Внутренний middleware вызывается только для сработавшего обработчика
+    tracing_middleware = TracingMiddleware()
+    for router in routers:
+        router.message.middleware(tracing_middleware)
+        router.callback_query.middleware(tracing_middleware)
+    dp.include_routers(*routers)
+    dp.errors.register(common.handle_unknown_tenant, ExceptionTypeFilter(UnknownTenantError))
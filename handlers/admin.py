@@ -0,0 +1,159 @@
+"""
+Команды администратора
+"""
+
+import asyncio
+import html
+import logging
+import time
+from datetime import date
+
+from aiogram import F, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message, CallbackQuery
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from deps import get_admin_ids, get_sheets_client, get_tenant, get_users_repo
+from trip_index import StatsQuery, StatsResult, parse_stats_query
+
+
+logger = logging.getLogger(__name__)
+
+router = Router(name=__name__)
+
+
+@router.message(Command("export"))
+async def cmd_export(message: Message):
+    """Команда экспорта (только для админов)"""
+    if message.from_user.id not in get_admin_ids():
+        await message.answer("❌ У вас нет прав для выполнения этой команды.")
+        return
+    
+    await show_export_info(message, message.from_user.id)
+
+
+@router.callback_query(F.data == "export")
+async def callback_export(callback: CallbackQuery):
+    """Callback экспорта"""
+    if callback.from_user.id not in get_admin_ids():
+        await callback.answer("❌ У вас нет прав для выполнения этой команды.")
+        return
+    
+    await callback.answer()
+    await show_export_info(callback.message, callback.from_user.id, edit_message=True)
+
+
+async def show_export_info(message: Message, user_id: int, edit_message: bool = False):
+    """Показывает информацию об экспорте"""
+    try:
+        # Получаем статистику
+        sheets_client = get_sheets_client(user_id)
+        last_rows = sheets_client.get_last_rows(10)
+        total_users = get_users_repo(user_id).get_all_users_count()
+        
+        # Создаем ссылку на таблицу компании администратора
+        sheet_url = f"https://docs.google.com/spreadsheets/d/{sheets_client.sheet_id}/edit"
+        
+        text = (
+            f"👑 <b>Панель администратора</b>\n\n"
+            f"📊 <b>Статистика:</b>\n"
+            f"👥 Зарегистрированных пользователей: {total_users}\n"
+            f"📝 Записей в таблице: {len(last_rows)}\n\n"
+            f"🔗 <a href='{sheet_url}'>Открыть Google Sheets</a>\n\n"
+            f"📈 Сводка по проектам и адресам: /stats\n"
+            f"<i>Последние записи отображены в разделе 'Последние записи'</i>"
+        )
+        
+        keyboard = InlineKeyboardBuilder()
+        keyboard.button(text="📋 Последние записи", callback_data="last_entries")
+        keyboard.button(text="🏠 Главное меню", callback_data="main_menu")
+        keyboard.adjust(1, 1)
+        
+        if edit_message:
+            await message.edit_text(text, reply_markup=keyboard.as_markup(), parse_mode="HTML")
+        else:
+            await message.answer(text, reply_markup=keyboard.as_markup(), parse_mode="HTML")
+    
+    except Exception as e:
+        logger.error(f"Ошибка при показе экспорта: {e}")
+        error_text = "❌ Ошибка при получении данных."
+        
+        if edit_message:
+            await message.edit_text(error_text)
+        else:
+            await message.answer(error_text)
+
+
+STATS_HELP = (
+    "Фильтры (любые, в любом порядке):\n"
+    "<code>/stats проект: Ромашка адрес: Ленина инженер: Иванов</code>\n"
+    "<code>/stats с: 01.10.2026 по: 31.10.2026</code>\n"
+    "<code>/stats месяц: 10.2026 проект: Ромашка</code>\n"
+    "Слова ищутся по началу: «ром» найдёт «Ромашка»."
+)
+
+
+@router.message(Command("stats"))
+async def cmd_stats(message: Message, command: CommandObject):
+    """Сводка по поездкам из индекса в памяти (только для админов)"""
+    user_id = message.from_user.id
+    if user_id not in get_admin_ids():
+        await message.answer("❌ У вас нет прав для выполнения этой команды.")
+        return
+
+    try:
+        query = parse_stats_query(command.args or "")
+    except ValueError as e:
+        await message.answer(f"❌ {html.escape(str(e))}\n\n{STATS_HELP}", parse_mode="HTML")
+        return
+
+    tenant = get_tenant(user_id)
+    watcher = tenant.watcher
+    if watcher is not None and watcher.loaded:
+        # Правки, сделанные в таблице вручную, попадут в индекс до ответа
+        await asyncio.to_thread(watcher.maybe_check)
+
+    trip_index = tenant.trip_index
+    if not trip_index.loaded:
+        # Первый запрос после старта: одно чтение листа на все кэши, дальше индекс обновляется сам
+        if not await asyncio.to_thread(tenant.load_caches):
+            await message.answer("❌ Ошибка при получении данных.")
+            return
+
+    started = time.perf_counter()
+    result = trip_index.query(query)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"/stats {command.args or ''!r}: {result.trips} поездок из {len(trip_index)} за {elapsed_ms:.1f} мс")
+
+    text = format_stats(query, result)
+    if not command.args:
+        text += f"\n\n{STATS_HELP}"
+    await message.answer(text, parse_mode="HTML")
+
+
+def format_stats(query: StatsQuery, result: StatsResult) -> str:
+    filters = []
+    for label, words in (("проект", query.project), ("адрес", query.address), ("инженер", query.engineer)):
+        if words:
+            filters.append(f"{label}: {html.escape(' '.join(words))}")
+    if query.date_from is not None or query.date_to is not None:
+        date_from = date.fromordinal(query.date_from).strftime("%d.%m.%Y") if query.date_from is not None else "…"
+        date_to = date.fromordinal(query.date_to).strftime("%d.%m.%Y") if query.date_to is not None else "…"
+        filters.append(f"{date_from} – {date_to}")
+
+    lines = [f"📈 <b>Сводка</b> ({'; '.join(filters) if filters else 'все поездки'})", ""]
+    if not result.trips:
+        lines.append("Поездок не найдено.")
+        return "\n".join(lines)
+
+    lines += [
+        f"🚗 Поездок: <b>{result.trips}</b>",
+        f"📏 Пробег: <b>{result.distance_km:,} км</b>",
+        f"⛽ Топливо: <b>{result.fuel_liters:.1f} л</b>",
+    ]
+    for title, groups in (("👤 Инженеры", result.by_engineer), ("🏗️ Проекты", result.by_project)):
+        # Разбивка нужна, только если в ней больше одной строки
+        if len(groups) > 1:
+            lines += ["", f"<b>{title}:</b>"]
+            lines += [f"• {html.escape(name)}: {count} поезд., {km:,} км" for name, count, km in groups]
+    return "\n".join(lines)
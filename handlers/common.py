@@ -0,0 +1,193 @@
+"""
+Общие обработчики: главное меню, последние записи, справка и навигация
+"""
+
+import asyncio
+import logging
+
+from aiogram import F, Router
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery, ErrorEvent, Message
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from deps import get_admin_ids, get_sheets_client
+
+
+logger = logging.getLogger(__name__)
+
+router = Router(name=__name__)
+
+
+UNKNOWN_TENANT_TEXT = (
+    "⛔ Вы не привязаны ни к одной компании.\n"
+    "Попросите администратора добавить ваш Telegram ID в настройки бота."
+)
+
+
+async def handle_unknown_tenant(event: ErrorEvent) -> bool:
+    """
+    Ошибка UnknownTenantError из любого обработчика (подключается к диспетчеру в setup_routers):
+    незнакомому пользователю отвечаем, а не пишем трассировку в лог на каждое обновление.
+    """
+    update = event.update
+    logger.info(f"Обновление от пользователя вне компаний: {event.exception}")
+    if update.message is not None:
+        await update.message.answer(UNKNOWN_TENANT_TEXT)
+    elif update.callback_query is not None and update.callback_query.message is not None:
+        # На сам callback обработчик обычно уже ответил - пишем в чат
+        await update.callback_query.message.answer(UNKNOWN_TENANT_TEXT)
+    return True
+
+
+async def send_main_menu(message: Message):
+    """Отправляет главное меню"""
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="🆕 Новая запись", callback_data="new_entry")
+    keyboard.button(text="📋 Последние записи", callback_data="last_entries")
+    keyboard.button(text="✏️ Редактировать последнюю", callback_data="edit_last")
+    keyboard.button(text="ℹ️ Помощь", callback_data="help")
+    
+    if message.from_user.id in get_admin_ids():
+        keyboard.button(text="👑 Экспорт (Админ)", callback_data="export")
+    
+    keyboard.adjust(1, 2, 1, 1)
+    
+    await message.answer(
+        "🚗 <b>Журнал поездок инженера</b>\n\n"
+        "Выберите действие:",
+        reply_markup=keyboard.as_markup(),
+        parse_mode="HTML"
+    )
+
+
+@router.message(Command("last"))
+async def cmd_last_entries(message: Message):
+    """Команда для просмотра последних записей"""
+    await show_last_entries(message, message.from_user.id)
+
+
+@router.callback_query(F.data == "last_entries")
+async def callback_last_entries(callback: CallbackQuery):
+    """Callback для просмотра последних записей"""
+    await callback.answer()
+    await show_last_entries(callback.message, callback.from_user.id, edit_message=True)
+
+
+async def show_last_entries(message: Message, user_id: int, edit_message: bool = False, limit: int = 5):
+    """Показывает последние записи"""
+    try:
+        last_rows = get_sheets_client(user_id).get_last_rows(limit)
+        
+        if not last_rows:
+            text = "📋 <b>Последние записи</b>\n\nЗаписи не найдены."
+        else:
+            text = f"📋 <b>Последние {len(last_rows)} записей</b>\n\n"
+            
+            for i, row in enumerate(last_rows, 1):
+                engineer = row.engineer or 'Не указан'
+                date = row.date
+                time_start = row.time_start
+                time_end = row.time_end
+                distance_km = row.distance_km
+                project = row.project
+                address = row.address
+                
+                text += f"<b>{i}. {engineer}</b>\n"
+                text += f"📅 {date} | ⏱️ {time_start}-{time_end}\n"
+                text += f"📏 {distance_km} км"
+                
+                if project:
+                    text += f" | 🏗️ {project[:20]}{'...' if len(project) > 20 else ''}"
+                
+                if address:
+                    text += f" | 📍 {address[:20]}{'...' if len(address) > 20 else ''}"
+                
+                text += "\n\n"
+        
+        keyboard = InlineKeyboardBuilder()
+        keyboard.button(text="🔄 Обновить", callback_data="last_entries")
+        keyboard.button(text="🏠 Главное меню", callback_data="main_menu")
+        keyboard.adjust(1, 1)
+        
+        if edit_message:
+            await message.edit_text(text, reply_markup=keyboard.as_markup(), parse_mode="HTML")
+        else:
+            await message.answer(text, reply_markup=keyboard.as_markup(), parse_mode="HTML")
+            
+    except Exception as e:
+        logger.error(f"Ошибка при получении последних записей: {e}")
+        error_text = "❌ Ошибка при получении данных из Google Sheets."
+        
+        if edit_message:
+            await message.edit_text(error_text)
+        else:
+            await message.answer(error_text)
+
+
+@router.message(Command("help"))
+async def cmd_help(message: Message):
+    """Команда помощи"""
+    await show_help(message)
+
+
+@router.callback_query(F.data == "help")
+async def callback_help(callback: CallbackQuery):
+    """Callback помощи"""
+    await callback.answer()
+    await show_help(callback.message, edit_message=True)
+
+
+async def show_help(message: Message, edit_message: bool = False):
+    """Показывает справку"""
+    help_text = (
+        "ℹ️ <b>Справка по боту</b>\n\n"
+        "<b>Команды:</b>\n"
+        "/start - Регистрация и главное меню\n"
+        "/new - Создать новую запись поездки\n"
+        "/last - Показать последние записи\n"
+        "/edit_last - Редактировать последнюю запись\n"
+        "/help - Показать эту справку\n\n"
+        "<b>Создание записи:</b>\n"
+        "1. Время начала (сейчас/ручной ввод)\n"
+        "2. Показания одометра начала\n"
+        "3. Время окончания\n"
+        "4. Показания одометра окончания\n"
+        "5. Проект (необязательно)\n"
+        "6. Адрес (необязательно)\n"
+        "7. Комментарий\n"
+        "8. Подтверждение и сохранение\n\n"
+        "<b>Форматы времени:</b>\n"
+        "• <code>сейчас</code> - текущее время\n"
+        "• <code>14:30</code> - время сегодня\n"
+        "• <code>21.09.2024 14:30</code> - полная дата\n\n"
+        "<b>Редактирование:</b>\n"
+        "Можно редактировать проект, адрес и комментарий в течение 15 минут после создания записи."
+    )
+    
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="🏠 Главное меню", callback_data="main_menu")
+    
+    if edit_message:
+        await message.edit_text(help_text, reply_markup=keyboard.as_markup(), parse_mode="HTML")
+    else:
+        await message.answer(help_text, reply_markup=keyboard.as_markup(), parse_mode="HTML")
+
+
+@router.callback_query(F.data == "cancel")
+async def callback_cancel(callback: CallbackQuery, state: FSMContext):
+    """Отмена текущего действия"""
+    await callback.answer()
+    await state.clear()
+    await callback.message.edit_text("❌ Действие отменено.")
+    await asyncio.sleep(1)
+    await send_main_menu(callback.message)
+
+
+@router.callback_query(F.data == "main_menu")
+async def callback_main_menu(callback: CallbackQuery, state: FSMContext):
+    """Возврат в главное меню"""
+    await callback.answer()
+    await state.clear()
+    await callback.message.edit_text("🏠 Главное меню")
+    await send_main_menu(callback.message)
@@ -0,0 +1,208 @@
+"""
+Редактирование последней записи пользователя (FSM EditStates)
+"""
+
+import logging
+
+from aiogram import F, Router
+from aiogram.filters import Command, StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message, CallbackQuery
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from deps import get_last_trips, get_sheets_client, get_time_utils, get_trip_index, get_users_repo
+from states import EditStates
+from trip_codec import record_from_dict
+
+
+logger = logging.getLogger(__name__)
+
+router = Router(name=__name__)
+
+
+@router.message(Command("edit_last"))
+async def cmd_edit_last(message: Message, state: FSMContext):
+    """Команда для редактирования последней записи"""
+    await start_edit_last_entry(message, state, message.from_user.id)
+
+
+@router.callback_query(F.data == "edit_last")
+async def callback_edit_last(callback: CallbackQuery, state: FSMContext):
+    """Callback для редактирования последней записи"""
+    await callback.answer()
+    await start_edit_last_entry(callback.message, state, callback.from_user.id, edit_message=True)
+
+
+async def start_edit_last_entry(message: Message, state: FSMContext, user_id: int, edit_message: bool = False):
+    """Начинает процесс редактирования последней записи"""
+    # Получаем последнюю запись пользователя
+    last_entry = get_sheets_client(user_id).get_last_user_entry(user_id)
+    
+    if not last_entry:
+        text = "❌ У вас нет записей для редактирования."
+        
+        if edit_message:
+            await message.edit_text(text)
+        else:
+            await message.answer(text)
+        return
+    
+    # Проверяем, можно ли еще редактировать (15 минут)
+    created_at = last_entry.created_at
+    if not get_time_utils().is_within_edit_time_limit(created_at, 15):
+        text = (
+            "❌ <b>Время редактирования истекло!</b>\n\n"
+            "Редактировать записи можно только в течение 15 минут после создания."
+        )
+        
+        if edit_message:
+            await message.edit_text(text, parse_mode="HTML")
+        else:
+            await message.answer(text, parse_mode="HTML")
+        return
+    
+    # Сохраняем данные записи в состояние
+    await state.update_data(edit_entry=last_entry._asdict())
+    
+    # Показываем текущую запись и поля для редактирования
+    engineer = last_entry.engineer
+    date = last_entry.date
+    time_start = last_entry.time_start
+    time_end = last_entry.time_end
+    distance_km = last_entry.distance_km
+    project = last_entry.project
+    address = last_entry.address
+    comment = last_entry.comment
+    
+    text = (
+        f"✏️ <b>Редактирование записи</b>\n\n"
+        f"👤 <b>Инженер:</b> {engineer}\n"
+        f"📅 <b>Дата:</b> {date}\n"
+        f"🕐 <b>Время:</b> {time_start} - {time_end}\n"
+        f"📏 <b>Пробег:</b> {distance_km} км\n"
+        f"🏗️ <b>Проект:</b> {project or '(не указан)'}\n"
+        f"📍 <b>Адрес:</b> {address or '(не указан)'}\n"
+        f"💬 <b>Комментарий:</b> {comment[:50]}{'...' if len(comment) > 50 else ''}\n\n"
+        f"Что хотите изменить?"
+    )
+    
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="🏗️ Проект", callback_data="edit_project")
+    keyboard.button(text="📍 Адрес", callback_data="edit_address")
+    keyboard.button(text="💬 Комментарий", callback_data="edit_comment")
+    keyboard.button(text="❌ Отмена", callback_data="cancel")
+    keyboard.adjust(2, 1, 1)
+    
+    if edit_message:
+        await message.edit_text(text, reply_markup=keyboard.as_markup(), parse_mode="HTML")
+    else:
+        await message.answer(text, reply_markup=keyboard.as_markup(), parse_mode="HTML")
+    
+    await state.set_state(EditStates.waiting_field_choice)
+
+
+@router.callback_query(F.data.startswith("edit_"), StateFilter(EditStates.waiting_field_choice))
+async def handle_edit_field_choice(callback: CallbackQuery, state: FSMContext):
+    """Обработчик выбора поля для редактирования"""
+    await callback.answer()
+    
+    field = callback.data.replace("edit_", "")
+    await state.update_data(edit_field=field)
+    
+    field_names = {
+        "project": "🏗️ Проект",
+        "address": "📍 Адрес",
+        "comment": "💬 Комментарий"
+    }
+    
+    field_name = field_names.get(field, field)
+    
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="❌ Отмена", callback_data="cancel")
+    
+    await callback.message.edit_text(
+        f"✏️ <b>Редактирование поля: {field_name}</b>\n\n"
+        f"Введите новое значение:",
+        reply_markup=keyboard.as_markup(),
+        parse_mode="HTML"
+    )
+    
+    await state.set_state(EditStates.waiting_new_value)
+
+
+@router.message(F.text, StateFilter(EditStates.waiting_new_value))
+async def handle_edit_new_value(message: Message, state: FSMContext):
+    """Обработчик ввода нового значения поля"""
+    user_id = message.from_user.id
+    data = await state.get_data()
+    field = data['edit_field']
+    new_value = message.text.strip()
+    if field not in ("project", "address", "comment"):
+        await message.answer("❌ Это поле нельзя редактировать.")
+        await state.clear()
+        return
+    
+    # Обновляем значение поля
+    edit_entry = record_from_dict(data['edit_entry'])._replace(**{field: new_value})
+    
+    # Находим строку в Google Sheets по row_uid
+    row_uid = edit_entry.row_uid
+    if not row_uid:
+        await message.answer("❌ Не удалось найти запись для редактирования.")
+        await state.clear()
+        return
+    
+    row_info = get_sheets_client(user_id).find_row_by_uid(row_uid, user_id)
+    
+    if not row_info:
+        await message.answer("❌ Запись не найдена или у вас нет прав на её редактирование.")
+        await state.clear()
+        return
+    
+    row_number, row_data = row_info
+    
+    # Создаем новый объект TripEntry с обновленными данными
+    user = get_users_repo(user_id).get_user(user_id)
+    
+    try:
+        # Парсим время из sheets
+        start_dt = get_time_utils().parse_sheets_datetime(edit_entry.date, edit_entry.time_start)
+        end_dt = get_time_utils().parse_sheets_datetime(edit_entry.date, edit_entry.time_end)
+        
+        if not start_dt or not end_dt:
+            await message.answer("❌ Ошибка при обработке времени.")
+            await state.clear()
+            return
+        
+        updated_entry = edit_entry.to_entry(
+            engineer=user.full_name,
+            author_tg_id=user_id,
+        )
+        
+        # Обновляем строку в Google Sheets
+        success = get_sheets_client(user_id).update_row(row_number, updated_entry)
+        
+        if success:
+            get_last_trips(user_id).refresh(user_id, updated_entry)
+            get_trip_index(user_id).update(updated_entry)
+            
+            field_names = {
+                "project": "🏗️ Проект",
+                "address": "📍 Адрес",
+                "comment": "💬 Комментарий"
+            }
+            
+            await message.answer(
+                f"✅ <b>Запись обновлена!</b>\n\n"
+                f"{field_names.get(field, field)} изменен на:\n"
+                f"<code>{new_value}</code>",
+                parse_mode="HTML"
+            )
+        else:
+            await message.answer("❌ Ошибка при обновлении записи в Google Sheets.")
+        
+    except Exception as e:
+        logger.error(f"Ошибка при редактировании записи: {e}")
+        await message.answer("❌ Произошла ошибка при редактировании записи.")
+    
+    await state.clear()
@@ -0,0 +1,151 @@
+"""
+Фото уровня топлива и подтверждение результата детекции
+"""
+
+import io
+import logging
+
+from aiogram import F, Router
+from aiogram.filters import StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message, CallbackQuery
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from deps import get_fuel_cache, get_fuel_service
+from handlers.trip import _run_in_background, ask_project
+from states import TripStates
+
+
+logger = logging.getLogger(__name__)
+
+router = Router(name=__name__)
+
+
+@router.callback_query(F.data == "skip_fuel_photo", StateFilter(TripStates.waiting_fuel_photo))
+async def callback_skip_fuel_photo(callback: CallbackQuery, state: FSMContext):
+    """Пропуск фото топлива"""
+    await callback.answer()
+    await state.update_data(fuel_liters=None)
+    await ask_project(callback.message, state, callback.from_user.id, edit_message=True)
+
+
+@router.message(F.photo, StateFilter(TripStates.waiting_fuel_photo))
+async def handle_fuel_photo(message: Message, state: FSMContext):
+    """Обработчик фото уровня топлива"""
+    await message.answer("🔄 Обрабатываю фото...")
+    
+    # Детектор (и PIL, если инференс в этом процессе) загружаются только при первом фото
+    from fuel_cache import FuelResultCache
+    from fuel_preprocess import select_photo_size
+
+    fuel_service = get_fuel_service()
+    fuel_cache = get_fuel_cache()
+
+    try:
+        # Берём наименьший размер фото, которого хватает для входа модели
+        photo = select_photo_size(message.photo, fuel_service.input_size)
+        file_key = FuelResultCache.file_key(photo.file_unique_id)
+
+        # Повторно присланное фото не скачиваем и не распознаём заново
+        cached = fuel_cache.get(file_key)
+        if cached is not None:
+            bars_count, fuel_liters, status_message = cached
+        else:
+            # Скачиваем фото потоком прямо в буфер, который читает декодер
+            image_data = io.BytesIO()
+            await message.bot.download(photo, destination=image_data)
+            with image_data.getbuffer() as view:
+                content_key = FuelResultCache.content_key(view)
+
+            cached = fuel_cache.get(content_key)
+            if cached is not None:
+                bars_count, fuel_liters, status_message = cached
+                fuel_cache.put(cached, file_key)
+            else:
+                # Детектируем уровень топлива (фото от разных водителей объединяются в пачки)
+                bars_count, fuel_liters, status_message = await fuel_service.detect(image_data)
+                if bars_count is not None:
+                    fuel_cache.put((bars_count, fuel_liters, status_message), file_key, content_key)
+        
+        if bars_count is None:
+            await message.answer(
+                f"{status_message}\n\n"
+                "Попробуйте сфотографировать панель приборов ещё раз или пропустите этот шаг."
+            )
+            return
+        
+        # Сохраняем результат в состояние
+        await state.update_data(fuel_liters=fuel_liters, fuel_bars=bars_count)
+        
+        # Показываем результат с кнопками
+        await show_fuel_confirmation(message, state, bars_count, fuel_liters, status_message)
+        
+    except Exception as e:
+        logger.error(f"Ошибка при обработке фото топлива: {e}")
+        await message.answer(
+            "❌ Ошибка при обработке фото.\n\n"
+            "Попробуйте ещё раз или пропустите этот шаг."
+        )
+
+
+async def show_fuel_confirmation(message: Message, state: FSMContext, bars_count: int, fuel_liters: float, status_message: str):
+    """Показывает результат детекции и кнопки подтверждения"""
+    
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="✅ Подтвердить", callback_data="confirm_fuel")
+    keyboard.button(text="📷 Переснять", callback_data="retake_fuel_photo")
+    keyboard.button(text="⏭️ Пропустить", callback_data="skip_fuel_result")
+    keyboard.button(text="❌ Отмена", callback_data="cancel")
+    keyboard.adjust(1, 2, 1)
+    
+    text = (
+        f"{status_message}\n\n"
+        f"📊 <b>Результат детекции:</b>\n"
+        f"📏 Найдено палочек: <b>{bars_count}</b>\n"
+        f"⛽ Количество топлива: <b>{fuel_liters:.1f} л</b>\n\n"
+        f"<i>Подтвердите результат или переснимите фото:</i>"
+    )
+    
+    await message.answer(
+        text,
+        reply_markup=keyboard.as_markup(),
+        parse_mode="HTML"
+    )
+    
+    await state.set_state(TripStates.waiting_fuel_confirmation)
+
+
+@router.callback_query(F.data == "confirm_fuel", StateFilter(TripStates.waiting_fuel_confirmation))
+async def callback_confirm_fuel(callback: CallbackQuery, state: FSMContext):
+    """Подтверждение результата детекции топлива"""
+    await callback.answer()
+    await ask_project(callback.message, state, callback.from_user.id, edit_message=True)
+
+
+@router.callback_query(F.data == "retake_fuel_photo", StateFilter(TripStates.waiting_fuel_confirmation))
+async def callback_retake_fuel_photo(callback: CallbackQuery, state: FSMContext):
+    """Переснять фото топлива"""
+    await callback.answer()
+    
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="⏭️ Пропустить фото", callback_data="skip_fuel_photo")
+    keyboard.button(text="❌ Отмена", callback_data="cancel")
+    keyboard.adjust(1, 1)
+    
+    await callback.message.edit_text(
+        "⛽ Сфотографируйте панель приборов с уровнем топлива:",
+        reply_markup=keyboard.as_markup()
+    )
+    
+    await state.set_state(TripStates.waiting_fuel_photo)
+
+    # Пока водитель смотрел на результат, модель могла выгрузиться: грузим заранее, как в handle_odometer_end
+    _run_in_background(get_fuel_service().warm_up())
+
+
+@router.callback_query(F.data == "skip_fuel_result", StateFilter(TripStates.waiting_fuel_confirmation))
+async def callback_skip_fuel_result(callback: CallbackQuery, state: FSMContext):
+    """Пропустить результат детекции топлива"""
+    await callback.answer()
+    await state.update_data(fuel_liters=None)
+    await ask_project(callback.message, state, callback.from_user.id, edit_message=True)
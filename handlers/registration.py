@@ -0,0 +1,71 @@
+"""
+Регистрация пользователя и команда /start
+"""
+
+import logging
+from datetime import datetime
+
+from aiogram import F, Router
+from aiogram.filters import Command, StateFilter
+from aiogram.types import Message
+
+from deps import get_users_repo
+from handlers.common import send_main_menu
+
+
+logger = logging.getLogger(__name__)
+
+router = Router(name=__name__)
+
+
+@router.message(Command("start"))
+async def cmd_start(message: Message):
+    """Обработчик команды /start"""
+    user_id = message.from_user.id
+    
+    if not get_users_repo(user_id).is_registered(user_id):
+        await message.answer(
+            "👋 Добро пожаловать!\n\n"
+            "Для начала работы необходимо пройти регистрацию.\n"
+            "📝 Введите ваше ФИО (Фамилия Имя Отчество):"
+        )
+        return
+    
+    user = get_users_repo(user_id).get_user(user_id)
+    await message.answer(
+        f"👋 Добро пожаловать, <b>{user.full_name}</b>!\n\n"
+        f"Вы зарегистрированы с {datetime.fromisoformat(user.created_at.replace('Z', '+00:00')).strftime('%d.%m.%Y')}",
+        parse_mode="HTML"
+    )
+    await send_main_menu(message)
+
+
+@router.message(F.text, StateFilter(None))
+async def handle_registration(message: Message):
+    """Обработчик регистрации пользователя"""
+    user_id = message.from_user.id
+    
+    if get_users_repo(user_id).is_registered(user_id):
+        await send_main_menu(message)
+        return
+    
+    full_name = message.text.strip()
+    
+    # Простая валидация ФИО
+    if len(full_name) < 3 or len(full_name.split()) < 2:
+        await message.answer(
+            "❌ Пожалуйста, введите корректное ФИО (минимум Имя Фамилия):"
+        )
+        return
+    
+    # Регистрируем пользователя
+    get_users_repo(user_id).register_user(user_id, full_name)
+    
+    await message.answer(
+        f"✅ <b>Регистрация завершена!</b>\n\n"
+        f"👤 {full_name}\n"
+        f"🆔 Ваш ID: {user_id}\n\n"
+        f"Теперь вы можете пользоваться ботом!",
+        parse_mode="HTML"
+    )
+    await send_main_menu(message)
@@ -0,0 +1,729 @@
+"""
+Пошаговое создание записи поездки (FSM TripStates)
+"""
+
+import asyncio
+import logging
+import time
+from typing import List, Optional, Set, Tuple
+
+from aiogram import F, Router
+from aiogram.filters import Command, StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message, CallbackQuery
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from deps import (
+    get_fuel_service, get_last_trips, get_sheets_client, get_suggestions, get_tenant, get_time_utils,
+    get_trip_index, get_users_repo,
+)
+from digest import DRAFT_STARTED_AT
+from handlers.common import send_main_menu
+from models import TripEntry
+from states import TripStates
+from suggestions import value_key
+
+
+logger = logging.getLogger(__name__)
+
+router = Router(name=__name__)
+
+# Ссылки на фоновые задачи, чтобы их не собрал сборщик мусора
+_background_tasks: Set[asyncio.Task] = set()
+
+
+@router.message(Command("new"))
+async def cmd_new_entry(message: Message, state: FSMContext):
+    """Обработчик команды /new - создание новой записи"""
+    user_id = message.from_user.id
+    
+    if not get_users_repo(user_id).is_registered(user_id):
+        await message.answer("❌ Сначала необходимо зарегистрироваться. Используйте /start")
+        return
+    
+    await start_new_entry(message, state, user_id)
+
+
+@router.callback_query(F.data == "new_entry")
+async def callback_new_entry(callback: CallbackQuery, state: FSMContext):
+    """Callback для создания новой записи"""
+    await callback.answer()
+    await start_new_entry(callback.message, state, callback.from_user.id, edit_message=True)
+
+
+def _run_in_background(coro) -> None:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def start_new_entry(message: Message, state: FSMContext, user_id: int, edit_message: bool = False):
+    """Начинает процесс создания новой записи"""
+    await state.clear()
+    await state.set_state(TripStates.waiting_start_time)
+    # Время начала черновика - для напоминания о незавершённой поездке (digest.py)
+    await state.update_data({DRAFT_STARTED_AT: time.time()})
+    
+    # Последние поездки, подсказки и индекс /stats - одно чтение таблицы, пока водитель выбирает время
+    tenant = get_tenant(user_id)
+    if not all(cache.loaded for cache in tenant.caches):
+        _run_in_background(asyncio.to_thread(tenant.load_caches))
+    # Ручные правки в таблице подтягиваются в кэши до подсказки одометра (sheet_watch.py)
+    watcher = tenant.watcher
+    if watcher is not None and watcher.loaded:
+        _run_in_background(asyncio.to_thread(watcher.maybe_check))
+    
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="⏰ Сейчас", callback_data="time_now")
+    keyboard.button(text="✏️ Ввести вручную", callback_data="time_manual")
+    keyboard.button(text="❌ Отмена", callback_data="cancel")
+    keyboard.adjust(2, 1)
+    
+    text = (
+        "🕐 <b>Время начала поездки</b>\n\n"
+        "Выберите время начала:\n"
+        "• <b>Сейчас</b> - текущее время\n"
+        "• <b>Ввести вручную</b> - в формате ДД.ММ.ГГГГ ЧЧ:ММ или ЧЧ:ММ"
+    )
+    
+    if edit_message:
+        await message.edit_text(text, reply_markup=keyboard.as_markup(), parse_mode="HTML")
+    else:
+        await message.answer(text, reply_markup=keyboard.as_markup(), parse_mode="HTML")
+
+
+@router.callback_query(F.data == "time_now", StateFilter(TripStates.waiting_start_time))
+async def callback_start_time_now(callback: CallbackQuery, state: FSMContext):
+    """Обработчик выбора текущего времени начала"""
+    await callback.answer()
+    
+    current_time = get_time_utils().get_current_datetime()
+    await state.update_data(start_time=current_time)
+    
+    date_str, time_str = get_time_utils().format_datetime_for_sheets(current_time)
+    
+    prompt, keyboard = odometer_start_prompt(callback.from_user.id)
+    await callback.message.edit_text(
+        f"✅ Время начала: <b>{get_time_utils().format_datetime_for_display(current_time)}</b>\n\n"
+        f"{prompt}",
+        reply_markup=keyboard.as_markup(),
+        parse_mode="HTML"
+    )
+    
+    await state.set_state(TripStates.waiting_odometer_start)
+
+
+@router.callback_query(F.data == "time_manual", StateFilter(TripStates.waiting_start_time))
+async def callback_start_time_manual(callback: CallbackQuery, state: FSMContext):
+    """Обработчик ручного ввода времени начала"""
+    await callback.answer()
+    
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="❌ Отмена", callback_data="cancel")
+    
+    await callback.message.edit_text(
+        "🕐 <b>Ввод времени начала</b>\n\n"
+        "Введите время начала в одном из форматов:\n"
+        "• <code>ДД.ММ.ГГГГ ЧЧ:ММ</code> (например: 21.09.2024 14:30)\n"
+        "• <code>ЧЧ:ММ</code> (например: 14:30) - для сегодняшней даты\n"
+        "• <code>сейчас</code> - текущее время",
+        reply_markup=keyboard.as_markup(),
+        parse_mode="HTML"
+    )
+
+
+@router.message(F.text, StateFilter(TripStates.waiting_start_time))
+async def handle_start_time_input(message: Message, state: FSMContext):
+    """Обработчик ввода времени начала"""
+    start_time = get_time_utils().parse_datetime_input(message.text)
+    
+    if start_time is None:
+        await message.answer(
+            "❌ Неправильный формат времени!\n\n"
+            "Используйте один из форматов:\n"
+            "• <code>ДД.ММ.ГГГГ ЧЧ:ММ</code>\n"
+            "• <code>ЧЧ:ММ</code>\n"
+            "• <code>сейчас</code>",
+            parse_mode="HTML"
+        )
+        return
+    
+    await state.update_data(start_time=start_time)
+    
+    prompt, keyboard = odometer_start_prompt(message.from_user.id)
+    await message.answer(
+        f"✅ Время начала: <b>{get_time_utils().format_datetime_for_display(start_time)}</b>\n\n"
+        f"{prompt}",
+        reply_markup=keyboard.as_markup(),
+        parse_mode="HTML"
+    )
+    
+    await state.set_state(TripStates.waiting_odometer_start)
+
+
+def odometer_start_prompt(user_id: int) -> Tuple[str, InlineKeyboardBuilder]:
+    """Запрос начального одометра с кнопкой продолжения с прошлой поездки (если она известна)"""
+    keyboard = InlineKeyboardBuilder()
+    text = "🛣️ Введите показания одометра на <b>начало</b> поездки (в километрах):"
+    
+    last_trip = get_last_trips(user_id).get(user_id)
+    if last_trip is not None:
+        keyboard.button(
+            text=f"↩️ Продолжить с {last_trip.odometer_end:,} км",
+            callback_data=f"odometer_start:{last_trip.odometer_end}"
+        )
+        text += (
+            f"\n\n<i>Прошлая поездка закончилась {last_trip.date} {last_trip.time_end} "
+            f"на {last_trip.odometer_end:,} км</i>"
+        )
+    
+    keyboard.button(text="❌ Отмена", callback_data="cancel")
+    keyboard.adjust(1)
+    return text, keyboard
+
+
+@router.message(F.text, StateFilter(TripStates.waiting_odometer_start))
+async def handle_odometer_start(message: Message, state: FSMContext):
+    """Обработчик ввода начального одометра"""
+    try:
+        odometer_start = int(message.text.strip())
+        if odometer_start < 0:
+            raise ValueError("Отрицательное значение")
+    except ValueError:
+        await message.answer(
+            "❌ Введите корректное число километров (целое положительное число):"
+        )
+        return
+    
+    # Одометр меньше, чем в конце прошлой поездки: опечатка или другой автомобиль
+    last_trip = get_last_trips(message.from_user.id).check_odometer_start(message.from_user.id, odometer_start)
+    if last_trip is not None:
+        keyboard = InlineKeyboardBuilder()
+        keyboard.button(text=f"✅ Верно, {odometer_start:,} км", callback_data=f"odometer_start:{odometer_start}")
+        keyboard.button(
+            text=f"↩️ Продолжить с {last_trip.odometer_end:,} км",
+            callback_data=f"odometer_start:{last_trip.odometer_end}"
+        )
+        keyboard.button(text="❌ Отмена", callback_data="cancel")
+        keyboard.adjust(1)
+        
+        await message.answer(
+            f"⚠️ Одометр <b>{odometer_start:,} км</b> меньше, чем в конце прошлой поездки "
+            f"(<b>{last_trip.odometer_end:,} км</b>, {last_trip.date} {last_trip.time_end}).\n\n"
+            f"Подтвердите значение (например, если сменили автомобиль) или введите другое:",
+            reply_markup=keyboard.as_markup(),
+            parse_mode="HTML"
+        )
+        return
+    
+    await accept_odometer_start(message, state, odometer_start)
+
+
+@router.callback_query(F.data.startswith("odometer_start:"), StateFilter(TripStates.waiting_odometer_start))
+async def callback_odometer_start(callback: CallbackQuery, state: FSMContext):
+    """Одометр начала одной кнопкой: продолжение прошлой поездки или подтверждение значения"""
+    await callback.answer()
+    try:
+        odometer_start = int(callback.data.split(":", 1)[1])
+    except ValueError:
+        return
+    await accept_odometer_start(callback.message, state, odometer_start, edit_message=True)
+
+
+async def accept_odometer_start(message: Message, state: FSMContext, odometer_start: int, edit_message: bool = False):
+    """Сохраняет начальный одометр и запрашивает время окончания"""
+    await state.update_data(odometer_start=odometer_start)
+    
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="⏰ Сейчас", callback_data="end_time_now")
+    keyboard.button(text="✏️ Ввести вручную", callback_data="end_time_manual")
+    keyboard.button(text="❌ Отмена", callback_data="cancel")
+    keyboard.adjust(2, 1)
+    
+    text = (
+        f"✅ Одометр начала: <b>{odometer_start:,} км</b>\n\n"
+        f"🕐 <b>Время окончания поездки</b>\n\n"
+        f"Выберите время окончания:"
+    )
+    
+    if edit_message:
+        await message.edit_text(text, reply_markup=keyboard.as_markup(), parse_mode="HTML")
+    else:
+        await message.answer(text, reply_markup=keyboard.as_markup(), parse_mode="HTML")
+    
+    await state.set_state(TripStates.waiting_end_time)
+
+
+@router.callback_query(F.data == "end_time_now", StateFilter(TripStates.waiting_end_time))
+async def callback_end_time_now(callback: CallbackQuery, state: FSMContext):
+    """Обработчик выбора текущего времени окончания"""
+    await callback.answer()
+    
+    current_time = get_time_utils().get_current_datetime()
+    data = await state.get_data()
+    start_time = data['start_time']
+    
+    # Проверяем, что время окончания больше времени начала
+    if not get_time_utils().validate_time_sequence(start_time, current_time):
+        await callback.message.edit_text(
+            "❌ Время окончания не может быть раньше времени начала!\n\n"
+            "Пожалуйста, выберите корректное время окончания или измените время начала.",
+            parse_mode="HTML"
+        )
+        return
+    
+    await state.update_data(end_time=current_time)
+    
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="❌ Отмена", callback_data="cancel")
+    
+    await callback.message.edit_text(
+        f"✅ Время окончания: <b>{get_time_utils().format_datetime_for_display(current_time)}</b>\n"
+        f"⏱️ Продолжительность: <b>{get_time_utils().format_duration(start_time, current_time)}</b>\n\n"
+        f"🛣️ Введите показания одометра на <b>конец</b> поездки (в километрах):",
+        reply_markup=keyboard.as_markup(),
+        parse_mode="HTML"
+    )
+    
+    await state.set_state(TripStates.waiting_odometer_end)
+
+
+@router.callback_query(F.data == "end_time_manual", StateFilter(TripStates.waiting_end_time))
+async def callback_end_time_manual(callback: CallbackQuery, state: FSMContext):
+    """Обработчик ручного ввода времени окончания"""
+    await callback.answer()
+    
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="❌ Отмена", callback_data="cancel")
+    
+    await callback.message.edit_text(
+        "🕐 <b>Ввод времени окончания</b>\n\n"
+        "Введите время окончания в одном из форматов:\n"
+        "• <code>ДД.ММ.ГГГГ ЧЧ:ММ</code> (например: 21.09.2024 16:30)\n"
+        "• <code>ЧЧ:ММ</code> (например: 16:30) - для сегодняшней даты\n"
+        "• <code>сейчас</code> - текущее время",
+        reply_markup=keyboard.as_markup(),
+        parse_mode="HTML"
+    )
+
+
+@router.message(F.text, StateFilter(TripStates.waiting_end_time))
+async def handle_end_time_input(message: Message, state: FSMContext):
+    """Обработчик ввода времени окончания"""
+    end_time = get_time_utils().parse_datetime_input(message.text)
+    
+    if end_time is None:
+        await message.answer(
+            "❌ Неправильный формат времени!\n\n"
+            "Используйте один из форматов:\n"
+            "• <code>ДД.ММ.ГГГГ ЧЧ:ММ</code>\n"
+            "• <code>ЧЧ:ММ</code>\n"
+            "• <code>сейчас</code>",
+            parse_mode="HTML"
+        )
+        return
+    
+    data = await state.get_data()
+    start_time = data['start_time']
+    
+    # Проверяем последовательность времени
+    if not get_time_utils().validate_time_sequence(start_time, end_time):
+        await message.answer(
+            "❌ Время окончания не может быть раньше времени начала!\n\n"
+            f"Время начала: <b>{get_time_utils().format_datetime_for_display(start_time)}</b>\n"
+            f"Время окончания: <b>{get_time_utils().format_datetime_for_display(end_time)}</b>\n\n"
+            "Пожалуйста, введите корректное время окончания:",
+            parse_mode="HTML"
+        )
+        return
+    
+    await state.update_data(end_time=end_time)
+    
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="❌ Отмена", callback_data="cancel")
+    
+    await message.answer(
+        f"✅ Время окончания: <b>{get_time_utils().format_datetime_for_display(end_time)}</b>\n"
+        f"⏱️ Продолжительность: <b>{get_time_utils().format_duration(start_time, end_time)}</b>\n\n"
+        f"🛣️ Введите показания одометра на <b>конец</b> поездки (в километрах):",
+        reply_markup=keyboard.as_markup(),
+        parse_mode="HTML"
+    )
+    
+    await state.set_state(TripStates.waiting_odometer_end)
+
+
+@router.message(F.text, StateFilter(TripStates.waiting_odometer_end))
+async def handle_odometer_end(message: Message, state: FSMContext):
+    """Обработчик ввода конечного одометра"""
+    try:
+        odometer_end = int(message.text.strip())
+        if odometer_end < 0:
+            raise ValueError("Отрицательное значение")
+        
+        data = await state.get_data()
+        odometer_start = data['odometer_start']
+        
+        if odometer_end < odometer_start:
+            await message.answer(
+                f"❌ Конечный одометр ({odometer_end:,} км) не может быть меньше начального ({odometer_start:,} км)!\n\n"
+                f"Введите корректное значение:"
+            )
+            return
+        
+        await state.update_data(odometer_end=odometer_end)
+        
+        distance_km = odometer_end - odometer_start
+        
+        keyboard = InlineKeyboardBuilder()
+        keyboard.button(text="⏭️ Пропустить фото", callback_data="skip_fuel_photo")
+        keyboard.button(text="❌ Отмена", callback_data="cancel")
+        keyboard.adjust(1, 1)
+        
+        await message.answer(
+            f"✅ Одометр окончания: <b>{odometer_end:,} км</b>\n"
+            f"📏 Пробег: <b>{distance_km:,} км</b>\n\n"
+            f"⛽ Теперь сфотографируйте панель приборов с уровнем топлива:",
+            reply_markup=keyboard.as_markup(),
+            parse_mode="HTML"
+        )
+        
+        await state.set_state(TripStates.waiting_fuel_photo)
+        
+        # Модель могла быть выгружена после простоя: загружаем её, пока водитель фотографирует
+        _run_in_background(get_fuel_service().warm_up())
+        
+    except ValueError:
+        await message.answer(
+            "❌ Введите корректное число километров (целое положительное число):"
+        )
+
+
+# Варианты, показанные кнопками: в callback_data только номер варианта
+PROJECT_CHOICES = "project_choices"
+ADDRESS_CHOICES = "address_choices"
+
+
+def _choice_button_text(value: str) -> str:
+    return value if len(value) <= 40 else value[:39] + "…"
+
+
+def _choices_keyboard(prefix: str, choices: List[str], typed: str = "", skip_callback: str = "") -> InlineKeyboardBuilder:
+    """Кнопки вариантов; typed - последний вариант "оставить как ввели"."""
+    keyboard = InlineKeyboardBuilder()
+    for i, choice in enumerate(choices):
+        keyboard.button(text=_choice_button_text(choice), callback_data=f"{prefix}:{i}")
+    if typed:
+        keyboard.button(text=f"✅ Оставить «{_choice_button_text(typed)}»", callback_data=f"{prefix}:{len(choices)}")
+    if skip_callback:
+        keyboard.button(text="⏭️ Пропустить", callback_data=skip_callback)
+    keyboard.button(text="❌ Отмена", callback_data="cancel")
+    keyboard.adjust(1)
+    return keyboard
+
+
+async def _picked_choice(callback: CallbackQuery, state: FSMContext, key: str) -> Optional[str]:
+    """Вариант, выбранный кнопкой, или None для устаревшей кнопки."""
+    try:
+        index = int(callback.data.split(":", 1)[1])
+        return (await state.get_data()).get(key, [])[index]
+    except (ValueError, IndexError):
+        return None
+
+
+async def ask_project(message: Message, state: FSMContext, user_id: int, edit_message: bool = False):
+    """Запрашивает название проекта с кнопками частых проектов водителя"""
+    choices = get_suggestions(user_id).suggest_projects(user_id)
+    await state.update_data({PROJECT_CHOICES: choices})
+    keyboard = _choices_keyboard("project_pick", choices, skip_callback="skip_project")
+    
+    text = "🏗️ Введите название проекта (необязательно):"
+    if choices:
+        text += "\n\nИли выберите из ваших проектов 👇"
+    
+    if edit_message:
+        await message.edit_text(text, reply_markup=keyboard.as_markup())
+    else:
+        await message.answer(text, reply_markup=keyboard.as_markup())
+    
+    await state.set_state(TripStates.waiting_project)
+
+
+@router.callback_query(F.data == "skip_project", StateFilter(TripStates.waiting_project))
+async def callback_skip_project(callback: CallbackQuery, state: FSMContext):
+    """Пропуск поля проекта"""
+    await callback.answer()
+    await state.update_data(project="")
+    await ask_address(callback.message, state, callback.from_user.id, edit_message=True)
+
+
+@router.callback_query(F.data.startswith("project_pick:"), StateFilter(TripStates.waiting_project))
+async def callback_pick_project(callback: CallbackQuery, state: FSMContext):
+    """Проект выбран кнопкой"""
+    await callback.answer()
+    project = await _picked_choice(callback, state, PROJECT_CHOICES)
+    if project is None:
+        return
+    await state.update_data(project=project)
+    await ask_address(callback.message, state, callback.from_user.id, edit_message=True)
+
+
+@router.message(F.text, StateFilter(TripStates.waiting_project))
+async def handle_project(message: Message, state: FSMContext):
+    """Обработчик ввода проекта"""
+    user_id = message.from_user.id
+    typed = message.text.strip()
+    suggestions = get_suggestions(user_id)
+    
+    # Уже известный проект записываем в принятом написании ("жк север" -> "ЖК Север")
+    project = suggestions.canonical_project(typed)
+    if project is None:
+        # Ввод без букв и цифр ("-", "?") не с чем сравнивать - записываем как есть
+        similar = suggestions.suggest_projects(user_id, prefix=typed) if value_key(typed) else []
+        if similar:
+            await state.update_data({PROJECT_CHOICES: similar + [typed]})
+            await message.answer(
+                "🔎 Похожие проекты - выберите или оставьте как ввели:",
+                reply_markup=_choices_keyboard("project_pick", similar, typed=typed).as_markup()
+            )
+            return
+        project = typed
+    
+    await state.update_data(project=project)
+    await ask_address(message, state, user_id)
+
+
+async def ask_address(message: Message, state: FSMContext, user_id: int, edit_message: bool = False):
+    """Запрашивает адрес с кнопками адресов проекта и водителя"""
+    project = (await state.get_data()).get("project", "")
+    choices = get_suggestions(user_id).suggest_addresses(user_id, project)
+    await state.update_data({ADDRESS_CHOICES: choices})
+    keyboard = _choices_keyboard("address_pick", choices, skip_callback="skip_address")
+    
+    text = "📍 Введите адрес назначения (необязательно):"
+    if choices:
+        text += "\n\nИли выберите из недавних адресов 👇"
+    
+    if edit_message:
+        await message.edit_text(text, reply_markup=keyboard.as_markup())
+    else:
+        await message.answer(text, reply_markup=keyboard.as_markup())
+    
+    await state.set_state(TripStates.waiting_address)
+
+
+@router.callback_query(F.data == "skip_address", StateFilter(TripStates.waiting_address))
+async def callback_skip_address(callback: CallbackQuery, state: FSMContext):
+    """Пропуск поля адреса"""
+    await callback.answer()
+    await state.update_data(address="")
+    await ask_comment(callback.message, state, edit_message=True)
+
+
+@router.callback_query(F.data.startswith("address_pick:"), StateFilter(TripStates.waiting_address))
+async def callback_pick_address(callback: CallbackQuery, state: FSMContext):
+    """Адрес выбран кнопкой"""
+    await callback.answer()
+    address = await _picked_choice(callback, state, ADDRESS_CHOICES)
+    if address is None:
+        return
+    await state.update_data(address=address)
+    await ask_comment(callback.message, state, edit_message=True)
+
+
+@router.message(F.text, StateFilter(TripStates.waiting_address))
+async def handle_address(message: Message, state: FSMContext):
+    """Обработчик ввода адреса"""
+    user_id = message.from_user.id
+    typed = message.text.strip()
+    suggestions = get_suggestions(user_id)
+    
+    address = suggestions.canonical_address(typed)
+    if address is None:
+        project = (await state.get_data()).get("project", "")
+        similar = suggestions.suggest_addresses(user_id, project, prefix=typed) if value_key(typed) else []
+        if similar:
+            await state.update_data({ADDRESS_CHOICES: similar + [typed]})
+            await message.answer(
+                "🔎 Похожие адреса - выберите или оставьте как ввели:",
+                reply_markup=_choices_keyboard("address_pick", similar, typed=typed).as_markup()
+            )
+            return
+        address = typed
+    
+    await state.update_data(address=address)
+    await ask_comment(message, state)
+
+
+async def ask_comment(message: Message, state: FSMContext, edit_message: bool = False):
+    """Запрашивает комментарий"""
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="❌ Отмена", callback_data="cancel")
+    
+    text = (
+        "💬 <b>Комментарий</b>\n\n"
+        "Введите комментарий к поездке.\n"
+        "Можно вставить текст из письма или добавить дополнительную информацию:"
+    )
+    
+    if edit_message:
+        await message.edit_text(text, reply_markup=keyboard.as_markup(), parse_mode="HTML")
+    else:
+        await message.answer(text, reply_markup=keyboard.as_markup(), parse_mode="HTML")
+    
+    await state.set_state(TripStates.waiting_comment)
+
+
+@router.message(F.text, StateFilter(TripStates.waiting_comment))
+async def handle_comment(message: Message, state: FSMContext):
+    """Обработчик ввода комментария"""
+    comment = message.text.strip()
+    await state.update_data(comment=comment)
+    await show_confirmation(message, state)
+
+
+async def show_confirmation(message: Message, state: FSMContext):
+    """Показывает экран подтверждения"""
+    data = await state.get_data()
+    user = get_users_repo(message.from_user.id).get_user(message.from_user.id)
+    
+    start_time = data['start_time']
+    end_time = data['end_time']
+    odometer_start = data['odometer_start']
+    odometer_end = data['odometer_end']
+    distance_km = odometer_end - odometer_start
+    project = data.get('project', '')
+    address = data.get('address', '')
+    comment = data['comment']
+    fuel_liters = data.get('fuel_liters')
+    
+    # Форматируем для отображения
+    start_display = get_time_utils().format_datetime_for_display(start_time)
+    end_display = get_time_utils().format_datetime_for_display(end_time)
+    duration = get_time_utils().format_duration(start_time, end_time)
+    
+    confirmation_text = (
+        "📋 <b>Подтверждение записи</b>\n\n"
+        f"👤 <b>Инженер:</b> {user.full_name}\n"
+        f"🕐 <b>Начало:</b> {start_display}\n"
+        f"🕑 <b>Окончание:</b> {end_display}\n"
+        f"⏱️ <b>Продолжительность:</b> {duration}\n"
+        f"🛣️ <b>Одометр начало:</b> {odometer_start:,} км\n"
+        f"🛣️ <b>Одометр окончание:</b> {odometer_end:,} км\n"
+        f"📏 <b>Пробег:</b> {distance_km:,} км\n"
+    )
+    
+    if fuel_liters is not None:
+        confirmation_text += f"⛽ <b>Топливо:</b> {fuel_liters:.1f} л\n"
+    
+    if project:
+        confirmation_text += f"🏗️ <b>Проект:</b> {project}\n"
+    
+    if address:
+        confirmation_text += f"📍 <b>Адрес:</b> {address}\n"
+    
+    if comment:
+        confirmation_text += f"💬 <b>Комментарий:</b> {comment[:100]}{'...' if len(comment) > 100 else ''}\n"
+    
+    confirmation_text += "\n<i>Все данные корректны?</i>"
+    
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="✅ Сохранить", callback_data="confirm_save")
+    keyboard.button(text="🔙 Назад", callback_data="go_back")
+    keyboard.button(text="❌ Отмена", callback_data="cancel")
+    keyboard.adjust(1, 2)
+    
+    await message.answer(
+        confirmation_text,
+        reply_markup=keyboard.as_markup(),
+        parse_mode="HTML"
+    )
+    
+    await state.set_state(TripStates.waiting_confirmation)
+
+
+def _remember_saved_trip(user_id: int, trip_entry: TripEntry) -> None:
+    """Кэши после сохранения. Строка уже в таблице: ошибка кэша не должна выглядеть как ошибка сохранения."""
+    try:
+        get_last_trips(user_id).remember(user_id, trip_entry)
+        get_suggestions(user_id).remember(trip_entry)
+        get_trip_index(user_id).add(trip_entry)
+    except Exception as e:
+        logger.error(f"Не удалось обновить кэши после сохранения поездки: {e}")
+
+
+@router.callback_query(F.data == "confirm_save", StateFilter(TripStates.waiting_confirmation))
+async def callback_confirm_save(callback: CallbackQuery, state: FSMContext):
+    """Сохранение записи в Google Sheets"""
+    await callback.answer()
+    
+    data = await state.get_data()
+    user = get_users_repo(callback.from_user.id).get_user(callback.from_user.id)
+    
+    # Создаем объект записи
+    start_time = data['start_time']
+    end_time = data['end_time']
+    start_date, start_time_str = get_time_utils().format_datetime_for_sheets(start_time)
+    end_date, end_time_str = get_time_utils().format_datetime_for_sheets(end_time)
+    
+    trip_entry = TripEntry(
+        date=start_date,
+        time_start=start_time_str,
+        time_end=end_time_str,
+        odometer_start=data['odometer_start'],
+        odometer_end=data['odometer_end'],
+        distance_km=data['odometer_end'] - data['odometer_start'],
+        fuel_liters=data.get('fuel_liters'),
+        engineer=user.full_name,
+        project=data.get('project', ''),
+        address=data.get('address', ''),
+        comment=data['comment'],
+        created_at=get_time_utils().get_utc_iso_string(),
+        author_tg_id=callback.from_user.id
+    )
+    
+    # Пытаемся сохранить в Google Sheets
+    try:
+        success = get_sheets_client(callback.from_user.id).append_row(trip_entry)
+        
+        if success:
+            _remember_saved_trip(callback.from_user.id, trip_entry)
+            
+            await callback.message.edit_text(
+                "✅ <b>Запись успешно добавлена!</b>\n\n"
+                f"📏 Пробег: <b>{trip_entry.distance_km:,} км</b>\n"
+                f"🕐 {get_time_utils().format_datetime_for_display(start_time)} - "
+                f"{get_time_utils().format_datetime_for_display(end_time)}\n\n"
+                f"Запись добавлена в Google Sheets.",
+                parse_mode="HTML"
+            )
+            
+            await state.clear()
+            
+            # Показываем главное меню через 3 секунды
+            await asyncio.sleep(3)
+            await send_main_menu(callback.message)
+            
+        else:
+            await callback.message.edit_text(
+                "❌ <b>Ошибка при сохранении!</b>\n\n"
+                "Возможно, это дублирующая запись или проблемы с доступом к Google Sheets.\n"
+                "Попробуйте еще раз через несколько секунд.",
+                parse_mode="HTML"
+            )
+            
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении записи: {e}")
+        await callback.message.edit_text(
+            "❌ <b>Произошла ошибка при сохранении!</b>\n\n"
+            "Пожалуйста, попробуйте еще раз или обратитесь к администратору.",
+            parse_mode="HTML"
+        )
+
+
+@router.callback_query(F.data == "go_back")
+async def callback_go_back(callback: CallbackQuery, state: FSMContext):
+    """Кнопка "Назад" в подтверждении"""
+    await callback.answer()
+    await callback.message.edit_text("🔙 Возвращение к редактированию...")
+    await ask_comment(callback.message, state, edit_message=True)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Отчёт о времени импорта модулей при холодном старте и проверка бюджета.
+
+Запускает чистый интерпретатор с `python -X importtime`, суммирует время
+импорта и показывает самые тяжёлые модули. С --budget-ms возвращает код 1,
+если суммарное время превышает бюджет (удобно для CI).
+
+Почти всё время уходит на aiogram и fastapi, и оно сильно зависит от машины и
+прогретости диска. Поэтому отдельно проверяется собственное время модулей
+проекта (--own-budget-ms): оно стабильно и ловит наши регрессии, а общий
+бюджет задаётся с запасом. Тот же бюджет проверяет tests/test_import_budget.py.
+
+Пример:
+    python import_profile.py --modules server,bot --budget-ms 6000 --own-budget-ms 250
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple, Set
+
+LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+# Модули, которые не должны загружаться при холодном старте webhook
+HEAVY_MODULES = ("googleapiclient", "PIL", "numpy", "torch", "ultralytics", "onnxruntime", "tracemalloc")
+
+# Бюджеты по умолчанию (мс): общий - с запасом на холодный диск, свой код - жёсткий
+DEFAULT_BUDGET_MS = 6000.0
+DEFAULT_OWN_BUDGET_MS = 250.0
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class ImportRecord(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def profile_imports(modules: List[str]) -> List[ImportRecord]:
+    """Импортирует модули в отдельном процессе и разбирает вывод -X importtime."""
+    env = dict(os.environ)
+    # Токен нужен только для создания объекта Bot, сеть при импорте не используется
+    env.setdefault("TELEGRAM_BOT_TOKEN", "123456:import-profile")
+    code = "; ".join(f"import {module}" for module in modules)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, env=env, cwd=PROJECT_DIR,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else "import failed")
+
+    records = []
+    for line in completed.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            records.append(ImportRecord(module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return records
+
+
+def top_level_packages(records: List[ImportRecord]) -> Dict[str, int]:
+    """Суммирует собственное время импорта по пакетам верхнего уровня."""
+    totals: Dict[str, int] = {}
+    for record in records:
+        package = record.module.split(".")[0]
+        totals[package] = totals.get(package, 0) + record.self_us
+    return totals
+
+
+def project_packages() -> Set[str]:
+    """Модули и пакеты верхнего уровня самого проекта (файлы *.py и папки рядом)."""
+    names = set()
+    for name in os.listdir(PROJECT_DIR):
+        path = os.path.join(PROJECT_DIR, name)
+        if name.endswith(".py"):
+            names.add(name[:-3])
+        elif os.path.isfile(os.path.join(path, "__init__.py")):
+            names.add(name)
+    return names
+
+
+def own_time_ms(records: List[ImportRecord]) -> float:
+    """Собственное время импорта модулей проекта (без сторонних библиотек)."""
+    own = project_packages()
+    return sum(r.self_us for r in records if r.module.split(".")[0] in own) / 1000
+
+
+def profile_min(modules: List[str], repeat: int = 3) -> List[ImportRecord]:
+    """Лучший из нескольких замеров: шум машины только добавляет время."""
+    runs = [profile_imports(modules) for _ in range(max(repeat, 1))]
+    return min(runs, key=lambda run: sum(r.self_us for r in run))
+
+
+def check_budget(records: List[ImportRecord], budget_ms: float, own_budget_ms: float) -> List[str]:
+    """Нарушения бюджета холодного старта (пустой список - всё в порядке)."""
+    problems = []
+    total_ms = sum(r.self_us for r in records) / 1000
+    if budget_ms > 0 and total_ms > budget_ms:
+        problems.append(f"импорт занял {total_ms:.1f} мс при бюджете {budget_ms:.0f} мс")
+    own_ms = own_time_ms(records)
+    if own_budget_ms > 0 and own_ms > own_budget_ms:
+        problems.append(f"модули проекта: {own_ms:.1f} мс при бюджете {own_budget_ms:.0f} мс")
+    loaded_heavy = sorted({r.module.split(".")[0] for r in records} & set(HEAVY_MODULES))
+    if loaded_heavy:
+        problems.append(f"тяжёлые зависимости загружены при импорте: {', '.join(loaded_heavy)}")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Профиль времени импорта при холодном старте")
+    parser.add_argument("--modules", default="server,bot", help="модули для импорта через запятую")
+    parser.add_argument("--top", type=int, default=15, help="сколько самых тяжёлых пакетов показать")
+    parser.add_argument("--budget-ms", type=float,
+                        default=float(os.getenv("IMPORT_BUDGET_MS", DEFAULT_BUDGET_MS)),
+                        help="бюджет суммарного времени импорта в мс (0 - без проверки)")
+    parser.add_argument("--own-budget-ms", type=float,
+                        default=float(os.getenv("IMPORT_OWN_BUDGET_MS", DEFAULT_OWN_BUDGET_MS)),
+                        help="бюджет собственного времени модулей проекта в мс (0 - без проверки)")
+    parser.add_argument("--repeat", type=int, default=3, help="число замеров (берётся минимальный)")
+    args = parser.parse_args()
+
+    modules = [m.strip() for m in args.modules.split(",") if m.strip()]
+    records = profile_min(modules, args.repeat)
+    total_ms = sum(r.self_us for r in records) / 1000
+
+    print(f"Импорт {', '.join(modules)}: {total_ms:.1f} мс (модули проекта {own_time_ms(records):.1f} мс), "
+          f"модулей: {len(records)}")
+    print(f"{'пакет':<32} {'мс':>10}")
+    packages = sorted(top_level_packages(records).items(), key=lambda item: item[1], reverse=True)
+    for package, self_us in packages[:args.top]:
+        print(f"{package:<32} {self_us / 1000:>10.1f}")
+
+    problems = check_budget(records, args.budget_ms, args.own_budget_ms)
+    for problem in problems:
+        print(f"❌ {problem}")
+    if problems:
+        return 1
+    print(f"✅ В пределах бюджета: {args.budget_ms:.0f} мс, модули проекта {args.own_budget_ms:.0f} мс")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
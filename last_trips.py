@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Кэш последней поездки каждого водителя.
+
+Загружается одним чтением листа (при старте или в фоне при первом /new)
+и обновляется при каждом сохранении. Из него бот берёт конечный одометр
+прошлой поездки: предлагает кнопку "продолжить с N км" и предупреждает,
+если введённый одометр меньше. Обработчики не читают таблицу, пока кэш
+не загружен - просто работают без подсказки.
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, NamedTuple, Optional
+
+from trip_codec import TripRecord
+
+logger = logging.getLogger(__name__)
+
+
+class LastTrip(NamedTuple):
+    """Что нужно знать о прошлой поездке для начала следующей"""
+    odometer_end: int
+    date: str
+    time_end: str
+    project: str
+    address: str
+    row_uid: str
+
+
+def last_trip_from(entry: Any) -> LastTrip:
+    """Из TripRecord или TripEntry (у обоих одинаковые имена полей)."""
+    return LastTrip(
+        odometer_end=int(entry.odometer_end),
+        date=entry.date,
+        time_end=entry.time_end,
+        project=entry.project or "",
+        address=entry.address or "",
+        row_uid=entry.row_uid or "",
+    )
+
+
+class LastTripCache:
+    """author_tg_id -> последняя сохранённая поездка"""
+
+    def __init__(self, records_loader: Optional[Callable[[], Iterable[TripRecord]]] = None):
+        self.records_loader = records_loader
+        self._trips: Dict[int, LastTrip] = {}
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.loaded = False
+
+    def load(self) -> bool:
+        """Заполняет кэш одним чтением листа. Повторные вызовы ничего не делают."""
+        if self.loaded:
+            return True
+        if self.records_loader is None:
+            return False
+        with self._load_lock:
+            if self.loaded:
+                return True
+            try:
+                records = self.records_loader()
+            except Exception as e:
+                logger.error(f"Не удалось загрузить последние поездки: {e}")
+                return False
+            self.replace_all(records)
+        return True
+
+    def replace_all(self, records: Iterable[TripRecord]) -> None:
+        """Последняя строка автора в порядке листа - его последняя поездка."""
+        fresh: Dict[int, LastTrip] = {}
+        for record in records:
+            if record.author_tg_id:
+                fresh[record.author_tg_id] = last_trip_from(record)
+        with self._lock:
+            # Поездки, сохранённые во время чтения листа, новее прочитанных
+            fresh.update(self._trips)
+            self._trips = fresh
+            self.loaded = True
+        logger.info(f"Загружены последние поездки {len(fresh)} водителей")
+
+    def get(self, author_tg_id: int) -> Optional[LastTrip]:
+        return self._trips.get(author_tg_id)
+
+    def remember(self, author_tg_id: int, entry: Any) -> None:
+        """Вызывается после успешного сохранения поездки."""
+        with self._lock:
+            self._trips[author_tg_id] = last_trip_from(entry)
+
+    def refresh(self, author_tg_id: int, entry: Any) -> None:
+        """После редактирования: обновляет запись, только если это и есть последняя поездка."""
+        with self._lock:
+            current = self._trips.get(author_tg_id)
+            if current is not None and current.row_uid == entry.row_uid:
+                self._trips[author_tg_id] = last_trip_from(entry)
+
+    def apply_change(self, change: Any) -> None:
+        """Ручные правки листа (sheet_watch.SheetChange): пересчёт только затронутых водителей."""
+        if not self.loaded:
+            return
+        authors = {record.author_tg_id for record in change.added + change.removed if record.author_tg_id}
+        latest: Dict[int, TripRecord] = {}
+        for record in reversed(change.records):
+            if record.author_tg_id in authors and record.author_tg_id not in latest:
+                latest[record.author_tg_id] = record
+                if len(latest) == len(authors):
+                    break
+        with self._lock:
+            for author in authors:
+                if author in latest:
+                    self._trips[author] = last_trip_from(latest[author])
+                else:
+                    self._trips.pop(author, None)
+
+    def check_odometer_start(self, author_tg_id: int, odometer_start: int) -> Optional[LastTrip]:
+        """Возвращает прошлую поездку, если одометр начала меньше её конечного одометра."""
+        last = self._trips.get(author_tg_id)
+        if last is not None and odometer_start < last.odometer_end:
+            return last
+        return None
+
+    def __len__(self) -> int:
+        return len(self._trips)
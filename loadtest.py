@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест webhook: N водителей одновременно проходят весь сценарий
+поездки (регистрация, /new, время, одометры, фото топлива, проект, адрес,
+комментарий, confirm_save), отправляя обновления в server.py.
+
+Бот работает против фейкового Bot API (fake_bot_api.py) и фейковых Google
+Sheets (fake_sheets.py, SHEETS_BACKEND=fake). По умолчанию server.py
+запускается отдельным процессом с нужными переменными окружения.
+
+Отчёт: пропускная способность, перцентили задержки по шагам (от отправки
+обновления до ответа бота) и доля ошибок.
+
+Пример:
+    python loadtest.py --drivers 50 --trips 2 --photo samples/5_dashboard.jpg \\
+        --sheets-latency-ms 150 --webhook-mode sync --output loadtest.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from fake_bot_api import BotReply, FakeBotApi
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+BOT_TOKEN = "1:LOADTEST"
+RETRY_STATUSES = (429, 503)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль с линейной интерполяцией."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class LoadTest:
+    """Генератор обновлений и сбор статистики"""
+
+    def __init__(self, server_url: str, api: FakeBotApi, reply_timeout: float, max_retries: int):
+        self.server_url = server_url
+        self.api = api
+        self.reply_timeout = reply_timeout
+        self.max_retries = max_retries
+        self.counts: Counter = Counter()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Counter] = defaultdict(Counter)
+        self.retries = 0
+        self.updates_sent = 0
+        self.trips_completed = 0
+        self._update_id = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def next_update_id(self) -> int:
+        self._update_id += 1
+        return self._update_id
+
+    async def deliver(self, update: Dict[str, Any]) -> int:
+        """Отправляет обновление как Telegram: при 429/503 повторяет через Retry-After."""
+        for attempt in range(self.max_retries + 1):
+            self.updates_sent += 1
+            async with self._session.post(self.server_url, json=update) as response:
+                await response.read()
+                if response.status not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response.status
+                self.retries += 1
+                await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+        return 0
+
+    async def step(
+        self, name: str, chat_id: int, update: Dict[str, Any], expect: int = 1, tolerate_error_reply: bool = False
+    ) -> List[BotReply]:
+        """
+        Отправляет обновление и ждёт expect ответов бота в чате.
+        Ответ с "❌" считается ошибкой; при tolerate_error_reply сценарий продолжается.
+        """
+        self.counts[name] += 1
+        inbox = self.api.inbox(chat_id)
+        replies: List[BotReply] = []
+
+        async def collect() -> None:
+            while len(replies) < expect:
+                replies.append(await inbox.get())
+
+        started = time.perf_counter()
+        deliver_task = asyncio.create_task(self.deliver(update))
+        collect_task = asyncio.create_task(collect())
+        pending = {deliver_task, collect_task}
+        deadline = started + self.reply_timeout
+        error: Optional[str] = None
+        while collect_task in pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(deadline - time.perf_counter(), 0), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                error = "timeout"
+                break
+            if deliver_task in done and deliver_task.exception() is None and deliver_task.result() != 200:
+                error = f"http_{deliver_task.result()}"
+                break
+            if deliver_task in done and deliver_task.exception() is not None:
+                error = type(deliver_task.exception()).__name__
+                break
+        collect_task.cancel()
+        if not deliver_task.done():
+            # Ответы получены, но webhook ещё не ответил (например, sleep в обработчике)
+            await asyncio.gather(deliver_task, return_exceptions=True)
+
+        if error is None:
+            self.latencies[name].append(replies[-1].received_at - started)
+            if any(reply.text.startswith("❌") for reply in replies):
+                error = "error_reply"
+        if error is not None:
+            self.errors[name][error] += 1
+            if not (error == "error_reply" and tolerate_error_reply):
+                raise StepFailed(f"{name}: {error}")
+        return replies
+
+    async def drain(self, chat_id: int, count: int = 1) -> None:
+        """Ждёт отложенные сообщения (главное меню после сохранения), не учитывая их в статистике."""
+        inbox = self.api.inbox(chat_id)
+        for _ in range(count):
+            try:
+                await asyncio.wait_for(inbox.get(), self.reply_timeout)
+            except asyncio.TimeoutError:
+                return
+
+    async def run(self, drivers: int, trips: int, ramp_up: float, use_photo: bool) -> float:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.reply_timeout * 2)) as session:
+            self._session = session
+            started = time.perf_counter()
+            tasks = []
+            for index in range(drivers):
+                driver = Driver(self, user_id=100000 + index, name=f"Водитель Тестовый {index}")
+                tasks.append(asyncio.create_task(driver.run(trips, use_photo, delay=ramp_up * index / max(drivers, 1))))
+            await asyncio.gather(*tasks)
+            return time.perf_counter() - started
+
+
+class StepFailed(Exception):
+    """Шаг сценария не удался, водитель прекращает поездку"""
+
+
+class Driver:
+    """Один водитель, проходящий сценарий поездки"""
+
+    def __init__(self, test: LoadTest, user_id: int, name: str):
+        self.test = test
+        self.user_id = user_id
+        self.name = name
+        self.user = {"id": user_id, "is_bot": False, "first_name": name.split()[-1], "language_code": "ru"}
+        self.chat = {"id": user_id, "type": "private"}
+        self.last_bot_message: Optional[BotReply] = None
+
+    def _message(self, **fields: Any) -> Dict[str, Any]:
+        message = {
+            "message_id": self.test.api.next_message_id(self.user_id),
+            "date": int(time.time()),
+            "chat": self.chat,
+            "from": self.user,
+        }
+        message.update(fields)
+        return {"update_id": self.test.next_update_id(), "message": message}
+
+    def _callback(self, data: str) -> Dict[str, Any]:
+        reply = self.last_bot_message
+        return {
+            "update_id": self.test.next_update_id(),
+            "callback_query": {
+                "id": uuid.uuid4().hex,
+                "from": self.user,
+                "chat_instance": str(self.user_id),
+                "data": data,
+                "message": {
+                    "message_id": reply.message_id if reply else 1,
+                    "date": int(time.time()),
+                    "chat": self.chat,
+                    "from": self.test.api.bot_user,
+                    "text": reply.text if reply else "",
+                },
+            },
+        }
+
+    async def _send(self, name: str, update: Dict[str, Any], expect: int = 1, **kwargs: Any) -> List[BotReply]:
+        replies = await self.test.step(name, self.user_id, update, expect, **kwargs)
+        # Кнопки нажимаются на последнем сообщении с клавиатурой
+        for reply in replies:
+            if reply.buttons:
+                self.last_bot_message = reply
+        return replies
+
+    async def text(self, name: str, text: str, expect: int = 1) -> List[BotReply]:
+        return await self._send(name, self._message(text=text), expect)
+
+    async def press(self, name: str, data: str, expect: int = 1) -> List[BotReply]:
+        return await self._send(name, self._callback(data), expect)
+
+    async def photo(self, name: str, trip: int, expect: int = 2) -> List[BotReply]:
+        size = len(self.test.api.photo or b"")
+        file_id = f"photo-{self.user_id}-{trip}"
+        photo = [{"file_id": file_id, "file_unique_id": file_id, "width": 1280, "height": 960, "file_size": size}]
+        # Нераспознанное фото - ошибка, но водитель пропускает шаг и продолжает
+        return await self._send(name, self._message(photo=photo), expect, tolerate_error_reply=True)
+
+    async def _keep_typed(self, replies: List[BotReply], prefix: str) -> None:
+        """На похожие значения бот предлагает выбрать - оставляем введённое (последняя кнопка варианта)."""
+        picks = [data for data in replies[-1].buttons if data.startswith(prefix)]
+        if picks:
+            await self.press("keep_typed", picks[-1])
+
+    async def run(self, trips: int, use_photo: bool, delay: float = 0.0) -> None:
+        await asyncio.sleep(delay)
+        try:
+            await self.text("start", "/start")
+            await self.text("register", self.name, expect=2)
+        except StepFailed as e:
+            logger.debug(f"Водитель {self.user_id}: {e}")
+            return
+
+        odometer = 10000 + self.user_id % 1000 * 100
+        for trip in range(trips):
+            try:
+                await self.text("new", "/new")
+                replies = await self.press("time_now", "time_now")
+                # Со второй поездки бот предлагает продолжить с конечного одометра прошлой
+                continue_button = f"odometer_start:{odometer}"
+                if continue_button in replies[-1].buttons:
+                    await self.press("odometer_continue", continue_button)
+                else:
+                    await self.text("odometer_start", str(odometer))
+                await self.press("end_time_now", "end_time_now")
+                odometer += 42
+                await self.text("odometer_end", str(odometer))
+                if use_photo:
+                    replies = await self.photo("fuel_photo", trip)
+                    if "confirm_fuel" in replies[-1].buttons:
+                        replies = await self.press("confirm_fuel", "confirm_fuel")
+                    else:
+                        replies = await self.press("skip_fuel_photo", "skip_fuel_photo")
+                else:
+                    replies = await self.press("skip_fuel_photo", "skip_fuel_photo")
+                # Со второй поездки первая подсказка - проект самого водителя
+                if trip > 0 and "project_pick:0" in replies[-1].buttons:
+                    await self.press("project_pick", "project_pick:0")
+                else:
+                    replies = await self.text("project", f"Проект {self.user_id % 7}")
+                    await self._keep_typed(replies, "project_pick:")
+                replies = await self.text("address", f"ул. Нагрузочная, {trip + 1}")
+                await self._keep_typed(replies, "address_pick:")
+                await self.text("comment", "Нагрузочный тест")
+                await self.press("confirm_save", "confirm_save")
+                await self.test.drain(self.user_id)
+                self.test.trips_completed += 1
+            except StepFailed as e:
+                logger.debug(f"Водитель {self.user_id}, поездка {trip}: {e}")
+                # Опоздавшие ответы не должны попасть в следующую поездку (/new сбрасывает состояние FSM)
+                await asyncio.sleep(1.0)
+                inbox = self.test.api.inbox(self.user_id)
+                while not inbox.empty():
+                    inbox.get_nowait()
+
+
+async def wait_for_server(url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f"{url.rstrip('/')}/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server.py не запустился за {timeout} с")
+
+
+def start_server(port: int, api_url: str, args: argparse.Namespace) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "PORT": str(port),
+        "TELEGRAM_BOT_TOKEN": BOT_TOKEN,
+        "TELEGRAM_API_URL": api_url,
+        "SHEETS_BACKEND": "fake",
+        "GOOGLE_SHEET_ID": "loadtest",
+        "FAKE_SHEETS_LATENCY_MS": str(args.sheets_latency_ms),
+        "WEBHOOK_MODE": args.webhook_mode,
+    })
+    log = open(args.server_log, "w", encoding="utf-8")
+    return subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")],
+        env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+def build_report(test: LoadTest, elapsed: float, args: argparse.Namespace) -> Dict[str, Any]:
+    steps = {}
+    total_ok = total_failed = 0
+    for name in test.counts:
+        latencies = test.latencies.get(name, [])
+        failed = sum(test.errors[name].values())
+        total_ok += test.counts[name] - failed
+        total_failed += failed
+        steps[name] = {
+            "count": test.counts[name],
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+            "max_ms": round(max(latencies) * 1000, 1) if latencies else 0.0,
+            "errors": dict(test.errors[name]),
+        }
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "drivers": args.drivers,
+        "trips_per_driver": args.trips,
+        "webhook_mode": args.webhook_mode,
+        "sheets_latency_ms": args.sheets_latency_ms,
+        "photo": bool(args.photo),
+        "elapsed_s": round(elapsed, 2),
+        "trips_completed": test.trips_completed,
+        "trips_per_s": round(test.trips_completed / elapsed, 2) if elapsed else 0.0,
+        "updates_sent": test.updates_sent,
+        "updates_per_s": round(test.updates_sent / elapsed, 1) if elapsed else 0.0,
+        "retries": test.retries,
+        "error_rate": round(total_failed / (total_ok + total_failed), 4) if total_ok + total_failed else 0.0,
+        "bot_api_calls": dict(test.api.calls),
+        "steps": steps,
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\nВодителей: {report['drivers']}, поездок на водителя: {report['trips_per_driver']}, "
+          f"режим: {report['webhook_mode']}, задержка Sheets: {report['sheets_latency_ms']} мс")
+    print(f"Время: {report['elapsed_s']} с, поездок: {report['trips_completed']} "
+          f"({report['trips_per_s']}/с), обновлений: {report['updates_sent']} ({report['updates_per_s']}/с), "
+          f"повторов: {report['retries']}, ошибок: {report['error_rate']:.2%}")
+    print(f"\n{'шаг':<18}{'n':>6}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'max мс':>10}  ошибки")
+    for name, step in report["steps"].items():
+        errors = ", ".join(f"{kind}={count}" for kind, count in step["errors"].items()) or "-"
+        print(f"{name:<18}{step['count']:>6}{step['p50_ms']:>10}{step['p95_ms']:>10}"
+              f"{step['p99_ms']:>10}{step['max_ms']:>10}  {errors}")
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    photo = None
+    if args.photo:
+        with open(args.photo, "rb") as f:
+            photo = f.read()
+    api = FakeBotApi(bot_id=int(BOT_TOKEN.split(":")[0]), photo=photo)
+    api_url = await api.start(port=args.api_port)
+    logger.info(f"Фейковый Bot API: {api_url}")
+
+    server = None
+    server_url = args.server_url
+    try:
+        if not server_url:
+            server = start_server(args.port, api_url, args)
+            server_url = f"http://127.0.0.1:{args.port}/"
+            await wait_for_server(server_url, args.startup_timeout)
+            logger.info(f"server.py запущен: {server_url} (лог: {args.server_log})")
+        else:
+            logger.info(f"Используется запущенный сервер {server_url}: у него должны быть "
+                        f"TELEGRAM_API_URL={api_url}, TELEGRAM_BOT_TOKEN={BOT_TOKEN}, SHEETS_BACKEND=fake")
+
+        test = LoadTest(server_url, api, reply_timeout=args.reply_timeout, max_retries=args.max_retries)
+        elapsed = await test.run(args.drivers, args.trips, args.ramp_up, use_photo=photo is not None)
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        await api.stop()
+
+    report = build_report(test, elapsed, args)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"Результаты сохранены: {args.output}")
+    return 0 if report["error_rate"] <= args.max_error_rate else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест webhook: сценарий поездки для N водителей")
+    parser.add_argument("--drivers", type=int, default=20, help="число одновременных водителей")
+    parser.add_argument("--trips", type=int, default=1, help="поездок на водителя")
+    parser.add_argument("--ramp-up", type=float, default=2.0, help="за сколько секунд подключаются все водители")
+    parser.add_argument("--photo", help="фото панели приборов (без него шаг фото пропускается)")
+    parser.add_argument("--webhook-mode", default="sync", choices=["sync", "queue"], help="WEBHOOK_MODE сервера")
+    parser.add_argument("--sheets-latency-ms", type=float, default=100, help="задержка фейкового Sheets API")
+    parser.add_argument("--server-url", help="URL уже запущенного webhook (иначе server.py запускается сам)")
+    parser.add_argument("--port", type=int, default=8181, help="порт запускаемого server.py")
+    parser.add_argument("--api-port", type=int, default=0, help="порт фейкового Bot API (0 - любой свободный)")
+    parser.add_argument("--server-log", default="loadtest_server.log", help="куда писать лог server.py")
+    parser.add_argument("--reply-timeout", type=float, default=30.0, help="ожидание ответа бота на шаг, с")
+    parser.add_argument("--max-retries", type=int, default=3, help="повторы при 429/503, как у Telegram")
+    parser.add_argument("--startup-timeout", type=float, default=60.0, help="ожидание запуска server.py, с")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="допустимая доля ошибок")
+    parser.add_argument("--output", help="файл с результатами (JSON)")
+    args = parser.parse_args()
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
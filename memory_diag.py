@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Диагностика памяти процесса (маршруты /debug/memory в server.py).
+
+Контейнеры падают по OOM на лимитах 1-2 ГБ, и без данных непонятно, что
+растёт: torch и модель топлива, хранилище FSM, пользователи или ответы Sheets.
+Здесь собраны:
+
+- RSS процесса и лимит памяти cgroup (то, по чему убивает OOM killer);
+- крупнейшие места выделения памяти по tracemalloc, снимки и их сравнение;
+- размеры известных структур: записи FSM, пользователи и кэши поездок каждой
+  загруженной компании, кэш результатов и модель топлива.
+
+tracemalloc замедляет аллокации, поэтому включается по запросу
+(POST /debug/memory/tracemalloc). Чтобы увидеть память, выделенную при старте
+(импорт torch, загрузка модели), запустите процесс с PYTHONTRACEMALLOC=1.
+"""
+
+import gc
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MEMORY_DIAG_TOKEN = os.getenv("MEMORY_DIAG_TOKEN", "").strip()
+MEMORY_SNAPSHOTS = int(os.getenv("MEMORY_SNAPSHOTS", "4"))
+# Предел обхода объектов при подсчёте размера одной структуры
+MEMORY_DIAG_MAX_OBJECTS = int(os.getenv("MEMORY_DIAG_MAX_OBJECTS", "2000000"))
+
+GROUP_BY = ("lineno", "filename", "traceback")
+
+# Общие объекты не относятся к структуре: классы, модули, функции, связанные методы
+_SHARED_TYPES = (
+    type, types.ModuleType, types.FunctionType, types.MethodType,
+    types.BuiltinFunctionType, types.CodeType, types.FrameType,
+)
+
+
+def _mb(size: float) -> float:
+    return round(size / (1024 * 1024), 1)
+
+
+def _read_cgroup_value(path: str) -> Optional[int]:
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+        return None if value == "max" else int(value)
+    except (OSError, ValueError):
+        return None
+
+
+def process_memory() -> Dict[str, Any]:
+    """RSS, пик RSS и лимит cgroup в мегабайтах."""
+    report: Dict[str, Any] = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM", "RssAnon", "RssFile"):
+                    report[key.lower() + "_mb"] = _mb(int(value.split()[0]) * 1024)
+    except (OSError, ValueError, IndexError):
+        # Нет /proc (не Linux): только пиковое значение
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        report["vmhwm_mb"] = _mb(maxrss if sys.platform == "darwin" else maxrss * 1024)
+
+    # Лимит контейнера: cgroup v2, затем v1
+    limit = _read_cgroup_value("/sys/fs/cgroup/memory.max")
+    usage = _read_cgroup_value("/sys/fs/cgroup/memory.current")
+    if limit is None and usage is None:
+        limit = _read_cgroup_value("/sys/fs/cgroup/memory/memory.limit_in_bytes")
+        usage = _read_cgroup_value("/sys/fs/cgroup/memory/memory.usage_in_bytes")
+    # v1 без лимита отдаёт огромное число
+    if limit is not None and limit < 1 << 60:
+        report["cgroup_limit_mb"] = _mb(limit)
+    if usage is not None:
+        report["cgroup_usage_mb"] = _mb(usage)
+    # Только счётчики поколений: len(gc.get_objects()) держит GIL на весь обход кучи
+    report["gc_counts"] = gc.get_count()
+    return report
+
+
+def deep_sizeof(obj: Any, max_objects: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Примерный размер объекта со всем, на что он ссылается (без классов, модулей
+    и функций). Буферы вне кучи Python (тензоры torch, сессия ONNX) не видны.
+    """
+    limit = MEMORY_DIAG_MAX_OBJECTS if max_objects is None else max_objects
+    seen = set()
+    stack = [obj]
+    size = 0
+    while stack and len(seen) < limit:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _SHARED_TYPES):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        stack.extend(gc.get_referents(current))
+    return {"kb": round(size / 1024, 1), "objects": len(seen), "truncated": bool(stack)}
+
+
+def _data_attrs(obj: Any) -> Dict[str, Any]:
+    """Атрибуты-данные объекта кэша: без загрузчиков, замков и ссылок на клиентов."""
+    return {
+        name: value for name, value in vars(obj).items()
+        if not callable(value) and not name.endswith("_lock")
+        and name not in ("sheets_client", "users_repo", "listeners")
+    }
+
+
+def fsm_storage_report(storage: Any) -> Dict[str, Any]:
+    """Записи хранилища FSM: сколько, в каких состояниях и сколько занимают."""
+    records = getattr(storage, "storage", None)
+    if not isinstance(records, dict):
+        # Redis и другие внешние хранилища держат данные вне процесса
+        return {"type": type(storage).__name__, "in_process": False}
+    items = list(records.items())
+    states: Dict[str, int] = {}
+    with_data = 0
+    for _, record in items:
+        state = getattr(record, "state", None) or "-"
+        states[state] = states.get(state, 0) + 1
+        if getattr(record, "data", None):
+            with_data += 1
+    return {
+        "type": type(storage).__name__,
+        "entries": len(items),
+        "with_data": with_data,
+        "states": dict(sorted(states.items(), key=lambda item: -item[1])[:10]),
+        "size": deep_sizeof(records),
+    }
+
+
+def tenant_report(context: Any) -> Dict[str, Any]:
+    """Пользователи и кэши поездок одной компании."""
+    report: Dict[str, Any] = {
+        "users": {"count": len(context.users_repo.users), "size": deep_sizeof(context.users_repo.users)},
+        "last_trips": {"count": len(context.last_trips), "size": deep_sizeof(_data_attrs(context.last_trips))},
+        "suggestions": {
+            "projects": len(context.suggestions.projects),
+            "addresses": len(context.suggestions.addresses),
+            "size": deep_sizeof(_data_attrs(context.suggestions)),
+        },
+        "trip_index": {"count": len(context.trip_index), "size": deep_sizeof(_data_attrs(context.trip_index))},
+    }
+    watcher = getattr(context, "watcher", None)
+    if watcher is not None:
+        report["sheet_snapshot"] = {"count": len(watcher._records), "size": deep_sizeof(watcher._records)}
+    return report
+
+
+def _model_weights_bytes(detector: Any) -> Optional[int]:
+    model = detector.model
+    if model is None:
+        return None
+    # ultralytics YOLO: веса torch-модуля (параметры и буферы)
+    module = getattr(model, "model", None)
+    if hasattr(module, "parameters"):
+        tensors = list(module.parameters()) + list(getattr(module, "buffers", lambda: [])())
+        return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+    # ONNX Runtime держит веса в своей памяти: ориентир - размер файла модели
+    try:
+        return os.path.getsize(detector.model_path)
+    except OSError:
+        return None
+
+
+def fuel_model_report(fuel_service: Any) -> Dict[str, Any]:
+    """Модель топлива этого процесса (у отдельного воркера своя память)."""
+    detector = getattr(fuel_service, "detector", None)
+    report: Dict[str, Any] = {
+        "torch_imported": "torch" in sys.modules,
+        "onnxruntime_imported": "onnxruntime" in sys.modules,
+    }
+    if detector is None:
+        report["in_process"] = False
+        return report
+    report.update({
+        "in_process": True,
+        "backend": detector.backend,
+        "loaded": detector.is_available(),
+    })
+    weights = _model_weights_bytes(detector)
+    if weights is not None:
+        report["weights_mb"] = _mb(weights)
+    lifecycle = getattr(fuel_service, "lifecycle", None)
+    if lifecycle is not None and lifecycle.last_load:
+        report["last_load"] = lifecycle.last_load
+    return report
+
+
+def structures_report(fsm_storage: Optional[Any] = None) -> Dict[str, Any]:
+    """Размеры известных структур. Ничего не создаёт: только то, что уже загружено."""
+    from deps import get_fuel_cache, get_fuel_service, get_tenant_registry, is_initialized
+
+    started = time.perf_counter()
+    report: Dict[str, Any] = {}
+    if fsm_storage is not None:
+        report["fsm_storage"] = fsm_storage_report(fsm_storage)
+    if is_initialized("tenant_registry"):
+        report["tenants"] = {
+            tenant_id: tenant_report(context)
+            for tenant_id, context in get_tenant_registry().loaded().items()
+        }
+    if is_initialized("fuel_cache"):
+        fuel_cache = get_fuel_cache()
+        report["fuel_cache"] = {"count": len(fuel_cache._entries), "size": deep_sizeof(fuel_cache._entries)}
+    if is_initialized("fuel_service"):
+        report["fuel_model"] = fuel_model_report(get_fuel_service())
+    report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return report
+
+
+def _short_path(filename: str) -> str:
+    """Путь относительно sys.path: site-packages/... короче абсолютного."""
+    best = filename
+    for entry in sys.path:
+        if entry and filename.startswith(entry + os.sep) and len(filename) - len(entry) - 1 < len(best):
+            best = filename[len(entry) + 1:]
+    return best
+
+
+def _where(traceback: tracemalloc.Traceback, group_by: str) -> Any:
+    if group_by == "traceback":
+        return [f"{_short_path(frame.filename)}:{frame.lineno}" for frame in traceback]
+    frame = traceback[0]
+    return _short_path(frame.filename) if group_by == "filename" else f"{_short_path(frame.filename)}:{frame.lineno}"
+
+
+class MemoryProfiler:
+    """tracemalloc: включение по запросу, именованные снимки и их сравнение"""
+
+    def __init__(self, max_snapshots: Optional[int] = None):
+        self.max_snapshots = max(MEMORY_SNAPSHOTS if max_snapshots is None else max_snapshots, 1)
+        self._snapshots: "OrderedDict[str, Tuple[float, tracemalloc.Snapshot]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, frames: int = 1) -> None:
+        """Включает tracemalloc (frames - глубина стека у каждого выделения)."""
+        if tracemalloc.is_tracing() and tracemalloc.get_traceback_limit() != frames:
+            tracemalloc.stop()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(frames, 1))
+            logger.info(f"tracemalloc включён, глубина стека {frames}")
+
+    def stop(self) -> None:
+        """Выключает tracemalloc. Снятые снимки остаются для сравнения."""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("tracemalloc выключен")
+
+    def status(self) -> Dict[str, Any]:
+        report: Dict[str, Any] = {"tracing": tracemalloc.is_tracing()}
+        if report["tracing"]:
+            current, peak = tracemalloc.get_traced_memory()
+            report.update({
+                "frames": tracemalloc.get_traceback_limit(),
+                "traced_mb": _mb(current),
+                "traced_peak_mb": _mb(peak),
+                "overhead_mb": _mb(tracemalloc.get_tracemalloc_memory()),
+            })
+        with self._lock:
+            report["snapshots"] = {
+                name: time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(taken_at))
+                for name, (taken_at, _) in self._snapshots.items()
+            }
+        return report
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc выключен: POST /debug/memory/tracemalloc?frames=1")
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def take_snapshot(self, name: Optional[str] = None) -> str:
+        """Снимает и запоминает снимок (самые старые вытесняются)."""
+        snapshot = self._snapshot()
+        taken_at = time.time()
+        name = name or time.strftime("%H%M%S", time.gmtime(taken_at))
+        with self._lock:
+            self._snapshots.pop(name, None)
+            self._snapshots[name] = (taken_at, snapshot)
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        logger.info(f"Снимок памяти {name}: {_mb(sum(stat.size for stat in snapshot.statistics('filename')))} МБ")
+        return name
+
+    def _get(self, name: str) -> tracemalloc.Snapshot:
+        with self._lock:
+            if name not in self._snapshots:
+                raise KeyError(name)
+            return self._snapshots[name][1]
+
+    def top(self, limit: int = 20, group_by: str = "lineno") -> List[Dict[str, Any]]:
+        """Крупнейшие места выделения памяти сейчас."""
+        if group_by not in GROUP_BY:
+            raise ValueError(f"group_by: одно из {', '.join(GROUP_BY)}")
+        return [
+            {"where": _where(stat.traceback, group_by), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+            for stat in self._snapshot().statistics(group_by)[:limit]
+        ]
+
+    def diff(self, base: str, against: Optional[str] = None, limit: int = 20,
+             group_by: str = "lineno") -> List[Dict[str, Any]]:
+        """Что выросло со снимка base: до снимка against или до текущего состояния."""
+        if group_by not in GROUP_BY:
+            raise ValueError(f"group_by: одно из {', '.join(GROUP_BY)}")
+        old = self._get(base)
+        new = self._get(against) if against else self._snapshot()
+        return [
+            {
+                "where": _where(stat.traceback, group_by),
+                "size_diff_kb": round(stat.size_diff / 1024, 1),
+                "size_kb": round(stat.size / 1024, 1),
+                "count_diff": stat.count_diff,
+            }
+            for stat in new.compare_to(old, group_by)[:limit]
+        ]
+
+
+memory_profiler = MemoryProfiler()
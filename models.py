@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional
 from datetime import datetime
 import uuid
@@ -28,36 +28,18 @@ class TripEntry(BaseModel):
     author_tg_id: int
     row_uid: str = Field(default_factory=lambda: str(uuid.uuid4()))
 
-    @validator('odometer_end')
-    def validate_odometer_end(cls, v, values):
-        if 'odometer_start' in values and v < values['odometer_start']:
+    @model_validator(mode='after')
+    def check_odometer(self) -> 'TripEntry':
+        if self.odometer_end < self.odometer_start:
             raise ValueError('Конечный одометр должен быть больше или равен начальному')
-        return v
-
-    @validator('distance_km', always=True)
-    def calculate_distance(cls, v, values):
-        if 'odometer_start' in values and 'odometer_end' in values:
-            return values['odometer_end'] - values['odometer_start']
-        return v
+        # Пробег всегда считается по одометрам
+        self.distance_km = self.odometer_end - self.odometer_start
+        return self
 
     def to_sheets_row(self) -> list:
         """Преобразует запись в массив для Google Sheets"""
-        return [
-            self.date,
-            self.time_start,
-            self.time_end,
-            str(self.odometer_start),
-            str(self.odometer_end),
-            str(self.distance_km),
-            str(self.fuel_liters) if self.fuel_liters is not None else "",
-            self.engineer,
-            self.project or "",
-            self.address or "",
-            self.comment,
-            self.created_at,
-            str(self.author_tg_id),
-            self.row_uid
-        ]
+        from trip_codec import TripRecord, TripRowCodec
+        return TripRowCodec.encode(TripRecord.from_entry(self))
 
     @classmethod
     def get_headers(cls) -> list:
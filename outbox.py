@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Очередь исходящих сообщений с ограничением скорости.
+
+Telegram ограничивает рассылки: около 30 сообщений в секунду на бота и около
+одного сообщения в секунду в один чат. Массовые уведомления (дайджест
+администраторам, напоминания о незавершённых поездках) идут через эту
+очередь, а не напрямую через bot.send_message:
+
+- общий token bucket на бота (OUTBOX_GLOBAL_RATE сообщений/с);
+- token bucket на каждый чат (OUTBOX_CHAT_RATE сообщений/с, OUTBOX_CHAT_BURST подряд);
+- сообщения одного чата уходят строго по порядку, разные чаты не ждут друг друга;
+- при 429 (TelegramRetryAfter) очередь ставится на паузу на retry_after секунд,
+  и сообщение отправляется повторно (до OUTBOX_MAX_RETRIES раз).
+
+Ответы на действия водителя (message.answer в обработчиках) идут как раньше.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity накопленных"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Сколько секунд ждать до появления токена (0 - можно сразу)."""
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self._refill(time.monotonic())
+        self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        """Опустошает bucket так, чтобы следующий токен появился через seconds."""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+    def is_full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class OutgoingMessage:
+    __slots__ = ("chat_id", "text", "kwargs", "future", "attempts")
+
+    def __init__(self, chat_id: int, text: str, kwargs: Dict[str, Any], future: Optional[asyncio.Future]):
+        self.chat_id = chat_id
+        self.text = text
+        self.kwargs = kwargs
+        self.future = future
+        self.attempts = 0
+
+
+class Outbox:
+    """Очередь исходящих сообщений поверх bot.send_message"""
+
+    def __init__(
+        self,
+        global_rate: Optional[float] = None,
+        chat_rate: Optional[float] = None,
+        chat_burst: Optional[int] = None,
+        workers: Optional[int] = None,
+        max_retries: Optional[int] = None,
+    ):
+        if global_rate is None:
+            global_rate = float(os.getenv("OUTBOX_GLOBAL_RATE", "25"))
+        if chat_rate is None:
+            chat_rate = float(os.getenv("OUTBOX_CHAT_RATE", "1"))
+        if chat_burst is None:
+            chat_burst = int(os.getenv("OUTBOX_CHAT_BURST", "3"))
+        if workers is None:
+            workers = int(os.getenv("OUTBOX_WORKERS", "4"))
+        if max_retries is None:
+            max_retries = int(os.getenv("OUTBOX_MAX_RETRIES", "3"))
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.workers = max(workers, 1)
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._chat_queues: Dict[int, Deque[OutgoingMessage]] = {}
+        # Чаты, готовые к отправке: (момент готовности, порядковый номер, chat_id)
+        self._ready: List[Tuple[float, int, int]] = []
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._bot: Any = None
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def start(self, bot: Any) -> None:
+        if self._tasks:
+            return
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Очередь исходящих сообщений запущена: {self.workers} отправителей")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Дожидается отправки накопленных сообщений и останавливает отправителей."""
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self.pending():
+            logger.warning(f"Не отправлено до остановки: {self.pending()} сообщений")
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def send(self, chat_id: int, text: str, wait: bool = False, **kwargs: Any) -> Optional[asyncio.Future]:
+        """
+        Ставит сообщение в очередь. kwargs передаются в bot.send_message.
+        При wait=True возвращает future с отправленным Message (или исключением).
+        """
+        future = asyncio.get_running_loop().create_future() if wait else None
+        message = OutgoingMessage(chat_id, text, kwargs, future)
+        chat_queue = self._chat_queues.get(chat_id)
+        if chat_queue is None:
+            if len(self._chat_buckets) > 1000:
+                self._prune_buckets()
+            # Чат не в работе: планируем его, когда позволит его bucket
+            self._chat_queues[chat_id] = deque([message])
+            self._schedule(chat_id, self._chat_bucket(chat_id).delay())
+        else:
+            chat_queue.append(message)
+        return future
+
+    def pending(self) -> int:
+        return sum(len(queue) for queue in self._chat_queues.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self.pending(),
+            "chats": len(self._chat_queues),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _prune_buckets(self) -> None:
+        """Забывает полные bucket'ы простаивающих чатов."""
+        for chat_id in [chat_id for chat_id, bucket in self._chat_buckets.items()
+                        if chat_id not in self._chat_queues and bucket.is_full()]:
+            del self._chat_buckets[chat_id]
+
+    def _schedule(self, chat_id: int, delay: float) -> None:
+        heapq.heappush(self._ready, (time.monotonic() + delay, next(self._sequence), chat_id))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _next_chat(self) -> int:
+        """Ждёт чат, которому уже можно отправить следующее сообщение."""
+        while True:
+            if self._ready:
+                ready_at, _, chat_id = self._ready[0]
+                delay = ready_at - time.monotonic()
+                if delay <= 0:
+                    heapq.heappop(self._ready)
+                    return chat_id
+            else:
+                delay = None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self) -> None:
+        from aiogram.exceptions import TelegramRetryAfter
+
+        while True:
+            chat_id = await self._next_chat()
+            # Пока сообщение чата отправляется, чата нет в _ready: порядок сохраняется
+            delay = self._global.delay()
+            while delay > 0:
+                await asyncio.sleep(delay)
+                delay = self._global.delay()
+            self._global.take()
+            bucket = self._chat_bucket(chat_id)
+            bucket.take()
+
+            chat_queue = self._chat_queues[chat_id]
+            message = chat_queue[0]
+            message.attempts += 1
+            try:
+                result = await self._bot.send_message(message.chat_id, message.text, **message.kwargs)
+            except TelegramRetryAfter as e:
+                # Лимит превышен: пауза для чата и для всего бота, сообщение остаётся первым
+                logger.warning(f"Telegram просит подождать {e.retry_after} с (чат {chat_id})")
+                self._global.pause(e.retry_after)
+                bucket.pause(e.retry_after)
+                if message.attempts <= self.max_retries:
+                    self.retried += 1
+                    self._schedule(chat_id, e.retry_after)
+                    continue
+                self._finish(chat_id, message, error=e)
+                continue
+            except Exception as e:
+                logger.error(f"Не удалось отправить сообщение в чат {chat_id}: {e}")
+                self._finish(chat_id, message, error=e)
+                continue
+            self._finish(chat_id, message, result=result)
+
+    def _finish(self, chat_id: int, message: OutgoingMessage, result: Any = None,
+                error: Optional[BaseException] = None) -> None:
+        chat_queue = self._chat_queues[chat_id]
+        chat_queue.popleft()
+        if error is None:
+            self.sent += 1
+            if message.future is not None and not message.future.done():
+                message.future.set_result(result)
+        else:
+            self.failed += 1
+            if message.future is not None and not message.future.done():
+                message.future.set_exception(error)
+
+        bucket = self._chat_buckets[chat_id]
+        if chat_queue:
+            self._schedule(chat_id, bucket.delay())
+        else:
+            del self._chat_queues[chat_id]
+            if bucket.is_full():
+                del self._chat_buckets[chat_id]
+
+
+# Глобальная очередь исходящих сообщений (запускается вместе с ботом)
+outbox = Outbox()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Готовность инстанса к приёму трафика.
+
+В режиме BOT_INIT_MODE=eager при старте сервера параллельно выполняются
+импорт бота, подключение к Google Sheets, загрузка пользователей и (по желанию)
+прогрев модели топлива. Состояние и время каждого шага отдаёт /ready, чтобы
+шлюз направлял трафик только на прогретые инстансы.
+"""
+
+import asyncio
+import inspect
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+STATE_PENDING = "pending"
+STATE_RUNNING = "running"
+STATE_READY = "ready"
+STATE_FAILED = "failed"
+
+InitStep = Callable[[], Union[Any, Awaitable[Any]]]
+
+
+class ComponentStatus:
+    """Состояние одного компонента инициализации"""
+
+    def __init__(self, name: str, required: bool = True):
+        self.name = name
+        self.required = required
+        self.state = STATE_PENDING
+        self.seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "required": self.required,
+            "seconds": self.seconds,
+            "error": self.error,
+        }
+
+
+class Readiness:
+    """Параллельная инициализация компонентов и отчёт об их состоянии"""
+
+    def __init__(self):
+        self.components: Dict[str, ComponentStatus] = {}
+        self._steps: Dict[str, InitStep] = {}
+        self.started_at: Optional[float] = None
+        self.total_seconds: Optional[float] = None
+
+    def add(self, name: str, step: InitStep, required: bool = True) -> None:
+        """Регистрирует шаг. Синхронные шаги выполняются в отдельном потоке."""
+        self.components[name] = ComponentStatus(name, required)
+        self._steps[name] = step
+
+    async def _run_step(self, name: str) -> None:
+        status = self.components[name]
+        step = self._steps[name]
+        status.state = STATE_RUNNING
+        started = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(step):
+                result = await step()
+            else:
+                result = await asyncio.to_thread(step)
+            # Шаг может вернуть False, если компонент недоступен (например, нет модели)
+            if result is False:
+                status.state = STATE_FAILED
+                status.error = "компонент недоступен"
+            else:
+                status.state = STATE_READY
+        except Exception as e:
+            status.state = STATE_FAILED
+            status.error = str(e)
+            logger.error(f"Ошибка инициализации {name}: {e}")
+        status.seconds = round(time.perf_counter() - started, 3)
+        logger.info(f"Инициализация {name}: {status.state} за {status.seconds} с")
+
+    async def run(self) -> bool:
+        """Выполняет все шаги параллельно. Возвращает итоговую готовность."""
+        self.started_at = time.time()
+        started = time.perf_counter()
+        await asyncio.gather(*(self._run_step(name) for name in self.components))
+        self.total_seconds = round(time.perf_counter() - started, 3)
+        return self.is_ready()
+
+    def is_ready(self) -> bool:
+        """Готов, если все обязательные компоненты инициализированы."""
+        return all(
+            status.state == STATE_READY
+            for status in self.components.values()
+            if status.required
+        )
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.is_ready(),
+            "total_seconds": self.total_seconds,
+            "components": {name: status.to_dict() for name, status in self.components.items()},
+        }
@@ -5,17 +5,31 @@ HTTP-сервер для Telegram webhook
 """
 
 import asyncio
+import hmac
+import importlib
 import logging
 import os
 import json
-from typing import Dict, Any, Optional
+from typing import TYPE_CHECKING, Dict, Any, Optional, Union
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from pydantic import ValidationError
 import uvicorn
 from dotenv import load_dotenv
+
+from fast_json import FastJSONResponse, extract_update_id
+from admission import AdmissionController, AdmissionRejected, update_priority
+from digest import DigestScheduler, send_daily_digest
+from outbox import outbox
+from readiness import Readiness
+from tracing import span, tracer
+from update_dedup import RecentUpdateIds
+from update_queue import UpdateQueue, update_shard_key
 import urllib.parse
 import urllib.request
 
+if TYPE_CHECKING:
+    from aiogram.types import Update
+
 # Загружаем переменные окружения
 load_dotenv()
 
@@ -27,13 +41,35 @@ logging.basicConfig(
 app_logger = logging.getLogger(__name__)
 
 # Создаем FastAPI приложение
-app = FastAPI(title="Telegram Bot Webhook", version="1.0.0")
+app = FastAPI(title="Telegram Bot Webhook", version="1.0.0", default_response_class=FastJSONResponse)
 
 # Ленивая инициализация бота/диспетчера
 bot_initialized: bool = False
 bot = None  # type: ignore
 dp = None   # type: ignore
 
+# Режим webhook: sync - ответ после обработки (по умолчанию, для serverless),
+# queue - мгновенный ответ и обработка в фоне (для постоянно работающих инстансов)
+WEBHOOK_MODE = os.getenv("WEBHOOK_MODE", "sync").strip().lower()
+update_queue: Optional[UpdateQueue] = None
+
+# Режим инициализации: lazy - при первом обновлении (по умолчанию, для serverless),
+# eager - сразу при старте сервера, готовность отдаёт /ready
+BOT_INIT_MODE = os.getenv("BOT_INIT_MODE", "lazy").strip().lower()
+readiness = Readiness()
+_init_task: Optional[asyncio.Task] = None
+
+# Ограничение параллельной обработки в синхронном режиме (в режиме queue её ограничивает пул воркеров)
+admission = AdmissionController()
+ADMISSION_RETRY_AFTER = os.getenv("ADMISSION_RETRY_AFTER", "5")
+
+# Недавние update_id: повторную доставку от Telegram подтверждаем без обработки
+recent_updates = RecentUpdateIds()
+
+# Дайджест администраторам: по расписанию (DIGEST_TIME) и по POST /digest с DIGEST_TOKEN
+digest_scheduler = DigestScheduler(outbox)
+DIGEST_TOKEN = os.getenv("DIGEST_TOKEN", "").strip()
+
 
 async def initialize_bot_if_needed() -> None:
     global bot_initialized, bot, dp
@@ -52,7 +88,13 @@ async def initialize_bot_if_needed() -> None:
         raise
 
 
-async def handle_telegram_update(update_dict: Dict[str, Any]) -> None:
+def parse_update(body: bytes) -> "Update":
+    """Разбирает сырое тело webhook сразу в модель Update (без промежуточного dict)"""
+    from aiogram.types import Update
+    return Update.model_validate_json(body)
+
+
+async def handle_telegram_update(update: Union["Update", Dict[str, Any]]) -> None:
     """Обрабатывает обновление от Telegram"""
     await initialize_bot_if_needed()
 
@@ -60,37 +102,276 @@ async def handle_telegram_update(update_dict: Dict[str, Any]) -> None:
         app_logger.error("Бот не инициализирован")
         return
 
-    from aiogram.types import Update
-    update = Update.model_validate(update_dict)
+    if isinstance(update, dict):
+        from aiogram.types import Update
+        update = Update.model_validate(update)
 
-    await dp.feed_update(bot, update)
+    # В синхронном режиме спан вложен в webhook, в режиме очереди продолжает его трассу
+    with span("dispatch", update_id=update.update_id):
+        await dp.feed_update(bot, update)
+
+
+def _default_tenant() -> Optional[Any]:
+    from deps import get_tenant_registry
+    registry = get_tenant_registry()
+    if registry.config.default_tenant is None:
+        # Без компании по умолчанию таблицы подключаются по первому водителю
+        return None
+    return registry.get(registry.config.default_tenant)
+
+
+async def _get_bot() -> Any:
+    await initialize_bot_if_needed()
+    return bot
+
+
+def _init_users() -> bool:
+    tenant = _default_tenant()
+    # Репозиторий не падает без доступа к таблице, а работает без сервиса
+    return tenant is None or getattr(tenant.users_repo, "service", None) is not None
+
+
+def _init_sheets() -> None:
+    _default_tenant()
+
+
+async def _init_bot() -> None:
+    # Импорт aiogram и роутеров тяжёлый, выполняем его вне event loop
+    await asyncio.to_thread(importlib.import_module, "bot")
+    await initialize_bot_if_needed()
+
+
+def _load_tenant_caches() -> bool:
+    tenant = _default_tenant()
+    return tenant is None or tenant.load_caches()
+
+
+async def _warm_fuel_model() -> bool:
+    from deps import get_fuel_service
+    return await get_fuel_service().warm_up()
+
+
+def setup_readiness() -> None:
+    readiness.add("bot", _init_bot)
+    readiness.add("sheets", _init_sheets)
+    readiness.add("users", _init_users)
+    # Без кэшей (последние поездки, подсказки, индекс /stats) бот работает: они догрузятся при первом /new
+    readiness.add("tenant_caches", _load_tenant_caches, required=False)
+    if os.getenv("INIT_WARM_FUEL_MODEL", "0") == "1":
+        # Модель нужна только для фото, её отсутствие не мешает принимать трафик
+        readiness.add("fuel_model", _warm_fuel_model, required=False)
 
 
 @app.on_event("startup")
 async def startup_event():
-    # Ничего не делаем: инициализация ленивая
-    return
+    global update_queue, _init_task
+    if WEBHOOK_MODE == "queue":
+        update_queue = UpdateQueue(handle_telegram_update)
+        update_queue.start()
+    if BOT_INIT_MODE == "eager":
+        # Инициализация идёт в фоне, чтобы /ready мог отвечать во время прогрева
+        setup_readiness()
+        _init_task = asyncio.get_running_loop().create_task(readiness.run())
+    if digest_scheduler.enabled:
+        digest_scheduler.start(_get_bot, lambda: dp.storage)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if update_queue is not None:
+        await update_queue.stop()
+    digest_scheduler.stop()
+    await outbox.stop()
+    from deps import close_fuel_service
+    await close_fuel_service()
+    tracer.shutdown()
 
 
 @app.post("/")
 async def webhook_handler(request: Request):
     """Обработчик webhook от Telegram"""
     try:
-        update_data = await request.json()
-        # Синхронная обработка вместо фоновой задачи — важна для serverless окружения
-        await handle_telegram_update(update_data)
-        return JSONResponse(content={"ok": True})
-    except json.JSONDecodeError:
-        app_logger.error("Ошибка парсинга JSON")
-        raise HTTPException(status_code=400, detail="Invalid JSON")
+        body = await request.body()
+        update_id = extract_update_id(body)
+        with span("webhook", update_id=update_id) as root:
+            return await _process_webhook(body, update_id, root)
+    except HTTPException:
+        raise
     except Exception as e:
         app_logger.error(f"Ошибка обработки webhook: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+async def _process_webhook(body: bytes, update_id: Optional[int], root: Any) -> FastJSONResponse:
+    if update_id is not None and await recent_updates.check_and_remember(update_id):
+        app_logger.info(f"Повторная доставка обновления {update_id}, пропускаем")
+        if root is not None:
+            root.set_tag("duplicate", True)
+        return FastJSONResponse(content={"ok": True})
+    try:
+        with span("parse"):
+            update = parse_update(body)
+    except ValidationError:
+        if update_id is not None:
+            await recent_updates.forget(update_id)
+        app_logger.error("Некорректное тело обновления")
+        raise HTTPException(status_code=400, detail="Invalid update")
+    try:
+        if root is not None:
+            root.set_tag("user_id", update_shard_key(update))
+        if update_queue is not None:
+            # Быстрый ответ: обработка в фоне, при переполнении Telegram повторит позже
+            if not update_queue.put_nowait(update):
+                app_logger.warning("Очередь обновлений переполнена")
+                if update_id is not None:
+                    await recent_updates.forget(update_id)
+                return FastJSONResponse(status_code=503, content={"ok": False, "error": "queue is full"})
+            return FastJSONResponse(content={"ok": True})
+        # Синхронная обработка вместо фоновой задачи — важна для serverless окружения
+        async with admission.slot(update_priority(update)):
+            await handle_telegram_update(update)
+    except AdmissionRejected as e:
+        # Перегрузка: Telegram повторит доставку позже, не увеличивая нагрузку сейчас
+        app_logger.warning(f"Обновление {update_id} отклонено: {e}")
+        if update_id is not None:
+            await recent_updates.forget(update_id)
+        return FastJSONResponse(
+            status_code=503,
+            content={"ok": False, "error": "overloaded"},
+            headers={"Retry-After": ADMISSION_RETRY_AFTER},
+        )
+    except Exception:
+        # Telegram повторит доставку после ошибки - её нужно обработать заново
+        if update_id is not None:
+            await recent_updates.forget(update_id)
+        raise
+    return FastJSONResponse(content={"ok": True})
+
+
+def _token_matches(value: Optional[str], token: str) -> bool:
+    """Сравнение токена за постоянное время: по времени ответа его не подобрать."""
+    return bool(token) and value is not None and hmac.compare_digest(value.encode(), token.encode())
+
+
+@app.post("/digest")
+async def digest_trigger(request: Request):
+    """Дайджест администраторам по внешнему расписанию (serverless-триггер)"""
+    if not _token_matches(request.headers.get("X-Digest-Token"), DIGEST_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    outbox.start(await _get_bot())
+    # Ждём фактической отправки: после ответа serverless-функция может быть заморожена
+    sent = await send_daily_digest(outbox, request.query_params.get("date"), wait=True)
+    return FastJSONResponse(content={"ok": True, "messages": sent})
+
+
+def _memory_diag(request: Request) -> Any:
+    """
+    Диагностика только для администратора с MEMORY_DIAG_TOKEN. Модуль (и tracemalloc)
+    импортируется при первом обращении, а не при холодном старте.
+    """
+    import memory_diag
+    if not _token_matches(request.headers.get("X-Diag-Token"), memory_diag.MEMORY_DIAG_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return memory_diag
+
+
+def _top_param(request: Request) -> int:
+    try:
+        return max(int(request.query_params.get("top", "20")), 1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="top must be an integer")
+
+
+@app.get("/debug/memory")
+async def memory_report(request: Request):
+    """RSS, крупнейшие места выделения (если включён tracemalloc) и размеры структур"""
+    diag = _memory_diag(request)
+    content: Dict[str, Any] = {"process": diag.process_memory(), "tracemalloc": diag.memory_profiler.status()}
+    if content["tracemalloc"]["tracing"]:
+        try:
+            content["top"] = await asyncio.to_thread(
+                diag.memory_profiler.top, _top_param(request), request.query_params.get("group", "lineno")
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if request.query_params.get("structures", "1") != "0":
+        # Обход объектов занимает до секунды на больших кэшах - не в цикле событий
+        storage = dp.storage if dp is not None else None
+        content["structures"] = await asyncio.to_thread(diag.structures_report, storage)
+    return FastJSONResponse(content=content)
+
+
+@app.post("/debug/memory/tracemalloc")
+async def memory_tracing(request: Request):
+    """Включает tracemalloc (frames - глубина стека) или выключает его (frames=0)"""
+    diag = _memory_diag(request)
+    try:
+        frames = int(request.query_params.get("frames", "1"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="frames must be an integer")
+    if frames > 0:
+        diag.memory_profiler.start(frames)
+    else:
+        diag.memory_profiler.stop()
+    return FastJSONResponse(content=diag.memory_profiler.status())
+
+
+@app.post("/debug/memory/snapshot")
+async def memory_snapshot(request: Request):
+    """Снимок tracemalloc для последующего сравнения"""
+    diag = _memory_diag(request)
+    try:
+        name = await asyncio.to_thread(diag.memory_profiler.take_snapshot, request.query_params.get("name"))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return FastJSONResponse(content={"ok": True, "name": name, "process": diag.process_memory()})
+
+
+@app.get("/debug/memory/diff")
+async def memory_diff(request: Request):
+    """Рост памяти со снимка base: до снимка against или до текущего момента"""
+    diag = _memory_diag(request)
+    base = request.query_params.get("base")
+    if not base:
+        raise HTTPException(status_code=400, detail="base is required")
+    try:
+        diff = await asyncio.to_thread(
+            diag.memory_profiler.diff, base, request.query_params.get("against"),
+            _top_param(request), request.query_params.get("group", "lineno"),
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Unknown snapshot: {e.args[0]}")
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(content={"base": base, "against": request.query_params.get("against"), "diff": diff})
+
+
 @app.get("/health")
 async def health_check():
-    return JSONResponse(content={"status": "healthy", "bot_initialized": bot_initialized})
+    content = {"status": "healthy", "bot_initialized": bot_initialized, "webhook_mode": WEBHOOK_MODE}
+    if update_queue is not None:
+        content["update_queue"] = update_queue.stats()
+    else:
+        content["admission"] = admission.stats()
+    content["duplicate_updates"] = recent_updates.duplicates
+    content["outbox"] = outbox.stats()
+    from deps import get_tenant_registry, is_initialized
+    if is_initialized("tenant_registry"):
+        content["tenants"] = get_tenant_registry().stats()
+    return FastJSONResponse(content=content)
+
+
+@app.get("/ready")
+async def ready_check():
+    """Готовность инстанса: 200 после прогрева всех обязательных компонентов, иначе 503"""
+    if BOT_INIT_MODE != "eager":
+        # В ленивом режиме инициализация выполняется по первому обновлению
+        return FastJSONResponse(content={"ready": True, "init_mode": BOT_INIT_MODE, "bot_initialized": bot_initialized})
+    content = readiness.report()
+    content["init_mode"] = BOT_INIT_MODE
+    return FastJSONResponse(status_code=200 if content["ready"] else 503, content=content)
 
 
 @app.get("/test_send")
@@ -100,7 +381,7 @@ async def test_send():
     admin_ids = os.getenv("ADMIN_IDS", "").split(",")
     chat_id = admin_ids[0].strip() if admin_ids and admin_ids[0].strip() else None
     if not token or not chat_id:
-        return JSONResponse(status_code=500, content={"ok": False, "error": "Missing TELEGRAM_BOT_TOKEN or ADMIN_IDS"})
+        return FastJSONResponse(status_code=500, content={"ok": False, "error": "Missing TELEGRAM_BOT_TOKEN or ADMIN_IDS"})
     try:
         params = urllib.parse.urlencode({
             "chat_id": chat_id,
@@ -109,14 +390,14 @@ async def test_send():
         url = f"https://api.telegram.org/bot{token}/sendMessage?{params}"
         with urllib.request.urlopen(url, timeout=10) as resp:
             body = resp.read().decode("utf-8")
-        return JSONResponse(content={"ok": True, "response": json.loads(body)})
+        return FastJSONResponse(content={"ok": True, "response": json.loads(body)})
     except Exception as e:
-        return JSONResponse(status_code=500, content={"ok": False, "error": str(e)})
+        return FastJSONResponse(status_code=500, content={"ok": False, "error": str(e)})
 
 
 @app.get("/")
 async def root():
-    return JSONResponse(content={
+    return FastJSONResponse(content={
         "message": "Telegram Bot Webhook Server",
         "status": "running",
         "bot_initialized": bot_initialized
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Отслеживание ручных правок в таблице.
+
+Офис правит и удаляет строки прямо в Google Sheets, поэтому кэши бота
+(последние поездки, подсказки, индекс /stats, пользователи) могут устареть.
+Наблюдатель держит снимок листа поездок и сверяет его с таблицей:
+
+1. Раз в SHEET_WATCH_INTERVAL секунд (лениво, при обращении к данным)
+   запрашивается версия файла в Drive (files.get fields=version) - один
+   маленький запрос без чтения листа. Версия растёт при любой правке.
+2. Если версия изменилась, лист читается один раз и сравнивается с снимком
+   по контрольным суммам блоков (SHEET_WATCH_BLOCK_ROWS строк). Разбираются
+   только строки изменившихся блоков.
+3. Подписчики получают только новые, изменённые и удалённые строки
+   (SheetChange) и обновляют себя точечно, без полной перезагрузки.
+
+Пока наблюдатель включён, GoogleSheetsClient.read_records отдаёт снимок, а не
+читает лист на каждый вызов. Свои записи бот сразу вносит в снимок.
+Перед редактированием (поиск строки по row_uid) версия сверяется сразу,
+чтобы номер строки не оказался сдвинут ручным удалением.
+
+Фейковый Sheets API (fake_sheets.py) ведёт счётчик ревизий каждой таблицы и
+отвечает на files().get так же, как Drive.
+"""
+
+import bisect
+import logging
+import os
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from tracing import span
+from trip_codec import TripRecord, record_key, trip_codec
+
+logger = logging.getLogger(__name__)
+
+SHEET_WATCH_INTERVAL = float(os.getenv("SHEET_WATCH_INTERVAL", "0"))
+SHEET_WATCH_BLOCK_ROWS = int(os.getenv("SHEET_WATCH_BLOCK_ROWS", "500"))
+
+
+class SheetChange(NamedTuple):
+    """Что изменилось в листе с прошлой сверки"""
+    records: List[TripRecord]  # весь лист после изменения
+    added: List[TripRecord]  # новые строки и новые версии изменённых
+    removed: List[TripRecord]  # удалённые строки и старые версии изменённых
+
+
+def block_checksums(rows: Sequence[Sequence[str]], block_rows: int) -> List[Optional[int]]:
+    """CRC32 каждого блока из block_rows строк (строки без заголовка)."""
+    checksums: List[Optional[int]] = []
+    for start in range(0, len(rows), block_rows):
+        crc = 0
+        for row in rows[start:start + block_rows]:
+            crc = zlib.crc32("\x1f".join(row).encode("utf-8") + b"\x1e", crc)
+        checksums.append(crc)
+    return checksums
+
+
+def drive_version_loader(drive_service: Any, file_id: str) -> Callable[[], str]:
+    """Версия файла таблицы в Drive (или в фейковом сервисе)."""
+    def load_version() -> str:
+        with span("sheets.version"):
+            return drive_service.files().get(fileId=file_id, fields="version").execute()["version"]
+    return load_version
+
+
+def _same_content(a: TripRecord, b: TripRecord) -> bool:
+    return a._replace(row_number=0) == b._replace(row_number=0)
+
+
+class SheetWatcher:
+    """Снимок листа поездок, который сверяется с таблицей по версии файла"""
+
+    def __init__(
+        self,
+        sheets_client: Any,
+        version_loader: Callable[[], str],
+        users_repo: Optional[Any] = None,
+        interval: Optional[float] = None,
+        block_rows: Optional[int] = None,
+    ):
+        self.sheets_client = sheets_client
+        self.version_loader = version_loader
+        self.users_repo = users_repo
+        self.interval = SHEET_WATCH_INTERVAL if interval is None else interval
+        self.block_rows = max(SHEET_WATCH_BLOCK_ROWS if block_rows is None else block_rows, 1)
+        # Кэши с методом apply_change(SheetChange)
+        self.listeners: List[Any] = []
+        self.loaded = False
+        self._records: List[TripRecord] = []  # по возрастанию номера строки
+        self._blocks: List[Optional[int]] = []  # None - блок менялся ботом, сверить построчно
+        self._version: Optional[str] = None
+        self._checked_at = 0.0
+        # Свои записи, сделанные во время чтения листа: применяются к новому снимку
+        self._syncing = False
+        self._noted: List[Tuple[int, Any]] = []  # (номер строки или 0 для добавления, запись)
+        self._lock = threading.Lock()  # снимок
+        self._sync_lock = threading.Lock()  # чтение листа
+        self.checks = 0
+        self.resyncs = 0
+
+    def records(self) -> List[TripRecord]:
+        """Записи листа из снимка (первый вызов читает лист)."""
+        if not self.loaded:
+            self._initial_load()
+        else:
+            self.maybe_check()
+        with self._lock:
+            return list(self._records)
+
+    def maybe_check(self) -> bool:
+        """Сверяет версию, если с прошлой сверки прошло больше interval секунд."""
+        if self.loaded and time.monotonic() - self._checked_at < self.interval:
+            return False
+        return self.check()
+
+    def check(self) -> bool:
+        """Сверяет версию таблицы; если она изменилась - обновляет снимок. True - было изменение."""
+        if not self.loaded:
+            self._initial_load()
+            return False
+        with self._sync_lock:
+            self.checks += 1
+            version = self._load_version()
+            self._checked_at = time.monotonic()
+            # Без версии (нет доступа к Drive) сверяем содержимое - не чаще раза в interval
+            if version is not None and version == self._version:
+                return False
+            return self._resync(version)
+
+    def note_append(self, entry: Any) -> None:
+        """Бот добавил строку: вносим её в снимок, не дожидаясь сверки."""
+        with self._lock:
+            if self._syncing:
+                self._noted.append((0, entry))
+            if self.loaded:
+                self._append(entry)
+
+    def note_update(self, row_number: int, entry: Any) -> None:
+        """Бот перезаписал строку row_number."""
+        with self._lock:
+            if self._syncing:
+                self._noted.append((row_number, entry))
+            if self.loaded:
+                self._update(row_number, entry)
+
+    def _append(self, entry: Any) -> None:
+        row_number = (self._records[-1].row_number if self._records else 1) + 1
+        self._records.append(TripRecord.from_entry(entry, row_number))
+        self._mark_dirty(row_number)
+
+    def _update(self, row_number: int, entry: Any) -> None:
+        index = bisect.bisect_left(self._records, row_number, key=lambda record: record.row_number)
+        if index < len(self._records) and self._records[index].row_number == row_number:
+            self._records[index] = TripRecord.from_entry(entry, row_number)
+        self._mark_dirty(row_number)
+
+    def _start_sync(self) -> Tuple[List[TripRecord], List[Optional[int]]]:
+        """Начало чтения листа: копия снимка, с которой будем сравнивать."""
+        with self._lock:
+            self._syncing = True
+            self._noted = []
+            return list(self._records), list(self._blocks)
+
+    def _swap(self, records: List[TripRecord], blocks: List[Optional[int]], version: Optional[str]) -> Set[str]:
+        """
+        Подменяет снимок и применяет свои записи, сделанные во время чтения (вызывать под _lock).
+        Возвращает их row_uid: кэши о них уже знают от обработчиков.
+        """
+        self._records = records
+        self._blocks = blocks
+        self._version = version
+        self._checked_at = time.monotonic()
+        self.loaded = True
+        noted_uids = {entry.row_uid for _, entry in self._noted}
+        if noted_uids:
+            known = {record.row_uid for record in records}
+            for row_number, entry in self._noted:
+                if row_number:
+                    self._update(row_number, entry)
+                elif entry.row_uid not in known:
+                    self._append(entry)
+        self._noted = []
+        self._syncing = False
+        return noted_uids
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "records": len(self._records),
+            "version": self._version,
+            "checks": self.checks,
+            "resyncs": self.resyncs,
+        }
+
+    def _mark_dirty(self, row_number: int) -> None:
+        block = (row_number - 2) // self.block_rows
+        if block >= len(self._blocks):
+            self._blocks.extend([None] * (block + 1 - len(self._blocks)))
+        self._blocks[block] = None
+
+    def _load_version(self) -> Optional[str]:
+        try:
+            return str(self.version_loader())
+        except Exception as e:
+            logger.warning(f"Не удалось получить версию таблицы: {e}")
+            return None
+
+    def _initial_load(self) -> None:
+        with self._sync_lock:
+            if self.loaded:
+                return
+            version = self._load_version()
+            self._start_sync()
+            try:
+                values = self.sheets_client.read_sheet_values()
+            except Exception:
+                with self._lock:
+                    self._syncing = False
+                raise
+            records = trip_codec.decode_sheet(values)
+            with self._lock:
+                self._swap(records, block_checksums(values[1:], self.block_rows), version)
+            logger.info(f"Снимок листа {self.sheets_client.sheet_name}: {len(records)} записей, версия {version}")
+
+    def _resync(self, version: Optional[str]) -> bool:
+        # Версия запрошена до чтения: правка между ними вызовет ещё одну сверку, а не потеряется
+        old_records, old_blocks = self._start_sync()
+        try:
+            values = self.sheets_client.read_sheet_values()
+        except Exception as e:
+            logger.error(f"Не удалось перечитать лист {self.sheets_client.sheet_name}: {e}")
+            with self._lock:
+                self._syncing = False
+            return False
+        rows = values[1:]
+        new_blocks = block_checksums(rows, self.block_rows)
+        self.resyncs += 1
+        # Версия общая для всей таблицы: правка могла быть и в листе пользователей
+        if self.users_repo is not None:
+            self.users_repo.reload_if_changed()
+
+        changed_blocks = {
+            block for block in range(max(len(old_blocks), len(new_blocks)))
+            if block >= len(old_blocks) or block >= len(new_blocks)
+            or old_blocks[block] is None or old_blocks[block] != new_blocks[block]
+        }
+        if not changed_blocks:
+            with self._lock:
+                self._swap(old_records, new_blocks, version)
+            return False
+
+        # Разбираем только строки изменившихся блоков
+        block_of = self._block_of
+        new_region: List[TripRecord] = []
+        for block in sorted(changed_blocks):
+            if block < len(new_blocks):
+                start = block * self.block_rows
+                new_region += trip_codec.decode_rows(rows[start:start + self.block_rows], first_row_number=start + 2)
+        kept = [record for record in old_records if block_of(record.row_number) not in changed_blocks]
+        old_region: Dict[Hashable, TripRecord] = {
+            record_key(record): record for record in old_records if block_of(record.row_number) in changed_blocks
+        }
+        new_by_key: Dict[Hashable, TripRecord] = {record_key(record): record for record in new_region}
+
+        records = sorted(kept + new_region, key=lambda record: record.row_number)
+        with self._lock:
+            noted_uids = self._swap(records, new_blocks, version)
+
+        added = [record for key, record in new_by_key.items()
+                 if (key not in old_region or not _same_content(old_region[key], record))
+                 and record.row_uid not in noted_uids]
+        removed = [record for key, record in old_region.items()
+                   if (key not in new_by_key or not _same_content(new_by_key[key], record))
+                   and record.row_uid not in noted_uids]
+
+        if not added and not removed:
+            return False
+
+        logger.info(
+            f"Лист {self.sheets_client.sheet_name} изменён: блоков {len(changed_blocks)}, "
+            f"новых/изменённых строк {len(added)}, удалённых/старых версий {len(removed)}"
+        )
+        change = SheetChange(records, added, removed)
+        for listener in self.listeners:
+            try:
+                listener.apply_change(change)
+            except Exception as e:
+                logger.error(f"Ошибка обновления кэша {type(listener).__name__}: {e}")
+        return True
+
+    def _block_of(self, row_number: int) -> int:
+        return (row_number - 2) // self.block_rows
@@ -1,10 +1,13 @@
 import os
 import logging
-from typing import List, Dict, Optional, Any
+from typing import Any, List, Optional, Tuple
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from models import TripEntry
+from trip_codec import LAST_COLUMN, TripRecord, trip_codec
+from fast_json import make_sheets_json_model
+from tracing import traced
 
 
 logger = logging.getLogger(__name__)
@@ -13,27 +16,34 @@ logger = logging.getLogger(__name__)
 class GoogleSheetsClient:
     """Клиент для работы с Google Sheets"""
     
-    def __init__(self, service_account_path: str, sheet_id: str, sheet_name: str = "Лист1"):
+    def __init__(self, service_account_path: str, sheet_id: str, sheet_name: str = "Лист1", service: Optional[Any] = None):
         self.sheet_id = sheet_id
         self.sheet_name = sheet_name
+        # Снимок листа с отслеживанием ручных правок (sheet_watch.py), задаётся в tenants.py
+        self.watcher: Optional[Any] = None
         
-        # Инициализация клиента Google Sheets
-        credentials = service_account.Credentials.from_service_account_file(
-            service_account_path,
-            scopes=["https://www.googleapis.com/auth/spreadsheets"]
-        )
-        self.service = build("sheets", "v4", credentials=credentials)
+        if service is not None:
+            # Готовый сервис (например, фейковый для нагрузочного теста)
+            self.service = service
+        else:
+            # Инициализация клиента Google Sheets
+            credentials = service_account.Credentials.from_service_account_file(
+                service_account_path,
+                scopes=["https://www.googleapis.com/auth/spreadsheets"]
+            )
+            self.service = build("sheets", "v4", credentials=credentials, model=make_sheets_json_model())
         
         # Убеждаемся, что заголовки существуют
         self.ensure_header()
 
+    @traced("sheets.ensure_header")
     def ensure_header(self) -> None:
         """Проверяет и создает заголовки, если лист пуст"""
         try:
             # Читаем первую строку
             result = self.service.spreadsheets().values().get(
                 spreadsheetId=self.sheet_id,
-                range=f"{self.sheet_name}!A1:M1"
+                range=f"{self.sheet_name}!A1:{LAST_COLUMN}1"
             ).execute()
             
             values = result.get('values', [])
@@ -43,7 +53,7 @@ class GoogleSheetsClient:
                 logger.info("Создаем заголовки в Google Sheets")
                 self.service.spreadsheets().values().update(
                     spreadsheetId=self.sheet_id,
-                    range=f"{self.sheet_name}!A1:M1",
+                    range=f"{self.sheet_name}!A1:{LAST_COLUMN}1",
                     valueInputOption="RAW",
                     body={"values": [TripEntry.get_headers()]}
                 ).execute()
@@ -52,6 +62,7 @@ class GoogleSheetsClient:
             logger.error(f"Ошибка при работе с заголовками: {e}")
             raise
 
+    @traced("sheets.append_row")
     def append_row(self, trip_entry: TripEntry) -> bool:
         """Добавляет новую строку в таблицу"""
         try:
@@ -69,59 +80,51 @@ class GoogleSheetsClient:
             ).execute()
             
             logger.info(f"Добавлена новая строка: {result.get('updates', {}).get('updatedRows', 0)}")
+            if self.watcher is not None:
+                self.watcher.note_append(trip_entry)
             return True
             
         except HttpError as e:
             logger.error(f"Ошибка при добавлении строки: {e}")
             return False
 
-    def get_last_rows(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """Получает последние N строк из таблицы"""
+    @traced("sheets.read_records")
+    def read_records(self) -> List[TripRecord]:
+        """Все записи листа (без заголовков): из снимка наблюдателя или чтением листа"""
+        if self.watcher is not None:
+            return self.watcher.records()
+        return trip_codec.decode_sheet(self.read_sheet_values())
+
+    @traced("sheets.read_values")
+    def read_sheet_values(self) -> List[List[str]]:
+        """Читает лист целиком как есть (первая строка - заголовки)"""
+        result = self.service.spreadsheets().values().get(
+            spreadsheetId=self.sheet_id,
+            range=f"{self.sheet_name}!A:{LAST_COLUMN}"
+        ).execute()
+        return result.get('values', [])
+
+    @traced("sheets.get_last_rows")
+    def get_last_rows(self, limit: int = 10) -> List[TripRecord]:
+        """Получает последние N записей из таблицы (последние сначала)"""
         try:
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=self.sheet_id,
-                range=f"{self.sheet_name}!A:M"
-            ).execute()
-            
-            values = result.get('values', [])
-            if len(values) <= 1:  # Только заголовки или пусто
-                return []
-            
-            headers = TripEntry.get_headers()
-            rows = values[1:]  # Пропускаем заголовки
-            
-            # Берем последние N строк
-            last_rows = rows[-limit:] if len(rows) > limit else rows
-            
-            # Преобразуем в словари
-            result_rows = []
-            for row in reversed(last_rows):  # Последние записи сначала
-                if len(row) >= len(headers):
-                    row_dict = dict(zip(headers, row))
-                    result_rows.append(row_dict)
-            
-            return result_rows
+            records = self.read_records()
+            return records[:-limit - 1:-1] if limit > 0 else []
             
         except HttpError as e:
             logger.error(f"Ошибка при чтении строк: {e}")
             return []
 
-    def find_row_by_uid(self, row_uid: str, author_tg_id: int) -> Optional[tuple]:
+    @traced("sheets.find_row_by_uid")
+    def find_row_by_uid(self, row_uid: str, author_tg_id: int) -> Optional[Tuple[int, TripRecord]]:
         """Находит строку по row_uid и проверяет автора"""
         try:
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=self.sheet_id,
-                range=f"{self.sheet_name}!A:M"
-            ).execute()
-            
-            values = result.get('values', [])
-            if len(values) <= 1:
-                return None
-            
-            # Ищем строку с нужным row_uid
-            for i, row in enumerate(values[1:], start=2):  # Начинаем с строки 2 (после заголовков)
-                if len(row) >= 13 and row[12] == row_uid and row[11] == str(author_tg_id):
-                    return (i, row)  # Возвращаем номер строки и данные
+            if self.watcher is not None:
+                # Номер строки пойдёт в update_row: сверяем версию сразу, а не раз в интервал
+                self.watcher.check()
+            for record in reversed(self.read_records()):
+                if record.row_uid == row_uid and record.author_tg_id == author_tg_id:
+                    return (record.row_number, record)  # Возвращаем номер строки и данные
             
             return None
             
@@ -129,42 +132,34 @@ class GoogleSheetsClient:
             logger.error(f"Ошибка при поиске строки: {e}")
             return None
 
+    @traced("sheets.update_row")
     def update_row(self, row_number: int, trip_entry: TripEntry) -> bool:
         """Обновляет существующую строку"""
         try:
             result = self.service.spreadsheets().values().update(
                 spreadsheetId=self.sheet_id,
-                range=f"{self.sheet_name}!A{row_number}:M{row_number}",
+                range=f"{self.sheet_name}!A{row_number}:{LAST_COLUMN}{row_number}",
                 valueInputOption="RAW",
                 body={"values": [trip_entry.to_sheets_row()]}
             ).execute()
             
             logger.info(f"Обновлена строка {row_number}")
+            if self.watcher is not None:
+                self.watcher.note_update(row_number, trip_entry)
             return True
             
         except HttpError as e:
             logger.error(f"Ошибка при обновлении строки: {e}")
             return False
 
-    def get_last_user_entry(self, author_tg_id: int) -> Optional[Dict[str, Any]]:
+    @traced("sheets.get_last_user_entry")
+    def get_last_user_entry(self, author_tg_id: int) -> Optional[TripRecord]:
         """Получает последнюю запись пользователя"""
         try:
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=self.sheet_id,
-                range=f"{self.sheet_name}!A:M"
-            ).execute()
-            
-            values = result.get('values', [])
-            if len(values) <= 1:
-                return None
-            
-            headers = TripEntry.get_headers()
-            
             # Ищем последнюю запись пользователя
-            for row in reversed(values[1:]):
-                if len(row) >= 12 and row[11] == str(author_tg_id):
-                    row_dict = dict(zip(headers, row))
-                    return row_dict
+            for record in reversed(self.read_records()):
+                if record.author_tg_id == author_tg_id:
+                    return record
             
             return None
             
@@ -185,10 +180,10 @@ class GoogleSheetsClient:
             
             for row in last_rows:
                 # Проверяем того же пользователя
-                if int(row.get('author_tg_id', 0)) == trip_entry.author_tg_id:
+                if row.author_tg_id == trip_entry.author_tg_id:
                     # Проверяем время (в пределах 30 секунд)
                     try:
-                        row_created_at = datetime.fromisoformat(row.get('created_at', '').replace('Z', '+00:00'))
+                        row_created_at = datetime.fromisoformat(row.created_at.replace('Z', '+00:00'))
                         time_diff = abs((new_created_at - row_created_at).total_seconds())
                         
                         if time_diff < 30:  # 30 секунд
@@ -0,0 +1,25 @@
+"""
+Состояния FSM бота
+"""
+
+from aiogram.fsm.state import State, StatesGroup
+
+
+class TripStates(StatesGroup):
+    """Состояния FSM для создания новой записи"""
+    waiting_start_time = State()
+    waiting_odometer_start = State()
+    waiting_end_time = State()
+    waiting_odometer_end = State()
+    waiting_fuel_photo = State()
+    waiting_fuel_confirmation = State()
+    waiting_project = State()
+    waiting_address = State()
+    waiting_comment = State()
+    waiting_confirmation = State()
+
+
+class EditStates(StatesGroup):
+    """Состояния FSM для редактирования записи"""
+    waiting_field_choice = State()
+    waiting_new_value = State()
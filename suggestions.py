@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Подсказки проектов и адресов при вводе поездки.
+
+Значения нормализуются (регистр, ё/е, пробелы и знаки препинания), поэтому
+"ЖК Север" и "жк  север" - одно значение, а на кнопке показывается самое
+частое написание. Порядок подсказок: сначала значения водителя (и адреса
+выбранного проекта), затем самые частые в компании. Введённый текст ищется
+по началу слов: "сев" найдёт "ЖК Север".
+
+Как и кэш последних поездок, подсказки загружаются одним чтением листа в фоне
+при первом /new и дальше пополняются при каждом сохранении поездки.
+"""
+
+import heapq
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+
+from trip_index import PrefixIndex, normalize_words
+
+logger = logging.getLogger(__name__)
+
+SUGGESTIONS_LIMIT = int(os.getenv("SUGGESTIONS_LIMIT", "4"))
+
+
+def value_key(value: str) -> str:
+    """Нормализованный ключ значения: "ЖК  Север," -> "жк север"."""
+    return " ".join(normalize_words(value))
+
+
+class ValueIndex:
+    """Значения одного поля: частоты, написания и поиск по началу слов"""
+
+    def __init__(self) -> None:
+        self._ids: Dict[str, int] = {}  # ключ -> номер значения
+        self._display: List[str] = []  # самое частое написание
+        self._spellings: List[Dict[str, int]] = []
+        self._counts: List[int] = []
+        self._last_used: List[int] = []
+        self._clock = 0
+        # Контекст (водитель, проект) -> номер значения -> сколько раз использовано
+        self._by_context: Dict[Hashable, Dict[int, int]] = {}
+        self._words = PrefixIndex()
+
+    def __len__(self) -> int:
+        return len(self._display)
+
+    def add(self, value: str, contexts: Sequence[Hashable] = ()) -> None:
+        spelling = " ".join((value or "").split())
+        key = value_key(spelling)
+        if not key:
+            return
+        value_id = self._ids.get(key)
+        if value_id is None:
+            value_id = self._ids[key] = len(self._display)
+            self._display.append(spelling)
+            self._spellings.append({})
+            self._counts.append(0)
+            self._last_used.append(0)
+            self._words.add(value_id, key)
+
+        spellings = self._spellings[value_id]
+        spellings[spelling] = spellings.get(spelling, 0) + 1
+        if spellings[spelling] > spellings.get(self._display[value_id], 0):
+            self._display[value_id] = spelling
+        self._counts[value_id] += 1
+        self._clock += 1
+        self._last_used[value_id] = self._clock
+        for context in contexts:
+            counts = self._by_context.setdefault(context, {})
+            counts[value_id] = counts.get(value_id, 0) + 1
+
+    def discard(self, value: str, contexts: Sequence[Hashable] = ()) -> None:
+        """Обратное к add: строку удалили или исправили в листе."""
+        spelling = " ".join((value or "").split())
+        value_id = self._ids.get(value_key(spelling))
+        if value_id is None or not self._counts[value_id]:
+            return
+        self._counts[value_id] -= 1
+        spellings = self._spellings[value_id]
+        if spelling in spellings:
+            spellings[spelling] -= 1
+            if not spellings[spelling]:
+                del spellings[spelling]
+                if spellings and self._display[value_id] == spelling:
+                    self._display[value_id] = max(spellings, key=spellings.get)
+        for context in contexts:
+            counts = self._by_context.get(context)
+            if counts and value_id in counts:
+                counts[value_id] -= 1
+                if not counts[value_id]:
+                    del counts[value_id]
+                    if not counts:
+                        del self._by_context[context]
+
+    def canonical(self, value: str) -> Optional[str]:
+        """Принятое написание, если такое значение ещё встречается."""
+        value_id = self._ids.get(value_key(value))
+        return self._display[value_id] if value_id is not None and self._counts[value_id] else None
+
+    def suggest(self, prefix: str = "", contexts: Sequence[Hashable] = (), limit: int = SUGGESTIONS_LIMIT) -> List[str]:
+        """До limit значений: сначала из контекстов по порядку, затем самые частые."""
+        allowed: Optional[Set[int]] = None
+        for word in normalize_words(prefix):
+            matched = self._words.match(word)
+            allowed = matched if allowed is None else allowed & matched
+            if not allowed:
+                return []
+
+        chosen: List[int] = []
+        for context in contexts:
+            counts = self._by_context.get(context)
+            if not counts:
+                continue
+            candidates = counts if allowed is None else [value_id for value_id in counts if value_id in allowed]
+            for value_id in heapq.nlargest(limit, candidates, key=lambda v: (counts[v], self._last_used[v])):
+                if value_id not in chosen:
+                    chosen.append(value_id)
+            if len(chosen) >= limit:
+                return [self._display[value_id] for value_id in chosen[:limit]]
+
+        candidates = range(len(self._display)) if allowed is None else allowed
+        for value_id in heapq.nlargest(limit + len(chosen), candidates,
+                                       key=lambda v: (self._counts[v], self._last_used[v])):
+            # Значения, все строки которых удалены из листа, не предлагаем
+            if value_id not in chosen and self._counts[value_id]:
+                chosen.append(value_id)
+        return [self._display[value_id] for value_id in chosen[:limit]]
+
+
+def _entry_contexts(entry: Any) -> Tuple[Tuple[Hashable, ...], Tuple[Hashable, ...]]:
+    """Контексты проекта (водитель) и адреса (проект и водитель) поездки."""
+    author = entry.author_tg_id
+    project = value_key(entry.project or "")
+    return (author,), ((("project", project), author) if project else (author,))
+
+
+def _add_entry(projects: ValueIndex, addresses: ValueIndex, entry: Any) -> None:
+    """Поездка (TripRecord или TripEntry) в подсказки: проект водителя, адрес проекта и водителя."""
+    project_contexts, address_contexts = _entry_contexts(entry)
+    projects.add(entry.project, project_contexts)
+    addresses.add(entry.address, address_contexts)
+
+
+class TripSuggestions:
+    """Подсказки проектов и адресов одной таблицы"""
+
+    def __init__(self, records_loader: Optional[Callable[[], Iterable[Any]]] = None):
+        self.records_loader = records_loader
+        self.projects = ValueIndex()
+        self.addresses = ValueIndex()
+        self.loaded = False
+        self._loading = False
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        # Поездки, сохранённые во время первого чтения листа
+        self._pending: List[Any] = []
+
+    def load(self) -> bool:
+        """Заполняет подсказки одним чтением листа. Повторные вызовы ничего не делают."""
+        if self.loaded:
+            return True
+        if self.records_loader is None:
+            return False
+        with self._load_lock:
+            if self.loaded:
+                return True
+            with self._lock:
+                self._loading = True
+            try:
+                records = self.records_loader()
+            except Exception as e:
+                logger.error(f"Не удалось загрузить подсказки проектов и адресов: {e}")
+                with self._lock:
+                    self._loading = False
+                    self._pending = []
+                return False
+            # Строим вне замка: подсказки в обработчиках не ждут разбора листа
+            projects, addresses = ValueIndex(), ValueIndex()
+            row_uids = set()
+            for record in records:
+                _add_entry(projects, addresses, record)
+                row_uids.add(record.row_uid)
+            with self._lock:
+                for entry in self._pending:
+                    if entry.row_uid not in row_uids:
+                        _add_entry(projects, addresses, entry)
+                self.projects, self.addresses = projects, addresses
+                self._pending = []
+                self._loading = False
+                self.loaded = True
+            logger.info(f"Загружены подсказки: {len(self.projects)} проектов, {len(self.addresses)} адресов")
+        return True
+
+    def remember(self, entry: Any) -> None:
+        """Вызывается после успешного сохранения поездки."""
+        with self._lock:
+            if self.loaded:
+                _add_entry(self.projects, self.addresses, entry)
+            elif self._loading:
+                self._pending.append(entry)
+
+    def apply_change(self, change: Any) -> None:
+        """Ручные правки листа (sheet_watch.SheetChange): старые версии строк вычитаются, новые добавляются."""
+        with self._lock:
+            if not self.loaded:
+                return
+            for record in change.removed:
+                project_contexts, address_contexts = _entry_contexts(record)
+                self.projects.discard(record.project, project_contexts)
+                self.addresses.discard(record.address, address_contexts)
+            for record in change.added:
+                _add_entry(self.projects, self.addresses, record)
+
+    def canonical_project(self, value: str) -> Optional[str]:
+        with self._lock:
+            return self.projects.canonical(value)
+
+    def canonical_address(self, value: str) -> Optional[str]:
+        with self._lock:
+            return self.addresses.canonical(value)
+
+    def suggest_projects(self, user_id: int, prefix: str = "") -> List[str]:
+        with self._lock:
+            return self.projects.suggest(prefix, (user_id,))
+
+    def suggest_addresses(self, user_id: int, project: str = "", prefix: str = "") -> List[str]:
+        """Сначала адреса, где бывали по этому проекту, затем адреса водителя."""
+        project_key = value_key(project)
+        contexts = (("project", project_key), user_id) if project_key else (user_id,)
+        with self._lock:
+            return self.addresses.suggest(prefix, contexts)
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Несколько компаний в одном процессе бота.
+
+Каждая компания (арендатор) - своя Google-таблица. Водитель привязывается
+к компании по конфигу TENANTS_CONFIG (JSON):
+
+    {
+      "default": "acme",
+      "tenants": {
+        "acme":  {"sheet_id": "1AbC...", "drivers": [111, 222]},
+        "globex": {"sheet_id": "1XyZ...", "sheet_name": "Поездки",
+                   "users_sheet_name": "Пользователи", "drivers": [333]}
+      }
+    }
+
+Водители, которых нет в конфиге, попадают в компанию "default" (если она
+задана). Без TENANTS_CONFIG есть одна компания из GOOGLE_SHEET_ID.
+
+Клиенты таблицы, пользователи, кэш последних поездок, подсказки и индекс
+/stats компании (все три наполняются одним чтением листа) создаются при первом обращении и живут в LRU-реестре
+ограниченного размера (TENANT_CACHE_SIZE). Все компании используют один
+авторизованный транспорт: один сервисный аккаунт, один токен и одно описание API.
+При SHEET_WATCH_INTERVAL > 0 у каждой компании есть наблюдатель за ручными
+правками таблицы (sheet_watch.py).
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from deps import UnknownTenantError
+from last_trips import LastTripCache
+from sheet_watch import SheetWatcher, drive_version_loader
+from sheets_client import GoogleSheetsClient
+from suggestions import TripSuggestions
+from trip_codec import TripRecord
+from trip_index import TripIndex
+from users_repo import UsersRepository
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT = "default"
+
+
+class Tenant(NamedTuple):
+    """Компания и её таблица"""
+    tenant_id: str
+    sheet_id: str
+    sheet_name: str = "Лист1"
+    users_sheet_name: str = "Пользователи"
+
+
+class TenantConfig(NamedTuple):
+    tenants: Dict[str, Tenant]
+    drivers: Dict[int, str]  # telegram_user_id -> tenant_id
+    default_tenant: Optional[str]
+
+
+def single_tenant_config() -> TenantConfig:
+    """Одна компания из GOOGLE_SHEET_ID (режим до появления арендаторов)."""
+    tenant = Tenant(
+        tenant_id=DEFAULT_TENANT,
+        sheet_id=os.getenv("GOOGLE_SHEET_ID", "").strip(),
+        sheet_name=os.getenv("GOOGLE_SHEET_NAME", "Лист1"),
+        users_sheet_name=os.getenv("USERS_SHEET_NAME", "Пользователи"),
+    )
+    return TenantConfig({DEFAULT_TENANT: tenant}, {}, DEFAULT_TENANT)
+
+
+def load_tenant_config(path: str) -> TenantConfig:
+    """Читает конфиг арендаторов. Ошибки конфига - ValueError с понятным текстом."""
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+
+    tenants: Dict[str, Tenant] = {}
+    drivers: Dict[int, str] = {}
+    for tenant_id, item in raw.get("tenants", {}).items():
+        if not item.get("sheet_id"):
+            raise ValueError(f"У компании {tenant_id} не указан sheet_id")
+        tenants[tenant_id] = Tenant(
+            tenant_id=tenant_id,
+            sheet_id=item["sheet_id"],
+            sheet_name=item.get("sheet_name", "Лист1"),
+            users_sheet_name=item.get("users_sheet_name", "Пользователи"),
+        )
+        for driver_id in item.get("drivers", []):
+            driver_id = int(driver_id)
+            if driver_id in drivers and drivers[driver_id] != tenant_id:
+                raise ValueError(f"Водитель {driver_id} указан в компаниях {drivers[driver_id]} и {tenant_id}")
+            drivers[driver_id] = tenant_id
+
+    if not tenants:
+        raise ValueError("В конфиге нет ни одной компании")
+    default_tenant = raw.get("default")
+    if default_tenant is not None and default_tenant not in tenants:
+        raise ValueError(f"Компания по умолчанию {default_tenant} не описана в tenants")
+    return TenantConfig(tenants, drivers, default_tenant)
+
+
+def tenant_config_from_env() -> TenantConfig:
+    path = os.getenv("TENANTS_CONFIG", "").strip()
+    if not path:
+        return single_tenant_config()
+    config = load_tenant_config(path)
+    logger.info(f"Загружено компаний: {len(config.tenants)}, водителей: {len(config.drivers)}")
+    return config
+
+
+def _thread_local_request_builder(credentials: Any) -> Callable[..., Any]:
+    """httplib2 не потокобезопасен: каждый поток получает своё авторизованное соединение."""
+    import google_auth_httplib2
+    import httplib2
+    from googleapiclient.http import HttpRequest
+
+    local = threading.local()
+
+    def request_builder(http: Any, *args: Any, **kwargs: Any) -> HttpRequest:
+        thread_http = getattr(local, "http", None)
+        if thread_http is None:
+            thread_http = local.http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http())
+        return HttpRequest(thread_http, *args, **kwargs)
+
+    return request_builder
+
+
+def build_shared_sheets_service(service_account_path: str) -> Any:
+    """
+    Один сервис Sheets API на все компании.
+
+    Учётные данные и описание API общие, соединения - свои у каждого потока
+    (keep-alive сохраняется).
+    """
+    from google.oauth2 import service_account
+    from googleapiclient.discovery import build
+
+    from fast_json import make_sheets_json_model
+
+    credentials = service_account.Credentials.from_service_account_file(
+        service_account_path,
+        scopes=["https://www.googleapis.com/auth/spreadsheets"],
+    )
+    return build(
+        "sheets", "v4",
+        credentials=credentials,
+        model=make_sheets_json_model(),
+        requestBuilder=_thread_local_request_builder(credentials),
+    )
+
+
+def build_drive_version_service(service_account_path: str) -> Any:
+    """Drive API только для чтения версии файлов таблиц (sheet_watch.py)."""
+    from google.oauth2 import service_account
+    from googleapiclient.discovery import build
+
+    credentials = service_account.Credentials.from_service_account_file(
+        service_account_path,
+        scopes=["https://www.googleapis.com/auth/drive.metadata.readonly"],
+    )
+    return build("drive", "v3", credentials=credentials, requestBuilder=_thread_local_request_builder(credentials))
+
+
+class TenantContext:
+    """Клиенты одной таблицы: поездки, пользователи, последние поездки, подсказки, индекс для /stats"""
+
+    def __init__(self, tenant: Tenant, service: Any, service_account_path: str = "",
+                 version_service: Optional[Any] = None):
+        self.tenant = tenant
+        self.sheets_client = GoogleSheetsClient(
+            service_account_path=service_account_path,
+            sheet_id=tenant.sheet_id,
+            sheet_name=tenant.sheet_name,
+            service=service,
+        )
+        self.users_repo = UsersRepository(
+            users_sheet_name=tenant.users_sheet_name,
+            service=service,
+            sheet_id=tenant.sheet_id,
+        )
+        # Кэши наполняются одним чтением листа на всех (load_caches)
+        self._caches_lock = threading.Lock()
+        self._shared_records: Optional[List[TripRecord]] = None
+        self.last_trips = LastTripCache(self._read_records)
+        self.suggestions = TripSuggestions(self._read_records)
+        self.trip_index = TripIndex(self._read_records)
+
+        # Ручные правки в таблице: снимок листа сверяется по версии файла (sheet_watch.py)
+        self.watcher: Optional[SheetWatcher] = None
+        if version_service is not None:
+            self.watcher = SheetWatcher(
+                self.sheets_client,
+                drive_version_loader(version_service, tenant.sheet_id),
+                users_repo=self.users_repo,
+            )
+            self.watcher.listeners += [self.last_trips, self.suggestions, self.trip_index]
+            self.sheets_client.watcher = self.watcher
+
+    @property
+    def caches(self) -> Tuple[Any, ...]:
+        return self.last_trips, self.suggestions, self.trip_index
+
+    def _read_records(self) -> List[TripRecord]:
+        # Во время load_caches все кэши получают уже прочитанные записи
+        records = self._shared_records
+        if records is not None:
+            return records
+        return self.sheets_client.read_records()
+
+    def load_caches(self) -> bool:
+        """
+        Последние поездки, подсказки и индекс /stats из одного чтения листа.
+        Повторные вызовы ничего не делают; False - лист прочитать не удалось.
+        """
+        if all(cache.loaded for cache in self.caches):
+            return True
+        with self._caches_lock:
+            pending = [cache for cache in self.caches if not cache.loaded]
+            if not pending:
+                return True
+            try:
+                self._shared_records = self.sheets_client.read_records()
+            except Exception as e:
+                logger.error(f"Не удалось прочитать лист компании {self.tenant.tenant_id}: {e}")
+                return False
+            try:
+                return all([cache.load() for cache in pending])
+            finally:
+                self._shared_records = None
+
+
+class TenantRegistry:
+    """LRU-реестр контекстов компаний поверх общего сервиса Sheets"""
+
+    def __init__(
+        self,
+        config: TenantConfig,
+        service_factory: Callable[[], Any],
+        max_size: Optional[int] = None,
+        service_account_path: str = "",
+        version_service_factory: Optional[Callable[[], Any]] = None,
+    ):
+        if max_size is None:
+            max_size = int(os.getenv("TENANT_CACHE_SIZE", "32"))
+        self.config = config
+        self.max_size = max(max_size, 1)
+        self.service_account_path = service_account_path
+        self._service_factory = service_factory
+        self._service: Optional[Any] = None
+        # Сервис версий файлов (Drive) - только если включено отслеживание правок
+        self._version_service_factory = version_service_factory
+        self._version_service: Optional[Any] = None
+        self._contexts: "OrderedDict[str, TenantContext]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def service(self) -> Any:
+        """Общий транспорт создаётся один раз при первой компании."""
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    self._service = self._service_factory()
+        return self._service
+
+    @property
+    def version_service(self) -> Optional[Any]:
+        if self._version_service_factory is not None and self._version_service is None:
+            with self._lock:
+                if self._version_service is None:
+                    self._version_service = self._version_service_factory()
+        return self._version_service
+
+    def tenant_for_user(self, user_id: Optional[int]) -> Tenant:
+        tenant_id = self.config.drivers.get(user_id) if user_id is not None else None
+        if tenant_id is None:
+            tenant_id = self.config.default_tenant
+        if tenant_id is None:
+            raise UnknownTenantError(f"Пользователь {user_id} не привязан ни к одной компании")
+        return self.config.tenants[tenant_id]
+
+    def for_user(self, user_id: Optional[int]) -> TenantContext:
+        return self.get(self.tenant_for_user(user_id).tenant_id)
+
+    def get(self, tenant_id: str) -> TenantContext:
+        with self._lock:
+            context = self._contexts.get(tenant_id)
+            if context is not None:
+                self._contexts.move_to_end(tenant_id)
+                self.hits += 1
+                return context
+            build_lock = self._build_locks.setdefault(tenant_id, threading.Lock())
+
+        # Сетевые запросы (заголовки, пользователи) - вне общего замка реестра
+        with build_lock:
+            with self._lock:
+                context = self._contexts.get(tenant_id)
+                if context is not None:
+                    self._contexts.move_to_end(tenant_id)
+                    self.hits += 1
+                    return context
+            tenant = self.config.tenants[tenant_id]
+            context = TenantContext(tenant, self.service, self.service_account_path, self.version_service)
+            with self._lock:
+                self.misses += 1
+                self._contexts[tenant_id] = context
+                while len(self._contexts) > self.max_size:
+                    evicted_id, _ = self._contexts.popitem(last=False)
+                    self.evictions += 1
+                    logger.info(f"Компания {evicted_id} выгружена из реестра")
+            logger.info(f"Подключена таблица компании {tenant_id}")
+            return context
+
+    def loaded(self) -> Dict[str, TenantContext]:
+        """Загруженные сейчас компании (копия)."""
+        with self._lock:
+            return dict(self._contexts)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "tenants": len(self.config.tenants),
+            "loaded": len(self._contexts),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
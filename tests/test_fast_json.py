@@ -0,0 +1,72 @@
+"""JSON-модель Sheets (fast_json.py): тело запроса с кириллицей доходит до API."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import httplib2
+import pytest
+from googleapiclient.http import HttpMock, HttpRequest
+
+import fast_json
+from fast_json import make_sheets_json_model
+
+ROW = {"values": [["10.10.2026", "Иванов Пётр", "ЖК «Северный»", "ул. Ленина, 5"]]}
+
+
+@pytest.fixture(params=["orjson", "json"])
+def model(request, monkeypatch):
+    # Оба пути: с orjson и со стандартным json
+    if request.param == "json":
+        monkeypatch.setattr(fast_json, "orjson", None)
+    elif fast_json.orjson is None:
+        pytest.skip("orjson не установлен")
+    return make_sheets_json_model()
+
+
+def _request(model, http, uri):
+    headers, _, _, body = model.request({}, {}, {}, ROW)
+    return HttpRequest(http, model.response, uri, method="POST", body=body, headers=headers)
+
+
+def test_cyrillic_body_is_utf8_bytes(model, tmp_path):
+    response_file = tmp_path / "response.json"
+    response_file.write_text('{"updates": {"updatedRows": 1}}', encoding="utf-8")
+    http = HttpMock(str(response_file), {"status": "200"})
+
+    request = _request(model, http, "https://sheets.googleapis.com/v4/spreadsheets/S1/values/A1:append")
+    result = request.execute()
+
+    assert result == {"updates": {"updatedRows": 1}}
+    assert isinstance(http.body, bytes)
+    assert json.loads(http.body.decode("utf-8")) == ROW
+    assert request.body_size == len(http.body)
+
+
+def test_cyrillic_body_through_httplib2(model):
+    received = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received["body"] = self.rfile.read(int(self.headers["Content-Length"]))
+            payload = b'{"ok": true}'
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        uri = f"http://127.0.0.1:{server.server_port}/v4/spreadsheets/S1/values/A1:append"
+        assert _request(model, httplib2.Http(), uri).execute() == {"ok": True}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert json.loads(received["body"].decode("utf-8")) == ROW
@@ -0,0 +1,16 @@
+"""Бюджет времени импорта при холодном старте webhook (см. import_profile.py)."""
+
+import os
+
+from import_profile import DEFAULT_BUDGET_MS, DEFAULT_OWN_BUDGET_MS, check_budget, own_time_ms, profile_min
+
+
+def test_cold_start_import_budget():
+    records = profile_min(["server", "bot"], repeat=3)
+    budget_ms = float(os.getenv("IMPORT_BUDGET_MS", DEFAULT_BUDGET_MS))
+    own_budget_ms = float(os.getenv("IMPORT_OWN_BUDGET_MS", DEFAULT_OWN_BUDGET_MS))
+
+    problems = check_budget(records, budget_ms, own_budget_ms)
+
+    assert not problems, "; ".join(problems)
+    assert own_time_ms(records) > 0  # модули проекта действительно попали в замер
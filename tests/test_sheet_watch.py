@@ -0,0 +1,95 @@
+"""Ручные правки листа (sheet_watch.py): кэши компании и номера строк после check()."""
+
+import pytest
+
+from fake_sheets import FakeSheetsService
+from models import TripEntry
+from tenants import Tenant, TenantContext
+from trip_index import parse_stats_query
+
+SHEET_ID = "S1"
+SHEET = "Лист1"
+PROJECT_COLUMN = TripEntry.get_headers().index("project")
+
+
+def _entry(i: int, author: int, project: str) -> TripEntry:
+    return TripEntry(
+        date="10.10.2026", time_start="09:00", time_end="10:00",
+        odometer_start=1000 + i * 10, odometer_end=1010 + i * 10, distance_km=10,
+        engineer=f"Инженер {author}", project=project, address=f"ул. Мира {i}", comment="",
+        created_at=f"2026-10-10T{i:02d}:00:00Z", author_tg_id=author,
+    )
+
+
+def _trips(tenant: TenantContext, query: str) -> int:
+    return tenant.trip_index.query(parse_stats_query(query)).trips
+
+
+@pytest.fixture
+def service():
+    return FakeSheetsService()
+
+
+@pytest.fixture
+def tenant(service):
+    # Версию файла отдаёт тот же фейк: растёт при каждой записи, как version в Drive
+    tenant = TenantContext(Tenant("acme", SHEET_ID), service, version_service=service)
+    tenant.watcher.block_rows = 4
+    for i in range(10):
+        # Строки листа 2..11, авторы 100, 101, 102 по кругу
+        tenant.sheets_client.append_row(_entry(i, 100 + i % 3, "Ромашка" if i % 2 else "ЖК Север"))
+    assert tenant.load_caches()
+    tenant.watcher.check()
+    return tenant
+
+
+def test_own_writes_are_not_reported_as_changes(tenant):
+    # Как в handlers/trip.py: после сохранения кэши обновляет сам обработчик
+    entry = _entry(10, 100, "Ромашка")
+    assert tenant.sheets_client.append_row(entry)
+    tenant.last_trips.remember(100, entry)
+    tenant.suggestions.remember(entry)
+    tenant.trip_index.add(entry)
+
+    # Своя запись тоже меняет версию файла: лист перечитывается, но строка не приходит второй раз
+    tenant.watcher.check()
+
+    assert len(tenant.trip_index) == 11
+    assert _trips(tenant, "проект: ромашка") == 6
+    assert tenant.last_trips.get(100).odometer_end == 1110
+
+
+def test_manual_cell_edit_updates_caches(service, tenant):
+    # Строка листа 3 - вторая поездка (Ромашка, автор 101)
+    service.sheet_rows(SHEET_ID, SHEET)[2][PROJECT_COLUMN] = "ЖК Северный"
+    service._bump_revision(SHEET_ID)
+
+    assert tenant.watcher.check()
+    assert _trips(tenant, "проект: северный") == 1
+    assert _trips(tenant, "проект: ромашка") == 4
+    assert _trips(tenant, "проект: север") == 6
+    assert "ЖК Северный" in tenant.suggestions.suggest_projects(101, prefix="сев")
+    assert len(tenant.trip_index) == 10
+
+
+def test_manual_row_delete_updates_caches_and_row_numbers(service, tenant):
+    records = tenant.sheets_client.read_records()
+    last = records[-1]  # строка 11, автор 100
+    assert (last.row_number, last.author_tg_id) == (11, 100)
+    assert tenant.last_trips.get(100).odometer_end == last.odometer_end
+
+    # Водитель удаляет свою последнюю поездку, а кто-то - первую строку листа
+    service.delete_rows(SHEET_ID, SHEET, 11)
+    service.delete_rows(SHEET_ID, SHEET, 2)
+
+    assert tenant.watcher.check()
+    assert len(tenant.trip_index) == 8
+    assert _trips(tenant, "") == 8
+    # Последней у автора 100 стала поездка 7 (бывшая строка 8)
+    assert tenant.last_trips.get(100).odometer_end == 1070
+
+    # Редактирование находит строку по новому номеру, а не по номеру до удаления
+    moved = records[5]  # была строкой 7
+    found = tenant.sheets_client.find_row_by_uid(moved.row_uid, moved.author_tg_id)
+    assert found is not None and found[0] == 6
+    assert tenant.sheets_client.find_row_by_uid(last.row_uid, last.author_tg_id) is None
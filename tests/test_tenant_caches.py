@@ -0,0 +1,38 @@
+"""Кэши компании (tenants.py): одно чтение листа на последние поездки, подсказки и индекс /stats."""
+
+from fake_sheets import FakeSheetsService
+from models import TripEntry
+from tenants import Tenant, TenantContext
+from trip_index import parse_stats_query
+
+
+def _entry(i: int, author: int, project: str) -> TripEntry:
+    return TripEntry(
+        date="10.10.2026", time_start="09:00", time_end="10:00",
+        odometer_start=1000 + i * 10, odometer_end=1010 + i * 10, distance_km=10,
+        engineer=f"Инженер {author}", project=project, address=f"ул. Мира {i}", comment="",
+        created_at=f"2026-10-10T0{i}:00:00Z", author_tg_id=author,
+    )
+
+
+def test_load_caches_reads_sheet_once():
+    service = FakeSheetsService()
+    tenant = TenantContext(Tenant("acme", "S1"), service)
+    for i in range(4):
+        tenant.sheets_client.append_row(_entry(i, 100 + i % 2, "Ромашка" if i % 2 else "ЖК Север"))
+
+    reads = []
+    read_sheet_values = tenant.sheets_client.read_sheet_values
+    tenant.sheets_client.read_sheet_values = lambda: reads.append(1) or read_sheet_values()
+
+    assert tenant.load_caches()
+    assert len(reads) == 1
+    assert all(cache.loaded for cache in tenant.caches)
+    assert tenant.last_trips.get(101).odometer_end == 1040
+    assert tenant.suggestions.suggest_projects(100, prefix="ром") == ["Ромашка"]
+    assert tenant.trip_index.query(parse_stats_query("проект: север")).trips == 2
+
+    # Повторный вызов и загрузка отдельного кэша лист больше не читают
+    assert tenant.load_caches()
+    assert tenant.trip_index.load()
+    assert len(reads) == 1
@@ -0,0 +1,67 @@
+"""Webhook (server.py): незнакомые типы обновлений и повторная доставка после ошибки."""
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from tracing import tracer
+from update_dedup import RecentUpdateIds
+from update_queue import UpdateQueue, update_shard_key
+
+
+class _Exporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def shutdown(self):
+        pass
+
+
+async def _handle(update):
+    pass
+
+
+def _body(update_id: int, kind: str = "future_update_kind") -> bytes:
+    # Тип, которого ещё нет в aiogram: Update.event бросает UpdateTypeLookupError
+    return json.dumps({"update_id": update_id, kind: {"from": {"id": 7}}}).encode("utf-8")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Режим очереди и включённая трассировка: оба считают ключ шарда
+    monkeypatch.setattr(server, "update_queue", UpdateQueue(_handle, max_size=8, workers=2))
+    monkeypatch.setattr(server, "recent_updates", RecentUpdateIds(max_size=100))
+    monkeypatch.setattr(tracer, "exporter", _Exporter())
+    # Без with: события startup (бот, очередь, дайджест) не запускаются
+    return TestClient(server.app)
+
+
+def test_shard_key_of_unknown_update_type():
+    assert update_shard_key(server.parse_update(_body(1))) == 0
+
+
+def test_unknown_update_type_is_accepted(client):
+    response = client.post("/", content=_body(101))
+
+    assert response.status_code == 200
+    assert server.update_queue.accepted == 1
+    assert tracer.exporter.spans[-1].tags["user_id"] == 0
+
+
+def test_failed_update_is_not_remembered(client, monkeypatch):
+    def broken_put(update):
+        raise RuntimeError("queue is broken")
+
+    monkeypatch.setattr(server.update_queue, "put_nowait", broken_put)
+    assert client.post("/", content=_body(102)).status_code == 500
+
+    # Повторную доставку Telegram не считаем дублем
+    monkeypatch.undo()
+    monkeypatch.setattr(server, "update_queue", UpdateQueue(_handle, max_size=8, workers=2))
+    assert client.post("/", content=_body(102)).status_code == 200
+    assert server.update_queue.accepted == 1
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Трассировка обработки обновлений.
+
+Каждое обновление получает trace_id, который через contextvars проходит от
+webhook_handler через dp.feed_update, обработчики aiogram, вызовы Google
+Sheets и инференс модели топлива. Завершённые спаны (с update_id и user_id)
+выгружаются в JSON-файл или в коллектор в формате Zipkin v2 (Zipkin, Jaeger,
+OpenTelemetry Collector с zipkin-приёмником).
+
+Включается переменной TRACING_EXPORTER=file|zipkin. Без неё спаны не создаются.
+
+Разбор файла с трассами - самые медленные обновления по шагам:
+    python tracing.py traces.jsonl --slowest 10
+"""
+
+import argparse
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Span:
+    """Один шаг обработки: имя, время начала, длительность и теги"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_us", "duration_us", "tags", "_started")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], tags: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_us = int(time.time() * 1_000_000)
+        self.duration_us = 0
+        self.tags = tags
+        self._started = time.perf_counter()
+
+    def set_tag(self, key: str, value: Any) -> None:
+        self.tags[key] = value
+
+    def finish(self) -> None:
+        self.duration_us = max(int((time.perf_counter() - self._started) * 1_000_000), 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_us": self.start_us,
+            "duration_ms": round(self.duration_us / 1000, 3),
+            "tags": self.tags,
+        }
+
+
+# Текущий спан. _NOT_SAMPLED - трасса не попала в выборку, вложенные спаны не создаются
+_NOT_SAMPLED = object()
+_current_span: contextvars.ContextVar[Any] = contextvars.ContextVar("current_span", default=None)
+
+
+class BatchExporter(ABC):
+    """Копит спаны в очереди и выгружает их пачками из фонового потока (раз в flush_interval или по batch_size)"""
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=10000)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        # Polling-режим не вызывает tracer.shutdown: хвост выгружается при выходе
+        atexit.register(self.shutdown)
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            # Выгрузка не успевает: теряем спаны, но не тормозим обработку обновлений
+            self.dropped += 1
+
+    @abstractmethod
+    def _send(self, spans: List[Span]) -> None:
+        """Выгружает пачку спанов (вызывается из фонового потока)."""
+
+    def _run(self) -> None:
+        batch: List[Span] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                span = self._queue.get(timeout=max(deadline - time.monotonic(), 0.01))
+            except queue.Empty:
+                span = None
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                    continue
+            else:
+                if span is None:  # сигнал остановки
+                    if batch:
+                        self._send(batch)
+                    return
+                batch.append(span)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._send(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def shutdown(self) -> None:
+        """Выгружает накопленное и останавливает поток."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+
+class JsonFileExporter(BatchExporter):
+    """Пишет спаны построчно (JSON Lines) в файл: пачкой из фонового потока, а не на каждый спан"""
+
+    def __init__(self, path: str, batch_size: int = 100, flush_interval: float = 1.0):
+        self.path = path
+        super().__init__(batch_size, flush_interval)
+
+    def _send(self, spans: List[Span]) -> None:
+        lines = "".join(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n" for span in spans)
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+        except OSError as e:
+            logger.warning(f"Не удалось записать {len(spans)} спанов в {self.path}: {e}")
+
+
+class ZipkinExporter(BatchExporter):
+    """Отправляет спаны пачками в коллектор по HTTP (Zipkin v2 JSON) из фонового потока"""
+
+    def __init__(self, url: str, service_name: str, batch_size: int = 100, flush_interval: float = 1.0):
+        self.url = url
+        self.service_name = service_name
+        super().__init__(batch_size, flush_interval)
+
+    def _to_zipkin(self, span: Span) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {
+            "traceId": span.trace_id,
+            "id": span.span_id,
+            "name": span.name,
+            "timestamp": span.start_us,
+            "duration": span.duration_us,
+            "localEndpoint": {"serviceName": self.service_name},
+            "tags": {key: str(value) for key, value in span.tags.items()},
+        }
+        if span.parent_id:
+            payload["parentId"] = span.parent_id
+        return payload
+
+    def _send(self, spans: List[Span]) -> None:
+        body = json.dumps([self._to_zipkin(span) for span in spans]).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                response.read()
+        except Exception as e:
+            logger.warning(f"Не удалось отправить {len(spans)} спанов в {self.url}: {e}")
+
+
+class Tracer:
+    """Создание спанов и выгрузка завершённых в экспортёр"""
+
+    def __init__(self, exporter: Optional[Any] = None, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        kind = os.getenv("TRACING_EXPORTER", "").strip().lower()
+        sample_rate = float(os.getenv("TRACING_SAMPLE_RATE", "1.0"))
+        if kind == "file":
+            return cls(JsonFileExporter(os.getenv("TRACING_FILE", "traces.jsonl")), sample_rate)
+        if kind == "zipkin":
+            exporter = ZipkinExporter(
+                os.getenv("TRACING_ZIPKIN_URL", "http://127.0.0.1:9411/api/v2/spans"),
+                os.getenv("TRACING_SERVICE_NAME", "trip-bot"),
+            )
+            return cls(exporter, sample_rate)
+        if kind:
+            logger.error(f"Неизвестный TRACING_EXPORTER={kind}, трассировка выключена")
+        return cls()
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    @contextmanager
+    def span(self, name: str, **tags: Any) -> Iterator[Optional[Span]]:
+        """Спан вокруг блока кода. Без экспортёра или вне выборки возвращает None."""
+        if self.exporter is None:
+            yield None
+            return
+        parent = _current_span.get()
+        if parent is _NOT_SAMPLED:
+            yield None
+            return
+        if parent is None:
+            if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+                token = _current_span.set(_NOT_SAMPLED)
+                try:
+                    yield None
+                finally:
+                    _current_span.reset(token)
+                return
+            span = Span(name, "%032x" % random.getrandbits(128), None, tags)
+        else:
+            # update_id и user_id наследуются от корневого спана
+            inherited = {key: parent.tags[key] for key in ("update_id", "user_id") if key in parent.tags}
+            inherited.update(tags)
+            span = Span(name, parent.trace_id, parent.span_id, inherited)
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_tag("error", type(e).__name__)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.finish()
+            try:
+                self.exporter.export(span)
+            except Exception as e:
+                logger.debug(f"Ошибка экспорта спана: {e}")
+
+    def shutdown(self) -> None:
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+
+tracer = Tracer.from_env()
+
+
+def span(name: str, **tags: Any):
+    """Спан глобального трассировщика: with span("sheets.append_row"): ..."""
+    return tracer.span(name, **tags)
+
+
+def current_span() -> Optional[Span]:
+    value = _current_span.get()
+    return value if isinstance(value, Span) else None
+
+
+def set_tag(key: str, value: Any) -> None:
+    """Добавляет тег текущему спану и корневым тегам вложенных спанов."""
+    current = current_span()
+    if current is not None:
+        current.set_tag(key, value)
+
+
+def traced(name: Optional[str] = None) -> Callable[[F], F]:
+    """Декоратор: оборачивает функцию (обычную или async) в спан."""
+    def decorator(func: F) -> F:
+        span_name = name or func.__qualname__
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with tracer.span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+    return decorator
+
+
+class TracingMiddleware:
+    """Внутренний middleware aiogram: спан на каждый вызов обработчика"""
+
+    async def __call__(self, handler: Callable, event: Any, data: Dict[str, Any]) -> Any:
+        if not tracer.enabled:
+            return await handler(event, data)
+        handler_object = data.get("handler")
+        callback = getattr(handler_object, "callback", None)
+        name = f"handler.{getattr(callback, '__name__', type(event).__name__)}"
+        user = data.get("event_from_user")
+        tags: Dict[str, Any] = {}
+        if user is not None:
+            tags["user_id"] = user.id
+        state = data.get("raw_state")
+        if state:
+            tags["state"] = state
+        with tracer.span(name, **tags):
+            return await handler(event, data)
+
+
+def summarize(path: str, slowest: int) -> None:
+    """Печатает самые медленные трассы из JSON-файла с разбивкой по шагам."""
+    traces: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                span_data = json.loads(line)
+                traces[span_data["trace_id"]].append(span_data)
+
+    # В режиме очереди webhook отвечает раньше, чем заканчивается обработка,
+    # поэтому длительность трассы - от начала корня до конца последнего спана
+    roots = []
+    for spans in traces.values():
+        root = next((s for s in spans if not s["parent_id"]), None)
+        if root is not None:
+            end_us = max(s["start_us"] + s["duration_ms"] * 1000 for s in spans)
+            roots.append(((end_us - root["start_us"]) / 1000, root, spans))
+    roots.sort(key=lambda item: item[0], reverse=True)
+
+    for total_ms, root, spans in roots[:slowest]:
+        tags = root["tags"]
+        print(f"\n{total_ms:9.1f} мс  {root['name']}  update_id={tags.get('update_id')} "
+              f"user_id={tags.get('user_id')}  trace={root['trace_id']}")
+        children: Dict[Optional[str], List[Dict[str, Any]]] = defaultdict(list)
+        for s in spans:
+            children[s["parent_id"]].append(s)
+
+        def show(parent_id: str, depth: int) -> None:
+            for child in sorted(children.get(parent_id, []), key=lambda s: s["start_us"]):
+                error = f"  ❗{child['tags']['error']}" if "error" in child["tags"] else ""
+                print(f"{child['duration_ms']:9.1f} мс  {'  ' * depth}{child['name']}{error}")
+                show(child["span_id"], depth + 1)
+
+        show(root["span_id"], 1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Самые медленные трассы из JSON-файла спанов")
+    parser.add_argument("path", nargs="?", default=os.getenv("TRACING_FILE", "traces.jsonl"), help="файл спанов")
+    parser.add_argument("--slowest", type=int, default=10, help="сколько трасс показать")
+    args = parser.parse_args()
+    summarize(args.path, args.slowest)
+
+
+if __name__ == "__main__":
+    main()
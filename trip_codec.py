@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Преобразование строк листа поездок в типизированные записи и обратно.
+
+Google Sheets отдаёт строки списками строк, причём пустые ячейки в конце
+строки обрезаются. Кодек раскладывает пачку таких строк в компактные
+TripRecord (NamedTuple) с числами вместо строк и кодирует их обратно.
+
+В строгом режиме испорченная строка вызывает TripRowError, в мягком -
+пропускается с записью в список ошибок.
+"""
+
+import logging
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+from models import TripEntry
+
+logger = logging.getLogger(__name__)
+
+TRIP_COLUMNS: List[str] = TripEntry.get_headers()
+
+
+def column_letter(index: int) -> str:
+    """Буква колонки по номеру с единицы: 1 -> A, 14 -> N, 27 -> AA."""
+    letters = ""
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+# Последняя колонка листа поездок (row_uid)
+LAST_COLUMN = column_letter(len(TRIP_COLUMNS))
+
+
+class TripRowError(ValueError):
+    """Строка листа не разбирается в запись поездки"""
+
+    def __init__(self, row_number: int, message: str):
+        super().__init__(f"строка {row_number}: {message}")
+        self.row_number = row_number
+
+
+class TripRecord(NamedTuple):
+    """Запись поездки из таблицы"""
+    date: str
+    time_start: str
+    time_end: str
+    odometer_start: int
+    odometer_end: int
+    distance_km: int
+    fuel_liters: Optional[float]
+    engineer: str
+    project: str
+    address: str
+    comment: str
+    created_at: str
+    author_tg_id: int
+    row_uid: str
+    row_number: int = 0  # номер строки в листе (0 - ещё не записана)
+
+    @classmethod
+    def from_entry(cls, entry: TripEntry, row_number: int = 0) -> "TripRecord":
+        return cls(
+            entry.date, entry.time_start, entry.time_end,
+            entry.odometer_start, entry.odometer_end, entry.distance_km, entry.fuel_liters,
+            entry.engineer, entry.project or "", entry.address or "", entry.comment,
+            entry.created_at, entry.author_tg_id, entry.row_uid, row_number,
+        )
+
+    def to_entry(self, **overrides: Any) -> TripEntry:
+        """Проверяет запись моделью TripEntry (pydantic v2)."""
+        data = self._asdict()
+        del data["row_number"]
+        data.update(overrides)
+        return TripEntry.model_validate(data)
+
+
+def _to_int(value: str) -> int:
+    # Sheets может вернуть "1 234" или "1234.0", если ячейку отформатировали вручную
+    try:
+        return int(value)
+    except ValueError:
+        return int(float(value.replace(" ", "").replace(" ", "").replace(",", ".")))
+
+
+def _to_float(value: str) -> Optional[float]:
+    if not value:
+        return None
+    return float(value.replace(",", "."))
+
+
+class TripRowCodec:
+    """Пакетное декодирование строк листа поездок и кодирование обратно"""
+
+    def __init__(self, strict: bool = False):
+        self.strict = strict
+
+    def decode_row(self, row: Sequence[str], row_number: int = 0) -> TripRecord:
+        """Разбирает одну строку. Бросает TripRowError, если строка испорчена."""
+        width = len(TRIP_COLUMNS)
+        if len(row) < width:
+            row = list(row) + [""] * (width - len(row))
+        try:
+            return TripRecord(
+                row[0], row[1], row[2],
+                _to_int(row[3]), _to_int(row[4]), _to_int(row[5]), _to_float(row[6]),
+                row[7], row[8], row[9], row[10], row[11],
+                _to_int(row[12]), row[13], row_number,
+            )
+        except (ValueError, TypeError) as e:
+            raise TripRowError(row_number, str(e)) from None
+
+    def decode_rows(
+        self,
+        rows: Sequence[Sequence[str]],
+        first_row_number: int = 2,
+        errors: Optional[List[TripRowError]] = None,
+    ) -> List[TripRecord]:
+        """
+        Разбирает пачку строк (без заголовка). first_row_number - номер первой строки в листе.
+        В мягком режиме испорченные строки пропускаются и добавляются в errors.
+        """
+        records: List[TripRecord] = []
+        append = records.append
+        decode_row = self.decode_row
+        for row_number, row in enumerate(rows, start=first_row_number):
+            if not row:
+                continue  # пустая строка в середине листа
+            try:
+                append(decode_row(row, row_number))
+            except TripRowError as e:
+                if self.strict:
+                    raise
+                if errors is not None:
+                    errors.append(e)
+                logger.debug(f"Пропущена строка листа поездок: {e}")
+        return records
+
+    def decode_sheet(self, values: Sequence[Sequence[str]], errors: Optional[List[TripRowError]] = None) -> List[TripRecord]:
+        """Разбирает ответ values.get целиком (первая строка - заголовки)."""
+        return self.decode_rows(values[1:], first_row_number=2, errors=errors)
+
+    @staticmethod
+    def encode(record: TripRecord) -> List[str]:
+        """Строка для записи в Google Sheets."""
+        return [
+            record.date,
+            record.time_start,
+            record.time_end,
+            str(record.odometer_start),
+            str(record.odometer_end),
+            str(record.distance_km),
+            str(record.fuel_liters) if record.fuel_liters is not None else "",
+            record.engineer,
+            record.project or "",
+            record.address or "",
+            record.comment,
+            record.created_at,
+            str(record.author_tg_id),
+            record.row_uid,
+        ]
+
+    def encode_rows(self, records: Sequence[TripRecord]) -> List[List[str]]:
+        encode = self.encode
+        return [encode(record) for record in records]
+
+
+def record_key(record: Any) -> Any:
+    """Ключ строки: row_uid, а у строк, добавленных в лист вручную без него, - содержимое."""
+    return record.row_uid or record._replace(row_number=0)
+
+
+def record_from_dict(data: Dict[str, Any]) -> TripRecord:
+    """Восстанавливает запись из словаря (_asdict), например из состояния FSM."""
+    return TripRecord(**data)
+
+
+# Мягкий кодек для чтения: одна кривая строка не должна ломать просмотр записей
+trip_codec = TripRowCodec()
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Инвертированный индекс поездок для команды /stats.
+
+Слова из полей project, address и engineer указывают на номера поездок
+(posting lists), а дата, пробег и топливо лежат в плоских массивах. Запрос
+"проект Ромашка, адрес Ленина, октябрь" - пересечение нескольких множеств и
+проход по кандидатам, без чтения листа: миллисекунды даже на годах истории.
+
+Индекс строится одним чтением листа при первом запросе и дальше
+поддерживается при сохранении (add) и редактировании (update) поездок.
+"""
+
+import bisect
+import functools
+import logging
+import math
+import re
+import threading
+from array import array
+from datetime import date
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from trip_codec import record_key
+
+logger = logging.getLogger(__name__)
+
+INDEXED_FIELDS = ("project", "address", "engineer")
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_words(text: str) -> List[str]:
+    """Слова в нижнем регистре, ё -> е."""
+    return _WORD_RE.findall((text or "").lower().replace("ё", "е"))
+
+
+@functools.lru_cache(maxsize=4096)
+def _word_set(text: str) -> FrozenSet[str]:
+    # Проекты и адреса повторяются из строки в строку
+    return frozenset(normalize_words(text))
+
+
+def parse_sheets_date(date_str: str) -> Optional[int]:
+    """ДД.ММ.ГГГГ -> порядковый номер дня (date.toordinal), None если не разобрать."""
+    try:
+        day, month, year = date_str.split(".")
+        return date(int(year), int(month), int(day)).toordinal()
+    except (ValueError, AttributeError):
+        return None
+
+
+class StatsQuery(NamedTuple):
+    """Фильтр /stats: слова по полям и диапазон дат (включительно, порядковые номера дней)"""
+    project: Tuple[str, ...] = ()
+    address: Tuple[str, ...] = ()
+    engineer: Tuple[str, ...] = ()
+    date_from: Optional[int] = None
+    date_to: Optional[int] = None
+
+
+class StatsResult(NamedTuple):
+    trips: int
+    distance_km: int
+    fuel_liters: float
+    by_engineer: List[Tuple[str, int, int]]  # (инженер, поездок, км), по убыванию км
+    by_project: List[Tuple[str, int, int]]
+
+
+class PrefixIndex:
+    """Слово -> номера (поездок, значений) и отсортированный словарь для поиска по префиксу"""
+
+    __slots__ = ("postings", "_vocabulary", "_dirty")
+
+    def __init__(self) -> None:
+        self.postings: Dict[str, Set[int]] = {}
+        self._vocabulary: List[str] = []
+        self._dirty = False
+
+    def add(self, row_id: int, text: str) -> None:
+        for word in _word_set(text):
+            posting = self.postings.get(word)
+            if posting is None:
+                posting = self.postings[word] = set()
+                self._dirty = True
+            posting.add(row_id)
+
+    def remove(self, row_id: int, text: str) -> None:
+        for word in _word_set(text):
+            posting = self.postings.get(word)
+            if posting is not None:
+                posting.discard(row_id)
+                if not posting:
+                    del self.postings[word]
+                    self._dirty = True
+
+    def match(self, prefix: str) -> Set[int]:
+        """Номера, у которых есть слово с этим префиксом ("ромаш" найдёт "ромашка")."""
+        exact = self.postings.get(prefix)
+        if self._dirty:
+            self._vocabulary = sorted(self.postings)
+            self._dirty = False
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = bisect.bisect_left(self._vocabulary, prefix + "￿")
+        if end - start == 1 and exact is not None:
+            return exact
+        result: Set[int] = set()
+        for word in self._vocabulary[start:end]:
+            result |= self.postings[word]
+        return result
+
+
+class TripIndex:
+    """Индекс поездок одной таблицы"""
+
+    def __init__(self, records_loader: Optional[Callable[[], Iterable[Any]]] = None):
+        self.records_loader = records_loader
+        self.loaded = False
+        self._loading = False
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._fields: Dict[str, PrefixIndex] = {name: PrefixIndex() for name in INDEXED_FIELDS}
+        self._row_ids: Dict[Any, int] = {}  # record_key -> номер поездки
+        self._deleted: Set[int] = set()  # номера строк, удалённых из листа вручную
+        self._dates = array("i")  # порядковый номер дня, 0 - дата не разобрана
+        self._distance = array("q")
+        self._fuel = array("d")  # NaN - не указано
+        self._texts: List[Tuple[str, str, str]] = []  # project, address, engineer
+        # Поездки, сохранённые во время первого чтения листа
+        self._pending: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self._texts) - len(self._deleted)
+
+    def load(self) -> bool:
+        """Строит индекс одним чтением листа. Повторные вызовы ничего не делают."""
+        if self.loaded:
+            return True
+        if self.records_loader is None:
+            return False
+        with self._load_lock:
+            if self.loaded:
+                return True
+            with self._lock:
+                self._loading = True
+            try:
+                records = self.records_loader()
+            except Exception as e:
+                logger.error(f"Не удалось построить индекс поездок: {e}")
+                with self._lock:
+                    self._loading = False
+                    self._pending = []
+                return False
+            # Пока индекс строится, add() только копит поездки в _pending,
+            # а запросы ждут loaded - замок на время разбора листа не нужен
+            for record in records:
+                self._upsert(record)
+            with self._lock:
+                for record in self._pending:
+                    self._upsert(record)
+                self._pending = []
+                self._loading = False
+                self.loaded = True
+            logger.info(f"Индекс поездок построен: {len(self)} записей")
+        return True
+
+    def add(self, entry: Any) -> None:
+        """После сохранения поездки (TripEntry или TripRecord)."""
+        with self._lock:
+            if self.loaded:
+                self._upsert(entry)
+            elif self._loading:
+                self._pending.append(entry)
+            # Индекс ещё не строился: поездка попадёт в него при чтении листа
+
+    # Редактирование меняет поля записи с тем же row_uid
+    update = add
+
+    def apply_change(self, change: Any) -> None:
+        """Ручные правки листа (sheet_watch.SheetChange): точечно, без перестройки."""
+        with self._lock:
+            if not self.loaded:
+                return
+            added_keys = {record_key(record) for record in change.added}
+            for record in change.removed:
+                if record_key(record) not in added_keys:
+                    self._remove(record)
+            for record in change.added:
+                self._upsert(record)
+
+    def _remove(self, entry: Any) -> None:
+        row_id = self._row_ids.pop(record_key(entry), None)
+        if row_id is None:
+            return
+        for name, old_text in zip(INDEXED_FIELDS, self._texts[row_id]):
+            self._fields[name].remove(row_id, old_text)
+        self._texts[row_id] = ("", "", "")
+        self._deleted.add(row_id)
+
+    def _upsert(self, entry: Any) -> None:
+        texts = (entry.project or "", entry.address or "", entry.engineer or "")
+        date_ordinal = parse_sheets_date(entry.date) or 0
+        fuel = entry.fuel_liters if entry.fuel_liters is not None else math.nan
+        key = record_key(entry)
+        row_id = self._row_ids.get(key)
+
+        if row_id is None:
+            row_id = len(self._texts)
+            self._row_ids[key] = row_id
+            self._texts.append(texts)
+            self._dates.append(date_ordinal)
+            self._distance.append(int(entry.distance_km))
+            self._fuel.append(fuel)
+        else:
+            for name, old_text in zip(INDEXED_FIELDS, self._texts[row_id]):
+                self._fields[name].remove(row_id, old_text)
+            self._texts[row_id] = texts
+            self._dates[row_id] = date_ordinal
+            self._distance[row_id] = int(entry.distance_km)
+            self._fuel[row_id] = fuel
+
+        for name, text in zip(INDEXED_FIELDS, texts):
+            self._fields[name].add(row_id, text)
+
+    def query(self, query: StatsQuery, top: int = 5) -> StatsResult:
+        with self._lock:
+            candidates: Optional[Set[int]] = None
+            # Пересекаем от самого маленького множества
+            postings = [
+                self._fields[name].match(word)
+                for name in INDEXED_FIELDS
+                for word in getattr(query, name)
+            ]
+            for posting in sorted(postings, key=len):
+                candidates = posting.copy() if candidates is None else candidates & posting
+                if not candidates:
+                    break
+            rows: Iterable[int] = range(len(self._texts)) if candidates is None else sorted(candidates)
+            if candidates is None and self._deleted:
+                rows = [row_id for row_id in rows if row_id not in self._deleted]
+
+            date_from = query.date_from if query.date_from is not None else -1
+            date_to = query.date_to if query.date_to is not None else 1 << 30
+            check_dates = query.date_from is not None or query.date_to is not None
+
+            trips = 0
+            distance_km = 0
+            fuel_liters = 0.0
+            by_engineer: Dict[str, List[int]] = {}
+            by_project: Dict[str, List[int]] = {}
+            dates, distances, fuels, texts = self._dates, self._distance, self._fuel, self._texts
+            for row_id in rows:
+                if check_dates and not date_from <= dates[row_id] <= date_to:
+                    continue
+                km = distances[row_id]
+                trips += 1
+                distance_km += km
+                fuel = fuels[row_id]
+                if fuel == fuel:  # не NaN
+                    fuel_liters += fuel
+                project, _, engineer = texts[row_id]
+                for key, groups in ((engineer, by_engineer), (project or "—", by_project)):
+                    group = groups.get(key)
+                    if group is None:
+                        groups[key] = [1, km]
+                    else:
+                        group[0] += 1
+                        group[1] += km
+
+        def top_groups(groups: Dict[str, List[int]]) -> List[Tuple[str, int, int]]:
+            ordered = sorted(groups.items(), key=lambda item: -item[1][1])[:top]
+            return [(name, count, km) for name, (count, km) in ordered]
+
+        return StatsResult(trips, distance_km, fuel_liters, top_groups(by_engineer), top_groups(by_project))
+
+
+# Ключи фильтра /stats и их синонимы
+_QUERY_KEYS = {
+    "проект": "project", "project": "project",
+    "адрес": "address", "address": "address",
+    "инженер": "engineer", "engineer": "engineer", "водитель": "engineer",
+    "с": "from", "from": "from",
+    "по": "to", "to": "to",
+    "месяц": "month", "month": "month",
+}
+_QUERY_KEY_RE = re.compile(r"(?:^|\s)(" + "|".join(sorted(_QUERY_KEYS, key=len, reverse=True)) + r")\s*[:=]", re.IGNORECASE)
+
+
+def _month_range(value: str) -> Tuple[int, int]:
+    """ММ.ГГГГ -> первый и последний день месяца."""
+    month, year = (int(part) for part in value.split("."))
+    first = date(year, month, 1)
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    return first.toordinal(), next_month.toordinal() - 1
+
+
+def parse_stats_query(text: str) -> StatsQuery:
+    """
+    Разбирает аргументы /stats:
+    "проект: Ромашка адрес: Ленина инженер: Иванов с: 01.10.2026 по: 31.10.2026" или "месяц: 10.2026".
+    Ошибки формата - ValueError с текстом для пользователя.
+    """
+    matches = list(_QUERY_KEY_RE.finditer(text))
+    if text.strip() and not matches:
+        raise ValueError("Не найдено ни одного фильтра")
+    values: Dict[str, str] = {}
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        values[_QUERY_KEYS[match.group(1).lower()]] = text[match.end():end].strip().strip(",;")
+
+    date_from = date_to = None
+    if "month" in values:
+        try:
+            date_from, date_to = _month_range(values["month"])
+        except ValueError:
+            raise ValueError(f"Месяц нужно указать как ММ.ГГГГ: {values['month']}")
+    for key in ("from", "to"):
+        if key in values:
+            ordinal = parse_sheets_date(values[key])
+            if ordinal is None:
+                raise ValueError(f"Дату нужно указать как ДД.ММ.ГГГГ: {values[key]}")
+            if key == "from":
+                date_from = ordinal
+            else:
+                date_to = ordinal
+
+    return StatsQuery(
+        project=tuple(normalize_words(values.get("project", ""))),
+        address=tuple(normalize_words(values.get("address", ""))),
+        engineer=tuple(normalize_words(values.get("engineer", ""))),
+        date_from=date_from,
+        date_to=date_to,
+    )
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Защита от повторной обработки обновлений Telegram.
+
+Если webhook отвечает медленно, Telegram присылает то же обновление ещё раз.
+Недавние update_id хранятся в ограниченном множестве в памяти, а при заданном
+DEDUP_REDIS_URL - ещё и в Redis, общем для всех инстансов.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RecentUpdateIds:
+    """Ограниченное множество недавно принятых update_id"""
+
+    def __init__(self, max_size: Optional[int] = None, redis_url: Optional[str] = None, ttl: Optional[int] = None):
+        if max_size is None:
+            max_size = int(os.getenv("DEDUP_MAX_SIZE", "10000"))
+        self.max_size = max(max_size, 1)
+        self.redis_url = redis_url if redis_url is not None else os.getenv("DEDUP_REDIS_URL", "").strip()
+        self.ttl = ttl if ttl is not None else int(os.getenv("DEDUP_TTL", "3600"))
+        self._ids: "OrderedDict[int, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis: Any = None
+        self.duplicates = 0
+
+    def _get_redis(self) -> Any:
+        if self._redis is None and self.redis_url:
+            try:
+                import redis.asyncio as redis  # необязательная зависимость
+                self._redis = redis.from_url(self.redis_url)
+            except ImportError:
+                logger.error("Не удалось импортировать redis. Установите зависимость: pip install redis")
+                self.redis_url = ""
+        return self._redis
+
+    def _remember_local(self, update_id: int) -> bool:
+        """Запоминает id в памяти. Возвращает True, если он уже был."""
+        with self._lock:
+            if update_id in self._ids:
+                self._ids.move_to_end(update_id)
+                return True
+            self._ids[update_id] = None
+            if len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+            return False
+
+    async def check_and_remember(self, update_id: int) -> bool:
+        """Возвращает True, если обновление уже принималось (дубликат)."""
+        duplicate = self._remember_local(update_id)
+        if not duplicate:
+            redis = self._get_redis()
+            if redis is not None:
+                try:
+                    # SET NX: ключ создаётся только первым инстансом, получившим обновление
+                    created = await redis.set(f"tg:update:{update_id}", 1, nx=True, ex=self.ttl)
+                    duplicate = not created
+                except Exception as e:
+                    logger.warning(f"Redis недоступен для проверки дублей: {e}")
+        if duplicate:
+            self.duplicates += 1
+        return duplicate
+
+    async def forget(self, update_id: int) -> None:
+        """Забывает id, чтобы повтор от Telegram после ошибки обработался заново."""
+        with self._lock:
+            self._ids.pop(update_id, None)
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                await redis.delete(f"tg:update:{update_id}")
+            except Exception as e:
+                logger.warning(f"Redis недоступен для удаления update_id: {e}")
+
+    def __len__(self) -> int:
+        return len(self._ids)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Очередь обновлений Telegram для режима быстрого ответа webhook.
+
+Обновление кладётся в ограниченную очередь, webhook сразу отвечает 200,
+а пул воркеров обрабатывает обновления в фоне. Очередь разбита на шарды
+по пользователю: обновления одного водителя обрабатываются строго по порядку
+(иначе FSM может получить нажатие кнопки раньше предыдущего сообщения).
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+UpdateHandler = Callable[[Any], Awaitable[None]]
+
+
+def update_shard_key(update: Any) -> int:
+    """Ключ шарда: id пользователя или чата из обновления (0, если не найден).
+
+    Принимает как словарь, так и разобранный aiogram Update.
+    """
+    if not isinstance(update, dict):
+        try:
+            event = update.event
+        except LookupError:
+            # Незнакомый aiogram тип обновления (UpdateTypeLookupError): диспетчер его пропустит
+            return 0
+        sender = getattr(event, "from_user", None) or getattr(event, "user", None) or getattr(event, "chat", None)
+        return int(sender.id) if sender is not None else 0
+    for key, value in update.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        sender = value.get("from") or value.get("user") or value.get("chat")
+        if isinstance(sender, dict) and "id" in sender:
+            return int(sender["id"])
+    return 0
+
+
+class UpdateQueue:
+    """Ограниченная очередь обновлений с пулом фоновых воркеров"""
+
+    def __init__(self, handler: UpdateHandler, max_size: Optional[int] = None, workers: Optional[int] = None):
+        self.handler = handler
+        if max_size is None:
+            max_size = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+        if workers is None:
+            workers = int(os.getenv("WEBHOOK_WORKERS", "8"))
+        self.workers = max(workers, 1)
+        shard_size = max(max_size // self.workers, 1)
+        self._queues: List[asyncio.Queue] = [asyncio.Queue(maxsize=shard_size) for _ in range(self.workers)]
+        self._tasks: List[asyncio.Task] = []
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker(queue)) for queue in self._queues]
+        logger.info(f"Очередь обновлений запущена: {self.workers} воркеров")
+
+    def put_nowait(self, update: Any) -> bool:
+        """Ставит обновление в очередь. Возвращает False, если очередь переполнена."""
+        queue = self._queues[update_shard_key(update) % self.workers]
+        try:
+            # Контекст вызывающего (текущий спан трассировки) переходит к воркеру
+            queue.put_nowait((update, contextvars.copy_context()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self.accepted += 1
+        return True
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            update, context = await queue.get()
+            try:
+                await asyncio.get_running_loop().create_task(self.handler(update), context=context)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                update_id = update.get("update_id") if isinstance(update, dict) else getattr(update, "update_id", None)
+                logger.error(f"Ошибка фоновой обработки обновления {update_id}: {e}")
+            finally:
+                queue.task_done()
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Дожидается обработки накопленных обновлений и останавливает воркеров."""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не все обновления обработаны до остановки: {self.pending()} в очереди")
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def pending(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "pending": self.pending(),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
@@ -1,11 +1,14 @@
 import os
 import logging
-from typing import Optional, Dict, List
+import zlib
+from typing import Any, Optional, Dict, List, Set
 from models import Registration
 from datetime import datetime
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from fast_json import make_sheets_json_model
+from tracing import traced
 
 
 logger = logging.getLogger(__name__)
@@ -20,11 +23,19 @@ class UsersRepository:
         "created_at",
     ]
 
-    def __init__(self, users_sheet_name: Optional[str] = None):
+    def __init__(
+        self,
+        users_sheet_name: Optional[str] = None,
+        service: Optional[Any] = None,
+        sheet_id: Optional[str] = None,
+    ):
         self.users: Dict[int, Registration] = {}
+        # Контрольная сумма листа и пользователи из него при последнем чтении (для reload_if_changed)
+        self._users_checksum: Optional[int] = None
+        self._sheet_user_ids: Set[int] = set()
 
-        # Параметры доступа к Google Sheets
-        self.sheet_id: str = os.getenv("GOOGLE_SHEET_ID", "").strip()
+        # Параметры доступа к Google Sheets (sheet_id задаётся для каждой компании, см. tenants.py)
+        self.sheet_id: str = (sheet_id if sheet_id is not None else os.getenv("GOOGLE_SHEET_ID", "")).strip()
         self.users_sheet_name: str = users_sheet_name or os.getenv("USERS_SHEET_NAME", "Пользователи")
         service_account_path: str = os.getenv("GOOGLE_SA_JSON_PATH", "./service_account.json")
 
@@ -32,21 +43,26 @@ class UsersRepository:
             logger.error("GOOGLE_SHEET_ID не установлен – репозиторий пользователей работать не сможет")
             return
 
-        try:
-            credentials = service_account.Credentials.from_service_account_file(
-                service_account_path,
-                scopes=["https://www.googleapis.com/auth/spreadsheets"],
-            )
-            self.service = build("sheets", "v4", credentials=credentials)
-        except Exception as e:
-            logger.error(f"Не удалось инициализировать Google Sheets клиент для пользователей: {e}")
-            self.service = None
-            return
+        if service is not None:
+            # Готовый сервис (например, фейковый для нагрузочного теста)
+            self.service = service
+        else:
+            try:
+                credentials = service_account.Credentials.from_service_account_file(
+                    service_account_path,
+                    scopes=["https://www.googleapis.com/auth/spreadsheets"],
+                )
+                self.service = build("sheets", "v4", credentials=credentials, model=make_sheets_json_model())
+            except Exception as e:
+                logger.error(f"Не удалось инициализировать Google Sheets клиент для пользователей: {e}")
+                self.service = None
+                return
 
         # Готовим лист и локальный кэш
         self._ensure_users_header()
         self.load_users()
 
+    @traced("users.ensure_users_header")
     def _ensure_users_header(self) -> None:
         if not getattr(self, "service", None):
             return
@@ -67,40 +83,76 @@ class UsersRepository:
         except HttpError as e:
             logger.error(f"Ошибка при проверке/создании заголовков пользователей: {e}")
 
+    @traced("users.load_users")
     def load_users(self) -> None:
         """Загружает пользователей из листа Google Sheets в память."""
         self.users = {}
         if not getattr(self, "service", None):
             return
         try:
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=self.sheet_id,
-                range=f"{self.users_sheet_name}!A:C",
-            ).execute()
-            values = result.get("values", [])
+            values = self._read_users_values()
+            self._users_checksum = zlib.crc32(repr(values).encode("utf-8"))
+            self.users = self._parse_users(values)
+            self._sheet_user_ids = set(self.users)
             if len(values) <= 1:
                 logger.info("Лист Пользователи пуст")
                 return
-            headers = values[0]
-            rows = values[1:]
-            # Ожидаем порядок headers = USERS_HEADERS
-            for row in rows:
-                if len(row) < 3:
-                    continue
-                try:
-                    user_id = int(row[0])
-                except ValueError:
-                    continue
-                registration = Registration(
-                    telegram_user_id=user_id,
-                    full_name=row[1],
-                    created_at=row[2],
-                )
-                self.users[user_id] = registration
             logger.info(f"Загружено {len(self.users)} пользователей из Google Sheets")
         except HttpError as e:
             logger.error(f"Ошибка при чтении пользователей из Google Sheets: {e}")
 
+    @traced("users.reload_if_changed")
+    def reload_if_changed(self) -> bool:
+        """
+        Перечитывает лист, если его правили вручную (вызывается из sheet_watch.py
+        при смене версии таблицы). True - список пользователей обновлён.
+        """
+        if not getattr(self, "service", None):
+            return False
+        try:
+            values = self._read_users_values()
+        except HttpError as e:
+            logger.error(f"Ошибка при чтении пользователей из Google Sheets: {e}")
+            return False
+        checksum = zlib.crc32(repr(values).encode("utf-8"))
+        if checksum == self._users_checksum:
+            return False
+        sheet_users = self._parse_users(values)
+        users = dict(sheet_users)
+        # Зарегистрированные во время чтения листа ещё не видны в нём - их не теряем
+        for user_id, registration in self.users.items():
+            if user_id not in users and user_id not in self._sheet_user_ids:
+                users[user_id] = registration
+        self.users = users
+        self._sheet_user_ids = set(sheet_users)
+        self._users_checksum = checksum
+        logger.info(f"Лист Пользователи изменён: {len(users)} пользователей")
+        return True
+
+    def _read_users_values(self) -> List[List[str]]:
+        result = self.service.spreadsheets().values().get(
+            spreadsheetId=self.sheet_id,
+            range=f"{self.users_sheet_name}!A:C",
+        ).execute()
+        return result.get("values", [])
+
+    def _parse_users(self, values: List[List[str]]) -> Dict[int, Registration]:
+        users: Dict[int, Registration] = {}
+        # Ожидаем порядок колонок = USERS_HEADERS, первая строка - заголовки
+        for row in values[1:]:
+            if len(row) < 3:
+                continue
+            try:
+                user_id = int(row[0])
+            except ValueError:
+                continue
+            users[user_id] = Registration(
+                telegram_user_id=user_id,
+                full_name=row[1],
+                created_at=row[2],
+            )
+        return users
+
     def save_users(self) -> None:
         """Ничего не делает: запись происходит при регистрации (append). Оставлено для совместимости."""
         return
@@ -111,6 +163,7 @@ class UsersRepository:
     def is_registered(self, telegram_user_id: int) -> bool:
         return telegram_user_id in self.users
 
+    @traced("users.register_user")
     def register_user(self, telegram_user_id: int, full_name: str) -> Registration:
         """Регистрирует пользователя и сохраняет строку в листе Google Sheets."""
         registration = Registration(
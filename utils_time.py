@@ -1,12 +1,23 @@
 import re
-from datetime import datetime, timedelta
-from typing import Optional, Tuple
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
 import pytz
 import logging
 
 
 logger = logging.getLogger(__name__)
 
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_NAN = float("nan")
+
+
+class SheetsTimeColumns(NamedTuple):
+    """Результат разбора колонок: epoch-секунды начала/конца и длительность (NaN - не разобрано)"""
+    start: array
+    end: array
+    duration: array
+
 
 class TimeUtils:
     """Утилиты для работы со временем"""
@@ -124,6 +135,95 @@ class TimeUtils:
             logger.error(f"Ошибка парсинга даты/времени из Sheets: {e}")
             return None
 
+    def _parse_sheets_date(self, date_str: str) -> Optional[Tuple[int, Optional[int]]]:
+        """
+        Разбирает "ДД.ММ.ГГГГ" в (локальная полночь в epoch-секундах, смещение UTC в секундах).
+        Смещение None означает переход на летнее/зимнее время в этот день.
+        """
+        date_parts = date_str.split('.')
+        if len(date_parts) != 3:
+            return None
+        try:
+            day, month, year = map(int, date_parts)
+            local_date = date(year, month, day)
+        except ValueError:
+            return None
+        midnight = datetime(year, month, day)
+        offset_start = self.timezone.localize(midnight).utcoffset()
+        offset_end = self.timezone.localize(midnight.replace(hour=23, minute=59)).utcoffset()
+        offset = int(offset_start.total_seconds()) if offset_start == offset_end else None
+        return (local_date.toordinal() - _EPOCH_ORDINAL) * 86400, offset
+
+    @staticmethod
+    def _parse_sheets_time(time_str: str) -> Optional[int]:
+        """Разбирает "ЧЧ:ММ" в секунды от полуночи."""
+        time_parts = time_str.split(':')
+        if len(time_parts) != 2:
+            return None
+        try:
+            hour, minute = map(int, time_parts)
+        except ValueError:
+            return None
+        if not (0 <= hour < 24 and 0 <= minute < 60):
+            return None
+        return hour * 3600 + minute * 60
+
+    def parse_sheets_columns(
+        self,
+        dates: Sequence[str],
+        times_start: Sequence[str],
+        times_end: Optional[Sequence[str]] = None,
+    ) -> SheetsTimeColumns:
+        """
+        Пакетный разбор колонок date/time_start/time_end из Google Sheets.
+
+        Возвращает массивы epoch-секунд (UTC) и длительностей в секундах, тот же
+        результат, что parse_sheets_datetime построчно. Смещение часового пояса
+        вычисляется один раз на каждую различную дату; в дни перевода часов
+        используется построчная локализация. Неразобранные значения - NaN.
+        """
+        if times_end is None:
+            times_end = [""] * len(dates)
+        date_cache: Dict[str, Optional[Tuple[int, Optional[int]]]] = {}
+        time_cache: Dict[str, Optional[int]] = {}
+        start_ts = array('d')
+        end_ts = array('d')
+        durations = array('d')
+
+        def to_epoch(parsed_date: Tuple[int, Optional[int]], date_str: str, seconds: Optional[int]) -> float:
+            if seconds is None:
+                return _NAN
+            local_midnight, offset = parsed_date
+            if offset is None:
+                dt = self.parse_sheets_datetime(date_str, f"{seconds // 3600}:{seconds % 3600 // 60}")
+                return dt.timestamp() if dt is not None else _NAN
+            return float(local_midnight + seconds - offset)
+
+        for date_str, start_str, end_str in zip(dates, times_start, times_end):
+            parsed_date = date_cache.get(date_str, False)
+            if parsed_date is False:
+                parsed_date = date_cache[date_str] = self._parse_sheets_date(date_str)
+            if parsed_date is None:
+                start_ts.append(_NAN)
+                end_ts.append(_NAN)
+                durations.append(_NAN)
+                continue
+
+            start_seconds = time_cache.get(start_str, False)
+            if start_seconds is False:
+                start_seconds = time_cache[start_str] = self._parse_sheets_time(start_str)
+            end_seconds = time_cache.get(end_str, False)
+            if end_seconds is False:
+                end_seconds = time_cache[end_str] = self._parse_sheets_time(end_str)
+
+            start = to_epoch(parsed_date, date_str, start_seconds)
+            end = to_epoch(parsed_date, date_str, end_seconds)
+            start_ts.append(start)
+            end_ts.append(end)
+            durations.append(end - start)
+
+        return SheetsTimeColumns(start_ts, end_ts, durations)
+
     def is_within_edit_time_limit(self, created_at_str: str, limit_minutes: int = 15) -> bool:
         """Проверяет, можно ли еще редактировать запись (в пределах лимита времени)"""
         try: